@@ -10,6 +10,7 @@ from .ade import ADE20KSegmentation
 from .pascal_voc import VOCSegmentation
 from .pascal_aug import VOCAugSegmentation
 from .sbu_shadow import SBUSegmentation
+from .packed import PackedSegmentationDataset
 
 datasets = {
     'ade20k': ADE20KSegmentation,
@@ -21,6 +22,7 @@ datasets = {
     'custom': CustomSegmentation,
     'custom-dataset': CustomDatasetSegmentation,
     'sbu': SBUSegmentation,
+    'packed': PackedSegmentationDataset,
 }
 
 
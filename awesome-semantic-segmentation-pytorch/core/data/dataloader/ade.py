@@ -5,6 +5,7 @@ import numpy as np
 
 from PIL import Image
 from .segbase import SegmentationDataset
+from .manifest import DatasetManifest
 
 
 class ADE20KSegmentation(SegmentationDataset):
@@ -41,7 +42,8 @@ class ADE20KSegmentation(SegmentationDataset):
         super(ADE20KSegmentation, self).__init__(root, split, mode, transform, **kwargs)
         root = os.path.join(root, self.BASE_DIR)
         assert os.path.exists(root), "Please setup the dataset using ../datasets/ade20k.py"
-        self.images, self.masks = _get_ade20k_pairs(root, split)
+        manifest = self._get_manifest([os.path.join(root, 'images'), os.path.join(root, 'annotations')])
+        self.images, self.masks = _get_ade20k_pairs(root, split, manifest)
         assert (len(self.images) == len(self.masks))
         if len(self.images) == 0:
             raise RuntimeError("Found 0 images in subfolders of:" + root + "\n")
@@ -144,7 +146,7 @@ class ADE20KSegmentation(SegmentationDataset):
                 "shower", "radiator", "glass, drinking glass", "clock", "flag")
 
 
-def _get_ade20k_pairs(folder, mode='train'):
+def _get_ade20k_pairs(folder, mode='train', manifest=None):
     img_paths = []
     mask_paths = []
     if mode == 'train':
@@ -153,13 +155,15 @@ def _get_ade20k_pairs(folder, mode='train'):
     else:
         img_folder = os.path.join(folder, 'images/validation')
         mask_folder = os.path.join(folder, 'annotations/validation')
-    for filename in os.listdir(img_folder):
-        basename, _ = os.path.splitext(filename)
-        if filename.endswith(".jpg"):
-            imgpath = os.path.join(img_folder, filename)
+    if manifest is None:
+        manifest = DatasetManifest([img_folder, mask_folder], cache=False)
+    img_folder, mask_folder = os.path.abspath(img_folder), os.path.abspath(mask_folder)
+    for imgpath in manifest.files(img_folder, '.jpg'):
+        basename, _ = os.path.splitext(os.path.basename(imgpath))
+        if os.path.dirname(imgpath) == img_folder:
             maskname = basename + '.png'
             maskpath = os.path.join(mask_folder, maskname)
-            if os.path.isfile(maskpath):
+            if manifest.isfile(maskpath):
                 img_paths.append(imgpath)
                 mask_paths.append(maskpath)
             else:
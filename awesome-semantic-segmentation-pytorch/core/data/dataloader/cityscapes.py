@@ -5,6 +5,28 @@ import numpy as np
 
 from PIL import Image
 from .segbase import SegmentationDataset
+from .manifest import DatasetManifest
+
+__all__ = ['CitySegmentation', 'label_to_train_id', 'train_id_path']
+
+# labelIds of the 19 evaluated classes, whose trainIds are their positions
+_VALID_CLASSES = [7, 8, 11, 12, 13, 17, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 31, 32, 33]
+# trainId of every uint8 labelId, 255 for the ignored labels as in gtFine_labelTrainIds
+_TRAIN_IDS = np.full(256, 255, dtype=np.uint8)
+_TRAIN_IDS[_VALID_CLASSES] = np.arange(len(_VALID_CLASSES))
+# training target of every uint8 trainId, -1 for the ignored labels
+_TARGETS = np.full(256, -1, dtype=np.int64)
+_TARGETS[:len(_VALID_CLASSES)] = np.arange(len(_VALID_CLASSES))
+
+
+def label_to_train_id(mask):
+    """uint8 trainIds of a labelId mask, 255 for the ignored labels, in a single lookup."""
+    return np.take(_TRAIN_IDS, np.asarray(mask), mode='wrap')
+
+
+def train_id_path(mask_path):
+    """Path of the gtFine_labelTrainIds mask next to a gtFine_labelIds mask."""
+    return mask_path.replace('gtFine_labelIds', 'gtFine_labelTrainIds')
 
 
 class CitySegmentation(SegmentationDataset):
@@ -18,6 +40,9 @@ class CitySegmentation(SegmentationDataset):
         'train', 'val' or 'test'
     transform : callable, optional
         A function that transforms the image
+    train_ids : bool, default: False
+        Load the gtFine_labelTrainIds masks written by `core/data/downloader/cityscapes.py
+        --train-ids` instead of converting the gtFine_labelIds masks, when they exist
     Examples
     --------
     >>> from torchvision import transforms
@@ -37,29 +62,27 @@ class CitySegmentation(SegmentationDataset):
     BASE_DIR = 'cityscapes'
     NUM_CLASS = 19
 
-    def __init__(self, root='../datasets/citys', split='train', mode=None, transform=None, **kwargs):
+    def __init__(self, root='../datasets/citys', split='train', mode=None, transform=None, train_ids=False,
+                 **kwargs):
         super(CitySegmentation, self).__init__(root, split, mode, transform, **kwargs)
         assert os.path.exists(self.root), "Please setup the dataset using ../datasets/cityscapes.py"
-        self.images, self.mask_paths = _get_city_pairs(self.root, self.split)
+        manifest = self._get_manifest([os.path.join(self.root, 'leftImg8bit'), os.path.join(self.root, 'gtFine')])
+        self.images, self.mask_paths = _get_city_pairs(self.root, self.split, manifest)
         assert (len(self.images) == len(self.mask_paths))
         if len(self.images) == 0:
             raise RuntimeError("Found 0 images in subfolders of:" + root + "\n")
-        self.valid_classes = [7, 8, 11, 12, 13, 17, 19, 20, 21, 22,
-                              23, 24, 25, 26, 27, 28, 31, 32, 33]
-        self._key = np.array([-1, -1, -1, -1, -1, -1,
-                              -1, -1, 0, 1, -1, -1,
-                              2, 3, 4, -1, -1, -1,
-                              5, -1, 6, 7, 8, 9,
-                              10, 11, 12, 13, 14, 15,
-                              -1, -1, 16, 17, 18])
-        self._mapping = np.array(range(-1, len(self._key) - 1)).astype('int32')
+        self.valid_classes = _VALID_CLASSES
+        # masks are converted to trainIds when they are loaded, so padding them is ignored too
+        self.mask_fill = 255
+        self.train_ids = [train_ids and manifest.isfile(train_id_path(path)) for path in self.mask_paths]
+
+    def _load_mask(self, index):
+        if self.train_ids[index]:
+            return Image.open(train_id_path(self.mask_paths[index]))
+        return Image.fromarray(label_to_train_id(Image.open(self.mask_paths[index])))
 
     def _class_to_index(self, mask):
-        values = np.unique(mask)
-        for value in values:
-            assert (value in self._mapping)
-        index = np.digitize(mask.ravel(), self._mapping, right=True)
-        return self._key[index].reshape(mask.shape)
+        return np.take(_TARGETS, label_to_train_id(mask))
 
     def __getitem__(self, index):
         img = Image.open(self.images[index]).convert('RGB')
@@ -67,7 +90,7 @@ class CitySegmentation(SegmentationDataset):
             if self.transform is not None:
                 img = self.transform(img)
             return img, os.path.basename(self.images[index])
-        mask = Image.open(self.mask_paths[index])
+        mask = self._load_mask(index)
         if self.mode == 'train':
             img, mask = self._sync_transform(img, mask)
         elif self.mode == 'val':
@@ -80,8 +103,7 @@ class CitySegmentation(SegmentationDataset):
         return img, mask, os.path.basename(self.images[index])
 
     def _mask_transform(self, mask):
-        target = self._class_to_index(np.array(mask).astype('int32'))
-        return torch.LongTensor(np.array(target).astype('int32'))
+        return torch.from_numpy(np.take(_TARGETS, np.asarray(mask)))
 
     def __len__(self):
         return len(self.images)
@@ -91,22 +113,23 @@ class CitySegmentation(SegmentationDataset):
         return 0
 
 
-def _get_city_pairs(folder, split='train'):
+def _get_city_pairs(folder, split='train', manifest=None):
+    if manifest is None:
+        manifest = DatasetManifest([os.path.join(folder, 'leftImg8bit'), os.path.join(folder, 'gtFine')], cache=False)
+
     def get_path_pairs(img_folder, mask_folder):
         img_paths = []
         mask_paths = []
-        for root, _, files in os.walk(img_folder):
-            for filename in files:
-                if filename.endswith('.png'):
-                    imgpath = os.path.join(root, filename)
-                    foldername = os.path.basename(os.path.dirname(imgpath))
-                    maskname = filename.replace('leftImg8bit', 'gtFine_labelIds')
-                    maskpath = os.path.join(mask_folder, foldername, maskname)
-                    if os.path.isfile(imgpath) and os.path.isfile(maskpath):
-                        img_paths.append(imgpath)
-                        mask_paths.append(maskpath)
-                    else:
-                        print('cannot find the mask or image:', imgpath, maskpath)
+        for imgpath in manifest.files(img_folder, '.png'):
+            filename = os.path.basename(imgpath)
+            foldername = os.path.basename(os.path.dirname(imgpath))
+            maskname = filename.replace('leftImg8bit', 'gtFine_labelIds')
+            maskpath = os.path.join(os.path.abspath(mask_folder), foldername, maskname)
+            if manifest.isfile(maskpath):
+                img_paths.append(imgpath)
+                mask_paths.append(maskpath)
+            else:
+                print('cannot find the mask or image:', imgpath, maskpath)
         print('Found {} images in the folder {}'.format(len(img_paths), img_folder))
         return img_paths, mask_paths
 
@@ -39,7 +39,10 @@ class CustomDatasetSegmentation(SegmentationDataset):
     def __init__(self, custom_dataset=None, root='', split='train', mode='testval', transform=None, **kwargs):
         super(CustomDatasetSegmentation, self).__init__(root, split, mode, transform, **kwargs)
         images_folder = custom_dataset
-        self.images = [join(images_folder, path) for path in os.listdir(images_folder)]
+        manifest = self._get_manifest([images_folder])
+        # the files directly inside the folder, like os.listdir
+        self.images = [path for path in manifest.files(images_folder)
+                       if os.path.dirname(path) == os.path.abspath(images_folder)]
         assert len(self.images) > 0
         self.valid_classes = [7, 8, 11, 12, 13, 17, 19, 20, 21, 22,
                               23, 24, 25, 26, 27, 28, 31, 32, 33]
@@ -5,6 +5,7 @@ import numpy as np
 
 from PIL import Image
 from .segbase import SegmentationDataset
+from .cityscapes import _VALID_CLASSES, _TARGETS, label_to_train_id
 
 
 class CustomMetricSegmentation(SegmentationDataset):
@@ -40,22 +41,10 @@ class CustomMetricSegmentation(SegmentationDataset):
         super(CustomMetricSegmentation, self).__init__(root, split, mode, transform, **kwargs)
         self.image, self.mask_path = input_pic, input_gt
         assert self.image != None and self.mask_path != None
-        self.valid_classes = [7, 8, 11, 12, 13, 17, 19, 20, 21, 22,
-                              23, 24, 25, 26, 27, 28, 31, 32, 33]
-        self._key = np.array([-1, -1, -1, -1, -1, -1,
-                              -1, -1, 0, 1, -1, -1,
-                              2, 3, 4, -1, -1, -1,
-                              5, -1, 6, 7, 8, 9,
-                              10, 11, 12, 13, 14, 15,
-                              -1, -1, 16, 17, 18])
-        self._mapping = np.array(range(-1, len(self._key) - 1)).astype('int32')
+        self.valid_classes = _VALID_CLASSES
 
     def _class_to_index(self, mask):
-        values = np.unique(mask)
-        for value in values:
-           assert (value in self._mapping)
-        index = np.digitize(mask.ravel(), self._mapping, right=True)    
-        return self._key[index].reshape(mask.shape)
+        return np.take(_TARGETS, label_to_train_id(mask))
 
     def __getitem__(self, index):
         img = Image.open(self.image).convert('RGB')
@@ -69,8 +58,7 @@ class CustomMetricSegmentation(SegmentationDataset):
         return img, mask
 
     def _mask_transform(self, mask):
-        target = self._class_to_index(np.array(mask).astype('int32'))
-        return torch.LongTensor(np.array(target).astype('int32'))
+        return torch.from_numpy(self._class_to_index(np.asarray(mask)))
         
     def __len__(self):
     	return 1
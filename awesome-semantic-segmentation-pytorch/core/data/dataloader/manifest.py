@@ -0,0 +1,123 @@
+"""Cached index of the files of a dataset"""
+import os
+import json
+import bisect
+import hashlib
+
+__all__ = ['DatasetManifest']
+
+_CACHE_DIR = os.path.expanduser('~/.torch/datasets/manifests')
+
+
+class DatasetManifest(object):
+    """Index of every file under some folders of a dataset, with its size and mtime.
+
+    The folders are scanned once with `os.scandir`, and the index is saved as a JSON manifest
+    of paths relative to the folders' common parent, keyed by the folders. Later loads only
+    stat the scanned directories: a file added, removed or renamed changes the mtime of its
+    directory, which triggers a new scan. Files modified in place keep the manifest valid.
+    Datasets then look files up in memory instead of walking the folders and calling
+    `os.path.isfile` for every image and mask.
+
+    Parameters
+    ----------
+    folders : list of str
+        Folders indexed recursively; folders that do not exist are indexed as empty.
+    cache : bool, default: True
+        Load and save the manifest, instead of scanning the folders every time.
+    cache_dir : str, default: '~/.torch/datasets/manifests'
+        Directory the manifests are saved in.
+    """
+    VERSION = 1
+
+    def __init__(self, folders, cache=True, cache_dir=_CACHE_DIR):
+        self.folders = sorted(set(os.path.abspath(folder) for folder in folders))
+        self.base = os.path.commonpath(self.folders) if len(self.folders) > 1 else os.path.dirname(self.folders[0])
+        key = hashlib.sha1('\n'.join(self.folders).encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, key + '.json') if cache else None
+        self.scanned = False
+        data = self._load() if cache else None
+        if data is None:
+            data = self._scan()
+            self.scanned = True
+            if cache:
+                self._save(data)
+        self.dirs = data['dirs']
+        self.paths = [os.path.join(self.base, path) for path in data['files']]
+        self.sizes = data['sizes']
+        self.mtimes = data['mtimes']
+        self._index = {path: i for i, path in enumerate(self.paths)}
+
+    def _scan(self):
+        dirs, entries = {}, []
+        stack = list(self.folders)
+        while stack:
+            folder = stack.pop()
+            try:
+                dirs[os.path.relpath(folder, self.base)] = os.stat(folder).st_mtime_ns
+                scan = os.scandir(folder)
+            except FileNotFoundError:
+                dirs[os.path.relpath(folder, self.base)] = None
+                continue
+            with scan:
+                for entry in scan:
+                    if entry.is_dir():
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        entries.append((os.path.relpath(entry.path, self.base), stat.st_size, stat.st_mtime_ns))
+        entries.sort()
+        return {'version': self.VERSION, 'folders': self.folders, 'dirs': dirs,
+                'files': [entry[0] for entry in entries], 'sizes': [entry[1] for entry in entries],
+                'mtimes': [entry[2] for entry in entries]}
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != self.VERSION or data.get('folders') != self.folders:
+            return None
+        for folder, mtime in data['dirs'].items():
+            try:
+                current = os.stat(os.path.join(self.base, folder)).st_mtime_ns
+            except FileNotFoundError:
+                current = None
+            if current != mtime:
+                return None
+        return data
+
+    def _save(self, data):
+        # several DataLoader workers may save at once, so each writes its own file first
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = '{}.{}.tmp'.format(self.path, os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def files(self, folder, suffix=''):
+        """Sorted paths of the files under `folder` whose names end with `suffix`."""
+        prefix = os.path.join(os.path.abspath(folder), '')
+        start = bisect.bisect_left(self.paths, prefix)
+        files = []
+        for path in self.paths[start:]:
+            if not path.startswith(prefix):
+                break
+            if path.endswith(suffix):
+                files.append(path)
+        return files
+
+    def isfile(self, path):
+        return os.path.abspath(path) in self._index
+
+    def stat(self, path):
+        """(size in bytes, mtime in ns) of an indexed file."""
+        i = self._index[os.path.abspath(path)]
+        return self.sizes[i], self.mtimes[i]
+
+    def __len__(self):
+        return len(self.paths)
@@ -0,0 +1,280 @@
+"""Packed, memory-mapped segmentation dataset shards"""
+import os
+import math
+import json
+import random
+import numpy as np
+import torch
+
+from multiprocessing import Pool
+from PIL import Image, ImageFilter
+from .segbase import SegmentationDataset
+
+__all__ = ['PackedSegmentationDataset', 'pack_dataset']
+
+# samples start on page boundaries, so a crop maps only the pages of its rows
+_ALIGN = 4096
+# stored masks are uint8 with the ignored label -1 stored as 255
+_TARGETS = np.arange(256, dtype=np.int64)
+_TARGETS[255] = -1
+
+
+def _check_sample(sample):
+    img, mask, name = sample
+    mask = np.asarray(mask)
+    if mask.size and (mask.min() < -1 or mask.max() > 254):
+        raise ValueError('{}: labels must be in [-1, 254] to be packed as uint8'.format(name))
+    return np.ascontiguousarray(img, dtype=np.uint8), mask.astype(np.uint8), name
+
+
+def pack_dataset(name, out_dir, split='train', shard_size=1 << 30, workers=1, **kwargs):
+    """Pack a split of a dataset into a few large shards of raw uint8 images and masks.
+
+    Every image and mask is decoded once, through the dataset's own `_mask_transform`, and
+    appended to the current shard as an HxWx3 image followed by its HxW mask, where the
+    ignored label -1 is stored as 255. The shards and `index.json`, which holds the shard,
+    offset and size of every sample, are written to `out_dir/split`.
+
+    Parameters
+    ----------
+    name : str
+        Name of the dataset in `get_segmentation_dataset`.
+    out_dir : str
+        Root of the packed dataset.
+    split : str, default: 'train'
+        Split that is packed.
+    shard_size : int, default: 1 << 30
+        Size in bytes after which a new shard is started.
+    workers : int, default: 1
+        Processes decoding the images and masks.
+    kwargs
+        Arguments of the dataset, like `root`.
+
+    Returns
+    -------
+    str
+        Path of the index.
+    """
+    from . import get_segmentation_dataset
+
+    dataset = get_segmentation_dataset(name, split=split, mode='testval', transform=None, **kwargs)
+    if dataset.num_class > 255:
+        raise ValueError('{} classes cannot be packed as uint8 masks'.format(dataset.num_class))
+    folder = os.path.join(out_dir, split)
+    os.makedirs(folder, exist_ok=True)
+    index = {'version': PackedSegmentationDataset.VERSION, 'dataset': name, 'split': split,
+             'num_class': dataset.num_class, 'pred_offset': dataset.pred_offset, 'shards': [],
+             'names': [], 'shard': [], 'offset': [], 'height': [], 'width': []}
+    pool = Pool(workers) if workers > 1 else None
+    samples = pool.imap(dataset.__getitem__, range(len(dataset)), chunksize=4) if pool is not None else \
+        (dataset[i] for i in range(len(dataset)))
+    f, offset = None, 0
+    try:
+        for i, sample in enumerate(samples):
+            img, mask, filename = _check_sample(sample)
+            h, w = mask.shape
+            if img.shape != (h, w, 3):
+                raise ValueError('{}: image of shape {} and mask of shape {}'.format(filename, img.shape, mask.shape))
+            if f is None or (offset > 0 and offset + 4 * h * w > shard_size):
+                if f is not None:
+                    f.close()
+                index['shards'].append('shard-{:05d}.bin'.format(len(index['shards'])))
+                f, offset = open(os.path.join(folder, index['shards'][-1]), 'wb'), 0
+            f.seek(offset)
+            f.write(img.tobytes())
+            f.write(mask.tobytes())
+            index['names'].append(filename)
+            index['shard'].append(len(index['shards']) - 1)
+            index['offset'].append(offset)
+            index['height'].append(h)
+            index['width'].append(w)
+            offset += -(-4 * h * w // _ALIGN) * _ALIGN
+            if (i + 1) % 100 == 0:
+                print('Packed {}/{} {} images'.format(i + 1, len(dataset), split))
+    finally:
+        if f is not None:
+            f.close()
+        if pool is not None:
+            pool.terminate()
+    path = os.path.join(folder, 'index.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def _nearest_indices(size, out_size):
+    """Source index of every pixel of a PIL nearest resize of an axis, which adds the step to
+    the pixel position in double precision."""
+    steps = np.full(out_size, size / out_size)
+    steps[0] *= 0.5
+    return np.minimum(np.cumsum(steps).astype(np.intp), size - 1)
+
+
+class PackedSegmentationDataset(SegmentationDataset):
+    """Segmentation dataset read from the shards written by `pack_dataset`.
+
+    The shards are opened with `np.memmap`, and the random scale and crop of training, and
+    the center crop of validation, only read the rows and columns of the stored image that
+    the crop is resized from. The transforms follow `SegmentationDataset._sync_transform`
+    and draw the same random numbers, but the crop padding of the masks is always ignored.
+
+    Parameters
+    ----------
+    root : str
+        Root of the packed dataset, with a folder per split.
+    split : str
+        'train', 'val' or 'test'
+    transform : callable, optional
+        A function that transforms the image
+
+    Examples
+    --------
+    >>> pack_dataset('citys', '../datasets/packed/citys', split='train')
+    >>> trainset = PackedSegmentationDataset('../datasets/packed/citys', split='train')
+    """
+    VERSION = 1
+
+    def __init__(self, root='../datasets/packed/citys', split='train', mode=None, transform=None, **kwargs):
+        kwargs.pop('manifest', None)
+        super(PackedSegmentationDataset, self).__init__(root, split, mode, transform, **kwargs)
+        self.folder = os.path.join(self.root, self.split)
+        path = os.path.join(self.folder, 'index.json')
+        if not os.path.isfile(path):
+            raise RuntimeError("Found no packed index: " + path + "\n")
+        with open(path) as f:
+            index = json.load(f)
+        if index.get('version') != self.VERSION:
+            raise RuntimeError("Packed index of an unsupported version: " + path + "\n")
+        self.dataset = index['dataset']
+        self.names = index['names']
+        self.shards = index['shards']
+        self.samples = np.stack([index['shard'], index['offset'], index['height'], index['width']], 1).astype(np.int64)
+        self._num_class = index['num_class']
+        self._pred_offset = index['pred_offset']
+        self.mask_fill = 255
+        self._maps = {}
+
+    def __getstate__(self):
+        # the shards are mapped again in the worker processes
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        return state
+
+    def _load(self, index):
+        shard, offset, h, w = (int(v) for v in self.samples[index])
+        if shard not in self._maps:
+            self._maps[shard] = np.memmap(os.path.join(self.folder, self.shards[shard]), dtype=np.uint8, mode='r')
+        data = self._maps[shard]
+        img = data[offset:offset + 3 * h * w].reshape(h, w, 3)
+        mask = data[offset + 3 * h * w:offset + 4 * h * w].reshape(h, w)
+        return img, mask
+
+    def image_size(self, index):
+        if self.mode in ('train', 'val'):
+            return self.crop_size, self.crop_size
+        return int(self.samples[index, 2]), int(self.samples[index, 3])
+
+    def __getitem__(self, index):
+        img, mask = self._load(index)
+        if self.mode == 'test':
+            img = np.array(img)
+            if self.transform is not None:
+                img = self.transform(img)
+            return img, self.names[index]
+        if self.mode == 'train':
+            img, mask = self._sync_transform(img, mask)
+        elif self.mode == 'val':
+            img, mask = self._val_sync_transform(img, mask)
+        else:
+            assert self.mode == 'testval'
+            img, mask = np.array(img), self._mask_transform(mask)
+        if self.transform is not None:
+            img = self.transform(img)
+        return img, mask, self.names[index]
+
+    def _resized_crop(self, img, mask, flip, ow, oh, x1, y1):
+        """Crop of crop_size at (x1, y1) of the image mirrored if flip, resized to (ow, oh) and
+        padded at the bottom and right, resizing only the region of the stored image under it."""
+        h, w = mask.shape
+        crop_size = self.crop_size
+        cw, ch = min(crop_size, ow - x1), min(crop_size, oh - y1)
+        sx, sy = w / ow, h / oh
+        # box of the crop in the mirrored image, and the region read with the bilinear support
+        box = (x1 * sx, y1 * sy, (x1 + cw) * sx, (y1 + ch) * sy)
+        mx, my = math.ceil(sx) + 1, math.ceil(sy) + 1
+        rx0, ry0 = max(int(box[0]) - mx, 0), max(int(box[1]) - my, 0)
+        rx1, ry1 = min(math.ceil(box[2]) + mx, w), min(math.ceil(box[3]) + my, h)
+        box = (box[0] - rx0, box[1] - ry0, box[2] - rx0, box[3] - ry0)
+        # nearest rows and columns of the mask
+        ys = _nearest_indices(h, oh)[y1:y1 + ch]
+        xs = _nearest_indices(w, ow)[x1:x1 + cw]
+        if flip:
+            # columns [rx0, rx1) of the mirrored image are stored at [w - rx1, w - rx0)
+            img = img[ry0:ry1, w - rx1:w - rx0][:, ::-1]
+            xs = w - 1 - xs
+        else:
+            img = img[ry0:ry1, rx0:rx1]
+        img = Image.fromarray(np.ascontiguousarray(img)).resize((cw, ch), Image.BILINEAR, box=box)
+        mask = mask.take(ys, 0).take(xs, 1)
+        if (cw, ch) != (crop_size, crop_size):
+            padded = Image.new('RGB', (crop_size, crop_size), 0)
+            padded.paste(img, (0, 0))
+            img = padded
+            padded = np.full((crop_size, crop_size), self.mask_fill, dtype=np.uint8)
+            padded[:ch, :cw] = mask
+            mask = padded
+        return img, mask
+
+    def _val_sync_transform(self, img, mask):
+        outsize = self.crop_size
+        h, w = mask.shape
+        if w > h:
+            oh = outsize
+            ow = int(1.0 * w * oh / h)
+        else:
+            ow = outsize
+            oh = int(1.0 * h * ow / w)
+        # center crop
+        x1 = int(round((ow - outsize) / 2.))
+        y1 = int(round((oh - outsize) / 2.))
+        img, mask = self._resized_crop(img, mask, False, ow, oh, x1, y1)
+        return self._img_transform(img), self._mask_transform(mask)
+
+    def _sync_transform(self, img, mask):
+        # random mirror
+        flip = random.random() < 0.5
+        crop_size = self.crop_size
+        # random scale (short edge)
+        short_size = random.randint(int(self.base_size * 0.5), int(self.base_size * 2.0))
+        h, w = mask.shape
+        if h > w:
+            ow = short_size
+            oh = int(1.0 * h * ow / w)
+        else:
+            oh = short_size
+            ow = int(1.0 * w * oh / h)
+        # random crop crop_size of the image padded to crop_size
+        x1 = random.randint(0, max(ow, crop_size) - crop_size)
+        y1 = random.randint(0, max(oh, crop_size) - crop_size)
+        img, mask = self._resized_crop(img, mask, flip, ow, oh, x1, y1)
+        # gaussian blur as in PSP
+        if random.random() < 0.5:
+            img = img.filter(ImageFilter.GaussianBlur(radius=random.random()))
+        # final transform
+        return self._img_transform(img), self._mask_transform(mask)
+
+    def _mask_transform(self, mask):
+        return torch.from_numpy(np.take(_TARGETS, np.asarray(mask)))
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def num_class(self):
+        """Number of categories."""
+        return self._num_class
+
+    @property
+    def pred_offset(self):
+        return self._pred_offset
@@ -53,13 +53,14 @@ class VOCAugSegmentation(SegmentationDataset):
 
         self.images = []
         self.masks = []
+        manifest = self._get_manifest([_image_dir, _mask_dir])
         with open(os.path.join(_split_f), "r") as lines:
             for line in lines:
                 _image = os.path.join(_image_dir, line.rstrip('\n') + ".jpg")
-                assert os.path.isfile(_image)
+                assert manifest.isfile(_image)
                 self.images.append(_image)
                 _mask = os.path.join(_mask_dir, line.rstrip('\n') + ".mat")
-                assert os.path.isfile(_mask)
+                assert manifest.isfile(_mask)
                 self.masks.append(_mask)
 
         assert (len(self.images) == len(self.masks))
@@ -5,6 +5,7 @@ import numpy as np
 
 from PIL import Image
 from .segbase import SegmentationDataset
+from .manifest import DatasetManifest
 
 
 class SBUSegmentation(SegmentationDataset):
@@ -15,7 +16,9 @@ class SBUSegmentation(SegmentationDataset):
     def __init__(self, root='../datasets/sbu', split='train', mode=None, transform=None, **kwargs):
         super(SBUSegmentation, self).__init__(root, split, mode, transform, **kwargs)
         assert os.path.exists(self.root)
-        self.images, self.masks = _get_sbu_pairs(self.root, self.split)
+        manifest = self._get_manifest([os.path.join(self.root, 'SBUTrain4KRecoveredSmall'),
+                                       os.path.join(self.root, 'SBU-Test')])
+        self.images, self.masks = _get_sbu_pairs(self.root, self.split, manifest)
         assert (len(self.images) == len(self.masks))
         if len(self.images) == 0:
             raise RuntimeError("Found 0 images in subfolders of:" + root + "\n")
@@ -53,22 +56,22 @@ class SBUSegmentation(SegmentationDataset):
         return 0
 
 
-def _get_sbu_pairs(folder, split='train'):
+def _get_sbu_pairs(folder, split='train', manifest=None):
+    if manifest is None:
+        manifest = DatasetManifest([os.path.join(folder, 'SBUTrain4KRecoveredSmall'),
+                                    os.path.join(folder, 'SBU-Test')], cache=False)
+
     def get_path_pairs(img_folder, mask_folder):
         img_paths = []
         mask_paths = []
-        for root, _, files in os.walk(img_folder):
-            print(root)
-            for filename in files:
-                if filename.endswith('.jpg'):
-                    imgpath = os.path.join(root, filename)
-                    maskname = filename.replace('.jpg', '.png')
-                    maskpath = os.path.join(mask_folder, maskname)
-                    if os.path.isfile(imgpath) and os.path.isfile(maskpath):
-                        img_paths.append(imgpath)
-                        mask_paths.append(maskpath)
-                    else:
-                        print('cannot find the mask or image:', imgpath, maskpath)
+        for imgpath in manifest.files(img_folder, '.jpg'):
+            maskname = os.path.basename(imgpath).replace('.jpg', '.png')
+            maskpath = os.path.join(os.path.abspath(mask_folder), maskname)
+            if manifest.isfile(maskpath):
+                img_paths.append(imgpath)
+                mask_paths.append(maskpath)
+            else:
+                print('cannot find the mask or image:', imgpath, maskpath)
         print('Found {} images in the folder {}'.format(len(img_paths), img_folder))
         return img_paths, mask_paths
 
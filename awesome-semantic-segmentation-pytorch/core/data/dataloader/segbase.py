@@ -3,6 +3,7 @@ import random
 import numpy as np
 
 from PIL import Image, ImageOps, ImageFilter
+from .manifest import DatasetManifest
 
 __all__ = ['SegmentationDataset']
 
@@ -10,7 +11,7 @@ __all__ = ['SegmentationDataset']
 class SegmentationDataset(object):
     """Segmentation Base Dataset"""
 
-    def __init__(self, root, split, mode, transform, base_size=520, crop_size=480):
+    def __init__(self, root, split, mode, transform, base_size=520, crop_size=480, manifest=True):
         super(SegmentationDataset, self).__init__()
         self.root = root
         self.transform = transform
@@ -18,6 +19,21 @@ class SegmentationDataset(object):
         self.mode = mode if mode is not None else split
         self.base_size = base_size
         self.crop_size = crop_size
+        # mask value of the padding added by random crops, which must be ignored
+        self.mask_fill = 0
+        self.use_manifest = manifest
+
+    def _get_manifest(self, folders):
+        """Index of the files under the folders of the dataset, loaded from its cached
+        manifest unless the dataset was built with manifest=False."""
+        return DatasetManifest(folders, cache=self.use_manifest)
+
+    def image_size(self, index):
+        """(height, width) of the image returned for index, read from the file header only."""
+        if self.mode in ('train', 'val'):
+            return self.crop_size, self.crop_size
+        w, h = Image.open(self.images[index]).size
+        return h, w
 
     def _val_sync_transform(self, img, mask):
         outsize = self.crop_size
@@ -63,7 +79,7 @@ class SegmentationDataset(object):
             padh = crop_size - oh if oh < crop_size else 0
             padw = crop_size - ow if ow < crop_size else 0
             img = ImageOps.expand(img, border=(0, 0, padw, padh), fill=0)
-            mask = ImageOps.expand(mask, border=(0, 0, padw, padh), fill=0)
+            mask = ImageOps.expand(mask, border=(0, 0, padw, padh), fill=self.mask_fill)
         # random crop crop_size
         w, h = img.size
         x1 = random.randint(0, w - crop_size)
@@ -83,6 +99,11 @@ class SegmentationDataset(object):
     def _mask_transform(self, mask):
         return np.array(mask).astype('int32')
 
+    @property
+    def target_fill(self):
+        """Target of the mask padding, for augmentations applied after `_mask_transform`."""
+        return int(np.asarray(self._mask_transform(Image.new('L', (1, 1), self.mask_fill))).reshape(-1)[0])
+
     @property
     def num_class(self):
         """Number of categories."""
@@ -1,8 +1,12 @@
 """Prepare Cityscapes dataset"""
 import os
 import sys
+import time
 import argparse
 import zipfile
+import multiprocessing
+
+from PIL import Image
 
 # TODO: optim code
 cur_path = os.path.abspath(os.path.dirname(__file__))
@@ -10,6 +14,7 @@ root_path = os.path.split(os.path.split(os.path.split(cur_path)[0])[0])[0]
 sys.path.append(root_path)
 
 from core.utils import download, makedirs, check_sha1
+from core.data.dataloader.cityscapes import label_to_train_id, train_id_path
 
 _TARGET_DIR = os.path.expanduser('~/.torch/datasets/citys')
 
@@ -20,6 +25,10 @@ def parse_args():
         epilog='Example: python prepare_cityscapes.py',
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('--download-dir', default=None, help='dataset directory on disk')
+    parser.add_argument('--train-ids', action='store_true',
+                        help='only write the gtFine_labelTrainIds masks next to the gtFine_labelIds masks')
+    parser.add_argument('--workers', type=int, default=None, help='processes converting the masks')
+    parser.add_argument('--overwrite', action='store_true', help='convert the masks that are already converted')
     args = parser.parse_args()
     return args
 
@@ -42,8 +51,35 @@ def download_city(path, overwrite=False):
         print("Extracted", filename)
 
 
+def _convert_mask(path):
+    Image.fromarray(label_to_train_id(Image.open(path))).save(train_id_path(path))
+
+
+def convert_train_ids(path, workers=None, overwrite=False):
+    """Writes the uint8 gtFine_labelTrainIds mask of every gtFine_labelIds mask under `path`,
+    255 marking the ignored labels, so that `CitySegmentation(train_ids=True)` loads the
+    training targets without converting them."""
+    masks = []
+    for root, _, files in os.walk(os.path.join(path, 'gtFine')):
+        for filename in files:
+            if filename.endswith('_gtFine_labelIds.png'):
+                mask = os.path.join(root, filename)
+                if overwrite or not os.path.isfile(train_id_path(mask)) or \
+                        os.path.getmtime(train_id_path(mask)) < os.path.getmtime(mask):
+                    masks.append(mask)
+    start = time.time()
+    with multiprocessing.Pool(workers) as pool:
+        for i, _ in enumerate(pool.imap_unordered(_convert_mask, masks, chunksize=16)):
+            if (i + 1) % 500 == 0:
+                print('Converted {}/{} masks'.format(i + 1, len(masks)))
+    print('Converted {} masks in {:.1f}s'.format(len(masks), time.time() - start))
+
+
 if __name__ == '__main__':
     args = parse_args()
+    if args.train_ids:
+        convert_train_ids(args.download_dir or _TARGET_DIR, args.workers, args.overwrite)
+        sys.exit()
     makedirs(os.path.expanduser('~/.torch/datasets'))
     if args.download_dir is not None:
         if os.path.isdir(_TARGET_DIR):
@@ -5,11 +5,14 @@ import torch.nn.functional as F
 
 from core.models.base_models.resnet import resnet18
 from core.nn import _ConvBNReLU
+from .segbase import SegPredictMixin
 
 __all__ = ['BiSeNet', 'get_bisenet', 'get_bisenet_resnet18_citys']
 
 
-class BiSeNet(nn.Module):
+class BiSeNet(SegPredictMixin, nn.Module):
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='resnet18', aux=False, jpu=False, pretrained_base=True, **kwargs):
         super(BiSeNet, self).__init__()
         self.aux = aux
@@ -25,22 +28,25 @@ class BiSeNet(nn.Module):
                          ['spatial_path', 'context_path', 'ffm', 'head', 'auxlayer1', 'auxlayer2'] if aux else [
                              'spatial_path', 'context_path', 'ffm', 'head'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True, upsample=True):
         size = x.size()[2:]
         spatial_out = self.spatial_path(x)
         context_out = self.context_path(x)
         fusion_out = self.ffm(spatial_out, context_out[-1])
         outputs = []
         x = self.head(fusion_out)
-        x = F.interpolate(x, size, mode='bilinear', align_corners=True)
+        if upsample:
+            x = F.interpolate(x, size, mode='bilinear', align_corners=True)
         outputs.append(x)
 
-        if self.aux:
+        if self.aux and aux:
             auxout1 = self.auxlayer1(context_out[0])
-            auxout1 = F.interpolate(auxout1, size, mode='bilinear', align_corners=True)
+            if upsample:
+                auxout1 = F.interpolate(auxout1, size, mode='bilinear', align_corners=True)
             outputs.append(auxout1)
             auxout2 = self.auxlayer2(context_out[1])
-            auxout2 = F.interpolate(auxout2, size, mode='bilinear', align_corners=True)
+            if upsample:
+                auxout2 = F.interpolate(auxout2, size, mode='bilinear', align_corners=True)
             outputs.append(auxout2)
         return tuple(outputs)
 
@@ -204,7 +210,7 @@ def get_bisenet(dataset='citys', backbone='resnet18', pretrained=False, root='~/
     model = BiSeNet(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('bisenet_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
@@ -33,6 +33,8 @@ class CCNet(SegBaseModel):
         arXiv preprint arXiv:1811.11721 (2018).
     """
 
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='resnet50', aux=False, pretrained_base=True, **kwargs):
         super(CCNet, self).__init__(nclass, aux, backbone, pretrained_base=pretrained_base, **kwargs)
         self.head = _CCHead(nclass, **kwargs)
@@ -41,17 +43,17 @@ class CCNet(SegBaseModel):
 
         self.__setattr__('exclusive', ['head', 'auxlayer'] if aux else ['head'])
 
-    def forward(self, x):
-        size = x.size()[2:]
-        _, _, c3, c4 = self.base_forward(x)
+    def forward_head(self, size, c1, c2, c3, c4, aux=True, upsample=True):
         outputs = list()
         x = self.head(c4)
-        x = F.interpolate(x, size, mode='bilinear', align_corners=True)
+        if upsample:
+            x = F.interpolate(x, size, mode='bilinear', align_corners=True)
         outputs.append(x)
 
-        if self.aux:
+        if self.aux and aux:
             auxout = self.auxlayer(c3)
-            auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
+            if upsample:
+                auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
             outputs.append(auxout)
         return tuple(outputs)
 
@@ -111,7 +113,7 @@ def get_ccnet(dataset='pascal_voc', backbone='resnet50', pretrained=False, root=
     model = CCNet(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('ccnet_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
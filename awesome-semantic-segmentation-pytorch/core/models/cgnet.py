@@ -4,11 +4,12 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from core.nn import _ConvBNPReLU, _BNPReLU
+from .segbase import SegPredictMixin
 
 __all__ = ['CGNet', 'get_cgnet', 'get_cgnet_citys']
 
 
-class CGNet(nn.Module):
+class CGNet(SegPredictMixin, nn.Module):
     r"""CGNet
 
     Parameters
@@ -26,6 +27,8 @@ class CGNet(nn.Module):
         arXiv preprint arXiv:1811.08201 (2018).
     """
 
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='', aux=False, jpu=False, pretrained_base=True, M=3, N=21, **kwargs):
         super(CGNet, self).__init__()
         # stage 1
@@ -59,7 +62,7 @@ class CGNet(nn.Module):
                                        'bn_prelu1', 'stage2_0', 'stage2', 'bn_prelu2', 'stage3_0',
                                        'stage3', 'bn_prelu3', 'head'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True, upsample=True):
         size = x.size()[2:]
         # stage1
         out0 = self.stage1_0(x)
@@ -90,7 +93,8 @@ class CGNet(nn.Module):
 
         outputs = []
         out = self.head(out2_cat)
-        out = F.interpolate(out, size, mode='bilinear', align_corners=True)
+        if upsample:
+            out = F.interpolate(out, size, mode='bilinear', align_corners=True)
         outputs.append(out)
         return tuple(outputs)
 
@@ -195,7 +199,7 @@ def get_cgnet(dataset='citys', backbone='', pretrained=False, root='~/.torch/mod
     model = CGNet(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('cgnet_%s' % (acronyms[dataset]), root=root),
                               map_location=device))
     return model
@@ -29,23 +29,27 @@ class DANet(SegBaseModel):
         "Dual Attention Network for Scene Segmentation." *CVPR*, 2019
     """
 
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='resnet50', aux=True, pretrained_base=True, **kwargs):
         super(DANet, self).__init__(nclass, aux, backbone, pretrained_base=pretrained_base, **kwargs)
         self.head = _DAHead(2048, nclass, aux, **kwargs)
 
         self.__setattr__('exclusive', ['head'])
 
-    def forward(self, x):
-        size = x.size()[2:]
-        _, _, c3, c4 = self.base_forward(x)
+    def forward_head(self, size, c1, c2, c3, c4, aux=True, upsample=True):
         outputs = []
-        x = self.head(c4)
-        x0 = F.interpolate(x[0], size, mode='bilinear', align_corners=True)
+        x = self.head(c4, aux)
+        x0 = x[0]
+        if upsample:
+            x0 = F.interpolate(x0, size, mode='bilinear', align_corners=True)
         outputs.append(x0)
 
-        if self.aux:
-            x1 = F.interpolate(x[1], size, mode='bilinear', align_corners=True)
-            x2 = F.interpolate(x[2], size, mode='bilinear', align_corners=True)
+        if self.aux and aux:
+            x1, x2 = x[1], x[2]
+            if upsample:
+                x1 = F.interpolate(x1, size, mode='bilinear', align_corners=True)
+                x2 = F.interpolate(x2, size, mode='bilinear', align_corners=True)
             outputs.append(x1)
             outputs.append(x2)
         return outputs
@@ -137,7 +141,7 @@ class _DAHead(nn.Module):
                 nn.Conv2d(inter_channels, nclass, 1)
             )
 
-    def forward(self, x):
+    def forward(self, x, aux=True):
         feat_p = self.conv_p1(x)
         feat_p = self.pam(feat_p)
         feat_p = self.conv_p2(feat_p)
@@ -151,7 +155,7 @@ class _DAHead(nn.Module):
         outputs = []
         fusion_out = self.out(feat_fusion)
         outputs.append(fusion_out)
-        if self.aux:
+        if self.aux and aux:
             p_out = self.conv_p3(feat_p)
             c_out = self.conv_c3(feat_c)
             outputs.append(p_out)
@@ -191,7 +195,7 @@ def get_danet(dataset='citys', backbone='resnet50', pretrained=False,
     model = DANet(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('danet_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
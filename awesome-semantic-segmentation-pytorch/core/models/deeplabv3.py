@@ -32,6 +32,8 @@ class DeepLabV3(SegBaseModel):
         arXiv preprint arXiv:1706.05587 (2017).
     """
 
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='resnet50', aux=False, pretrained_base=True, **kwargs):
         super(DeepLabV3, self).__init__(nclass, aux, backbone, pretrained_base=pretrained_base, **kwargs)
         self.head = _DeepLabHead(nclass, **kwargs)
@@ -40,17 +42,17 @@ class DeepLabV3(SegBaseModel):
 
         self.__setattr__('exclusive', ['head', 'auxlayer'] if aux else ['head'])
 
-    def forward(self, x):
-        size = x.size()[2:]
-        _, _, c3, c4 = self.base_forward(x)
+    def forward_head(self, size, c1, c2, c3, c4, aux=True, upsample=True):
         outputs = []
         x = self.head(c4)
-        x = F.interpolate(x, size, mode='bilinear', align_corners=True)
+        if upsample:
+            x = F.interpolate(x, size, mode='bilinear', align_corners=True)
         outputs.append(x)
 
-        if self.aux:
+        if self.aux and aux:
             auxout = self.auxlayer(c3)
-            auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
+            if upsample:
+                auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
             outputs.append(auxout)
         return tuple(outputs)
 
@@ -149,7 +151,7 @@ def get_deeplabv3(dataset='pascal_voc', backbone='resnet50', pretrained=False, r
     model = DeepLabV3(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('deeplabv3_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
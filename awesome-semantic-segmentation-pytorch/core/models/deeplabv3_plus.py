@@ -6,11 +6,12 @@ from .base_models.xception import get_xception
 from .deeplabv3 import _ASPP
 from .fcn import _FCNHead
 from ..nn import _ConvBNReLU
+from .segbase import SegPredictMixin
 
 __all__ = ['DeepLabV3Plus', 'get_deeplabv3_plus', 'get_deeplabv3_plus_xception_voc']
 
 
-class DeepLabV3Plus(nn.Module):
+class DeepLabV3Plus(SegPredictMixin, nn.Module):
     r"""DeepLabV3Plus
     Parameters
     ----------
@@ -29,6 +30,8 @@ class DeepLabV3Plus(nn.Module):
         Image Segmentation."
     """
 
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='xception', aux=True, pretrained_base=True, dilated=True, **kwargs):
         super(DeepLabV3Plus, self).__init__()
         self.aux = aux
@@ -80,16 +83,18 @@ class DeepLabV3Plus(nn.Module):
         x = self.pretrained.relu(x)
         return low_level_feat, mid_level_feat, x
 
-    def forward(self, x):
+    def forward(self, x, aux=True, upsample=True):
         size = x.size()[2:]
         c1, c3, c4 = self.base_forward(x)
         outputs = list()
         x = self.head(c4, c1)
-        x = F.interpolate(x, size, mode='bilinear', align_corners=True)
+        if upsample:
+            x = F.interpolate(x, size, mode='bilinear', align_corners=True)
         outputs.append(x)
-        if self.aux:
+        if self.aux and aux:
             auxout = self.auxlayer(c3)
-            auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
+            if upsample:
+                auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
             outputs.append(auxout)
         return tuple(outputs)
 
@@ -127,7 +132,7 @@ def get_deeplabv3_plus(dataset='pascal_voc', backbone='xception', pretrained=Fal
     model = DeepLabV3Plus(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(
             torch.load(get_model_file('deeplabv3_plus_%s_%s' % (backbone, acronyms[dataset]), root=root),
                 map_location=device))
@@ -4,12 +4,15 @@ import torch.nn.functional as F
 
 from .base_models.densenet import *
 from .fcn import _FCNHead
+from .segbase import SegPredictMixin
 
 __all__ = ['DenseASPP', 'get_denseaspp', 'get_denseaspp_densenet121_citys',
            'get_denseaspp_densenet161_citys', 'get_denseaspp_densenet169_citys', 'get_denseaspp_densenet201_citys']
 
 
-class DenseASPP(nn.Module):
+class DenseASPP(SegPredictMixin, nn.Module):
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='densenet121', aux=False, jpu=False,
                  pretrained_base=True, dilate_scale=8, **kwargs):
         super(DenseASPP, self).__init__()
@@ -35,19 +38,21 @@ class DenseASPP(nn.Module):
 
         self.__setattr__('exclusive', ['head', 'auxlayer'] if aux else ['head'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True, upsample=True):
         size = x.size()[2:]
         features = self.pretrained.features(x)
         if self.dilate_scale > 8:
             features = F.interpolate(features, scale_factor=2, mode='bilinear', align_corners=True)
         outputs = []
         x = self.head(features)
-        x = F.interpolate(x, size, mode='bilinear', align_corners=True)
+        if upsample:
+            x = F.interpolate(x, size, mode='bilinear', align_corners=True)
         outputs.append(x)
 
-        if self.aux:
+        if self.aux and aux:
             auxout = self.auxlayer(features)
-            auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
+            if upsample:
+                auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
             outputs.append(auxout)
         return tuple(outputs)
 
@@ -150,7 +155,7 @@ def get_denseaspp(dataset='citys', backbone='densenet121', pretrained=False,
     model = DenseASPP(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('denseaspp_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
@@ -5,11 +5,12 @@ import torch.nn.functional as F
 
 from core.models.base_models import Enc, FCAttention, get_xception_a
 from core.nn import _ConvBNReLU
+from .segbase import SegPredictMixin
 
 __all__ = ['DFANet', 'get_dfanet', 'get_dfanet_citys']
 
 
-class DFANet(nn.Module):
+class DFANet(SegPredictMixin, nn.Module):
     def __init__(self, nclass, backbone='', aux=False, jpu=False, pretrained_base=False, **kwargs):
         super(DFANet, self).__init__()
         self.pretrained = get_xception_a(pretrained_base, **kwargs)
@@ -38,7 +39,7 @@ class DFANet(nn.Module):
                                        'enc2_1_reduce', 'enc2_2_reduce', 'enc2_3_reduce', 'conv_fusion', 'fca_1_reduce',
                                        'fca_2_reduce', 'fca_3_reduce', 'conv_out'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True):
         # backbone
         stage1_conv1 = self.pretrained.conv1(x)
         stage1_enc2 = self.pretrained.enc2(stage1_conv1)
@@ -97,7 +98,7 @@ def get_dfanet(dataset='citys', backbone='', pretrained=False, root='~/.torch/mo
     model = DFANet(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('dfanet_%s' % (acronyms[dataset]), root=root),
                               map_location=device))
     return model
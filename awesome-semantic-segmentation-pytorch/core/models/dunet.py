@@ -20,6 +20,8 @@ class DUNet(SegBaseModel):
         Data-Dependent Decoding Enables Flexible Feature Aggregation." CVPR, 2019
     """
 
+    head_low_level = True
+
     def __init__(self, nclass, backbone='resnet50', aux=True, pretrained_base=True, **kwargs):
         super(DUNet, self).__init__(nclass, aux, backbone, pretrained_base=pretrained_base, **kwargs)
         self.head = _DUHead(2144, **kwargs)
@@ -31,14 +33,13 @@ class DUNet(SegBaseModel):
         self.__setattr__('exclusive',
                          ['dupsample', 'head', 'auxlayer', 'aux_dupsample'] if aux else ['dupsample', 'head'])
 
-    def forward(self, x):
-        c1, c2, c3, c4 = self.base_forward(x)
+    def forward_head(self, size, c1, c2, c3, c4, aux=True):
         outputs = []
         x = self.head(c2, c3, c4)
         x = self.dupsample(x)
         outputs.append(x)
 
-        if self.aux:
+        if self.aux and aux:
             auxout = self.auxlayer(c3)
             auxout = self.aux_dupsample(auxout)
             outputs.append(auxout)
@@ -131,7 +132,7 @@ def get_dunet(dataset='pascal_voc', backbone='resnet50', pretrained=False,
     model = DUNet(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('dunet_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
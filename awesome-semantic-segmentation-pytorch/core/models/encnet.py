@@ -11,24 +11,26 @@ __all__ = ['EncNet', 'EncModule', 'get_encnet', 'get_encnet_resnet50_ade',
 
 
 class EncNet(SegBaseModel):
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='resnet50', aux=True, se_loss=True, lateral=False,
                  pretrained_base=True, **kwargs):
         super(EncNet, self).__init__(nclass, aux, backbone, pretrained_base=pretrained_base, **kwargs)
         self.head = _EncHead(2048, nclass, se_loss=se_loss, lateral=lateral, **kwargs)
+        self.head_low_level = lateral
         if aux:
             self.auxlayer = _FCNHead(1024, nclass, **kwargs)
 
         self.__setattr__('exclusive', ['head', 'auxlayer'] if aux else ['head'])
 
-    def forward(self, x):
-        size = x.size()[2:]
-        features = self.base_forward(x)
-
-        x = list(self.head(*features))
-        x[0] = F.interpolate(x[0], size, mode='bilinear', align_corners=True)
-        if self.aux:
-            auxout = self.auxlayer(features[2])
-            auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
+    def forward_head(self, size, c1, c2, c3, c4, aux=True, upsample=True):
+        x = list(self.head(c1, c2, c3, c4))
+        if upsample:
+            x[0] = F.interpolate(x[0], size, mode='bilinear', align_corners=True)
+        if self.aux and aux:
+            auxout = self.auxlayer(c3)
+            if upsample:
+                auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
             x.append(auxout)
         return tuple(x)
 
@@ -188,7 +190,7 @@ def get_encnet(dataset='pascal_voc', backbone='resnet50', pretrained=False, root
     model = EncNet(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('encnet_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
@@ -2,10 +2,12 @@
 import torch
 import torch.nn as nn
 
+from .segbase import SegPredictMixin
+
 __all__ = ['ENet', 'get_enet', 'get_enet_citys']
 
 
-class ENet(nn.Module):
+class ENet(SegPredictMixin, nn.Module):
     """Efficient Neural Network"""
 
     def __init__(self, nclass, backbone='', aux=False, jpu=False, pretrained_base=None, **kwargs):
@@ -54,7 +56,7 @@ class ENet(nn.Module):
                                        'bottleneck3_7', 'bottleneck3_8', 'bottleneck4_0', 'bottleneck4_1',
                                        'bottleneck4_2', 'bottleneck5_0', 'bottleneck5_1', 'fullconv'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True):
         # init
         x = self.initial(x)
 
@@ -227,7 +229,7 @@ def get_enet(dataset='citys', backbone='', pretrained=False, root='~/.torch/mode
     model = ENet(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('enet_%s' % (acronyms[dataset]), root=root),
                               map_location=device))
     return model
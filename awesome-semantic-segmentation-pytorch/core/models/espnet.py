@@ -5,9 +5,10 @@ import torch.nn.functional as F
 
 from core.models.base_models import eespnet, EESP
 from core.nn import _ConvBNPReLU, _BNPReLU
+from .segbase import SegPredictMixin
 
 
-class ESPNetV2(nn.Module):
+class ESPNetV2(SegPredictMixin, nn.Module):
     r"""ESPNetV2
 
     Parameters
@@ -48,7 +49,7 @@ class ESPNetV2(nn.Module):
 
         self.__setattr__('exclusive', ['proj_L4_C', 'pspMod', 'project_l3', 'act_l3', 'project_l2', 'project_l1'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True):
         size = x.size()[2:]
         out_l1, out_l2, out_l3, out_l4 = self.pretrained(x, seg=True)
         out_l4_proj = self.proj_L4_C(out_l4)
@@ -64,7 +65,7 @@ class ESPNetV2(nn.Module):
         outputs = list()
         merge1_l1 = F.interpolate(merge_l1, scale_factor=2, mode='bilinear', align_corners=True)
         outputs.append(merge1_l1)
-        if self.aux:
+        if self.aux and aux:
             # different from paper
             auxout = F.interpolate(proj_merge_l3_bef_act, size, mode='bilinear', align_corners=True)
             outputs.append(auxout)
@@ -103,7 +104,7 @@ def get_espnet(dataset='pascal_voc', backbone='', pretrained=False, root='~/.tor
     model = ESPNetV2(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('espnet_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
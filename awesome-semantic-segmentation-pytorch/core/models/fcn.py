@@ -4,14 +4,17 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from .base_models.vgg import vgg16
+from .segbase import SegPredictMixin
 
 __all__ = ['get_fcn32s', 'get_fcn16s', 'get_fcn8s',
            'get_fcn32s_vgg16_voc', 'get_fcn16s_vgg16_voc', 'get_fcn8s_vgg16_voc']
 
 
-class FCN32s(nn.Module):
+class FCN32s(SegPredictMixin, nn.Module):
     """There are some difference from original fcn"""
 
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='vgg16', aux=False, pretrained_base=True,
                  norm_layer=nn.BatchNorm2d, **kwargs):
         super(FCN32s, self).__init__()
@@ -26,24 +29,28 @@ class FCN32s(nn.Module):
 
         self.__setattr__('exclusive', ['head', 'auxlayer'] if aux else ['head'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True, upsample=True):
         size = x.size()[2:]
         pool5 = self.pretrained(x)
 
         outputs = []
         out = self.head(pool5)
-        out = F.interpolate(out, size, mode='bilinear', align_corners=True)
+        if upsample:
+            out = F.interpolate(out, size, mode='bilinear', align_corners=True)
         outputs.append(out)
 
-        if self.aux:
+        if self.aux and aux:
             auxout = self.auxlayer(pool5)
-            auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
+            if upsample:
+                auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
             outputs.append(auxout)
 
         return tuple(outputs)
 
 
-class FCN16s(nn.Module):
+class FCN16s(SegPredictMixin, nn.Module):
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='vgg16', aux=False, pretrained_base=True, norm_layer=nn.BatchNorm2d, **kwargs):
         super(FCN16s, self).__init__()
         self.aux = aux
@@ -60,7 +67,7 @@ class FCN16s(nn.Module):
 
         self.__setattr__('exclusive', ['head', 'score_pool4', 'auxlayer'] if aux else ['head', 'score_pool4'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True, upsample=True):
         pool4 = self.pool4(x)
         pool5 = self.pool5(pool4)
 
@@ -72,18 +79,23 @@ class FCN16s(nn.Module):
         upscore2 = F.interpolate(score_fr, score_pool4.size()[2:], mode='bilinear', align_corners=True)
         fuse_pool4 = upscore2 + score_pool4
 
-        out = F.interpolate(fuse_pool4, x.size()[2:], mode='bilinear', align_corners=True)
+        out = fuse_pool4
+        if upsample:
+            out = F.interpolate(out, x.size()[2:], mode='bilinear', align_corners=True)
         outputs.append(out)
 
-        if self.aux:
+        if self.aux and aux:
             auxout = self.auxlayer(pool5)
-            auxout = F.interpolate(auxout, x.size()[2:], mode='bilinear', align_corners=True)
+            if upsample:
+                auxout = F.interpolate(auxout, x.size()[2:], mode='bilinear', align_corners=True)
             outputs.append(auxout)
 
         return tuple(outputs)
 
 
-class FCN8s(nn.Module):
+class FCN8s(SegPredictMixin, nn.Module):
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='vgg16', aux=False, pretrained_base=True, norm_layer=nn.BatchNorm2d, **kwargs):
         super(FCN8s, self).__init__()
         self.aux = aux
@@ -104,7 +116,7 @@ class FCN8s(nn.Module):
                          ['head', 'score_pool3', 'score_pool4', 'auxlayer'] if aux else ['head', 'score_pool3',
                                                                                          'score_pool4'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True, upsample=True):
         pool3 = self.pool3(x)
         pool4 = self.pool4(pool3)
         pool5 = self.pool5(pool4)
@@ -121,12 +133,15 @@ class FCN8s(nn.Module):
         upscore_pool4 = F.interpolate(fuse_pool4, score_pool3.size()[2:], mode='bilinear', align_corners=True)
         fuse_pool3 = upscore_pool4 + score_pool3
 
-        out = F.interpolate(fuse_pool3, x.size()[2:], mode='bilinear', align_corners=True)
+        out = fuse_pool3
+        if upsample:
+            out = F.interpolate(out, x.size()[2:], mode='bilinear', align_corners=True)
         outputs.append(out)
 
-        if self.aux:
+        if self.aux and aux:
             auxout = self.auxlayer(pool5)
-            auxout = F.interpolate(auxout, x.size()[2:], mode='bilinear', align_corners=True)
+            if upsample:
+                auxout = F.interpolate(auxout, x.size()[2:], mode='bilinear', align_corners=True)
             outputs.append(auxout)
 
         return tuple(outputs)
@@ -162,7 +177,7 @@ def get_fcn32s(dataset='pascal_voc', backbone='vgg16', pretrained=False, root='~
     model = FCN32s(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(0)
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('fcn32s_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
@@ -182,7 +197,7 @@ def get_fcn16s(dataset='pascal_voc', backbone='vgg16', pretrained=False, root='~
     model = FCN16s(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(0)
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('fcn16s_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
@@ -202,7 +217,7 @@ def get_fcn8s(dataset='pascal_voc', backbone='vgg16', pretrained=False, root='~/
     model = FCN8s(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('fcn8s_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
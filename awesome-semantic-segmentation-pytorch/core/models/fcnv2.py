@@ -12,6 +12,8 @@ __all__ = ['FCN', 'get_fcn', 'get_fcn_resnet50_voc',
 
 
 class FCN(SegBaseModel):
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='resnet50', aux=True, pretrained_base=True, **kwargs):
         super(FCN, self).__init__(nclass, aux, backbone, pretrained_base=pretrained_base, **kwargs)
         self.head = _FCNHead(2048, nclass, **kwargs)
@@ -20,17 +22,17 @@ class FCN(SegBaseModel):
 
         self.__setattr__('exclusive', ['head', 'auxlayer'] if aux else ['head'])
 
-    def forward(self, x):
-        size = x.size()[2:]
-        _, _, c3, c4 = self.base_forward(x)
+    def forward_head(self, size, c1, c2, c3, c4, aux=True, upsample=True):
 
         outputs = []
         x = self.head(c4)
-        x = F.interpolate(x, size, mode='bilinear', align_corners=True)
+        if upsample:
+            x = F.interpolate(x, size, mode='bilinear', align_corners=True)
         outputs.append(x)
-        if self.aux:
+        if self.aux and aux:
             auxout = self.auxlayer(c3)
-            auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
+            if upsample:
+                auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
             outputs.append(auxout)
         return tuple(outputs)
 
@@ -64,7 +66,7 @@ def get_fcn(dataset='pascal_voc', backbone='resnet50', pretrained=False, root='~
     model = FCN(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('fcn_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
@@ -26,7 +26,7 @@ class ICNet(SegBaseModel):
 
         self.__setattr__('exclusive', ['conv_sub1', 'head'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True):
         # sub 1
         x_sub1 = self.conv_sub1(x)
 
@@ -139,7 +139,7 @@ def get_icnet(dataset='citys', backbone='resnet50', pretrained=False, root='~/.t
     model = ICNet(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('icnet_%s_%s' % (backbone, acronyms[dataset]), root=root),
                               map_location=device))
     return model
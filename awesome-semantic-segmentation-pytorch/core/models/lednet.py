@@ -4,10 +4,11 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from core.nn import _ConvBNReLU
+from .segbase import SegPredictMixin
 
 __all__ = ['LEDNet', 'get_lednet', 'get_lednet_citys']
 
-class LEDNet(nn.Module):
+class LEDNet(SegPredictMixin, nn.Module):
     r"""LEDNet
 
     Parameters
@@ -28,6 +29,8 @@ class LEDNet(nn.Module):
         arXiv preprint arXiv:1905.02423 (2019).
     """
 
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='', aux=False, jpu=False, pretrained_base=True, **kwargs):
         super(LEDNet, self).__init__()
         self.encoder = nn.Sequential(
@@ -49,12 +52,13 @@ class LEDNet(nn.Module):
 
         self.__setattr__('exclusive', ['encoder', 'decoder'])
 
-    def forward(self, x):
+    def forward(self, x, aux=True, upsample=True):
         size = x.size()[2:]
         x = self.encoder(x)
         x = self.decoder(x)
         outputs = list()
-        x = F.interpolate(x, size, mode='bilinear', align_corners=True)
+        if upsample:
+            x = F.interpolate(x, size, mode='bilinear', align_corners=True)
         outputs.append(x)
 
         return tuple(outputs)
@@ -180,7 +184,7 @@ def get_lednet(dataset='citys', backbone='', pretrained=False, root='~/.torch/mo
     model = LEDNet(datasets[dataset].NUM_CLASS, backbone=backbone, pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('lednet_%s' % (acronyms[dataset]), root=root),
                               map_location=device))
     return model
@@ -30,6 +30,8 @@ class OCNet(SegBaseModel):
         arXiv preprint arXiv:1809.00916 (2018).
     """
 
+    upsamples_last = True
+
     def __init__(self, nclass, backbone='resnet101', oc_arch='base', aux=False, pretrained_base=True, **kwargs):
         super(OCNet, self).__init__(nclass, aux, backbone, pretrained_base=pretrained_base, **kwargs)
         self.head = _OCHead(nclass, oc_arch, **kwargs)
@@ -38,17 +40,17 @@ class OCNet(SegBaseModel):
 
         self.__setattr__('exclusive', ['head', 'auxlayer'] if aux else ['head'])
 
-    def forward(self, x):
-        size = x.size()[2:]
-        _, _, c3, c4 = self.base_forward(x)
+    def forward_head(self, size, c1, c2, c3, c4, aux=True, upsample=True):
         outputs = []
         x = self.head(c4)
-        x = F.interpolate(x, size, mode='bilinear', align_corners=True)
+        if upsample:
+            x = F.interpolate(x, size, mode='bilinear', align_corners=True)
         outputs.append(x)
 
-        if self.aux:
+        if self.aux and aux:
             auxout = self.auxlayer(c3)
-            auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
+            if upsample:
+                auxout = F.interpolate(auxout, size, mode='bilinear', align_corners=True)
             outputs.append(auxout)
         return tuple(outputs)
 
@@ -320,7 +322,7 @@ def get_ocnet(dataset='citys', backbone='resnet50', oc_arch='base', pretrained=F
                   pretrained_base=pretrained_base, **kwargs)
     if pretrained:
         from .model_store import get_model_file
-        device = torch.device(kwargs['local_rank'])
+        device = torch.device('cpu')
         model.load_state_dict(torch.load(get_model_file('%s_ocnet_%s_%s' % (
             oc_arch, backbone, acronyms[dataset]), root=root),
             map_location=device))
@@ -1,13 +1,86 @@
 """Base Model for Semantic Segmentation"""
+import torch
 import torch.nn as nn
 
 from ..nn import JPU
+from ..utils.upsample_argmax import strip_argmax, label_upsampling_argmax
 from .base_models.resnetv1b import resnet50_v1s, resnet101_v1s, resnet152_v1s
 
-__all__ = ['SegBaseModel']
+__all__ = ['SegBaseModel', 'SegPredictMixin']
 
 
-class SegBaseModel(nn.Module):
+class SegPredictMixin(object):
+    """Adds `predict`, the inference-only path returning label maps, to a segmentation model.
+
+    The forward of the model takes an `aux` keyword, True by default, which `predict` sets to
+    False so that the auxiliary outputs are not computed. Models whose last step is the bilinear
+    upsampling of their logits to the input size set `upsamples_last`, and their forward then
+    also takes an `upsample` keyword, which `predict` sets to False to get the logits at the
+    head's resolution.
+    """
+
+    upsamples_last = False
+
+    def predict(self, x, confidence=False, upsample='logits', strip_rows=64, features=None):
+        """Predict the label map of a batch of images.
+
+        The model runs with `aux=False`, so only the main output is computed and upsampled.
+        The argmax is taken on the model's device and the labels are returned as uint8, which
+        is 4 * nclass times smaller than the float32 logits to copy to the host.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            Normalized images with shape `N, 3, H, W`.
+        confidence : bool, default: False
+            Also return the softmax probability of the predicted class of every pixel.
+        upsample : str, default: 'logits'
+            How the logits are brought to the input size. 'logits' runs the model's own
+            upsampling of the whole `N, nclass, H, W` logits. 'strips' upsamples them
+            `strip_rows` rows at a time and gives the same labels with a fraction of the
+            memory. 'labels' takes the argmax at the head's resolution and only compares
+            interpolated logits on label edges, which is faster and approximate. Both
+            fall back to 'logits' for models which do not set `upsamples_last`.
+        strip_rows : int, default: 64
+            Number of rows per strip with `upsample='strips'`.
+        features : tuple of torch.Tensor, optional
+            The `c1, c2, c3, c4` backbone features of `x`, which only the head of a
+            `SegBaseModel` then runs on, through `forward_head`.
+
+        Returns
+        -------
+        labels : torch.Tensor
+            uint8 label maps with shape `N, H, W` (int16 for more than 256 classes).
+        confidence : torch.Tensor
+            float32 top-1 probabilities with shape `N, H, W`, only if `confidence` is set.
+        """
+        if upsample not in ('logits', 'strips', 'labels'):
+            raise ValueError('unknown upsample mode: {}'.format(upsample))
+        if upsample == 'labels' and confidence:
+            raise ValueError("confidence is not available with upsample='labels'")
+        if upsample == 'logits' or not self.upsamples_last:
+            upsample, kwargs = 'logits', {'aux': False}
+        else:
+            kwargs = {'aux': False, 'upsample': False}
+        with torch.no_grad():
+            if features is None:
+                logits = self.forward(x, **kwargs)[0]
+            else:
+                logits = self.forward_head(x.shape[2:], *features, **kwargs)[0]
+            if upsample != 'logits':
+                # the logits are at the head's resolution
+                if upsample == 'strips':
+                    return strip_argmax(logits, x.shape[2:], strip_rows, confidence)
+                return label_upsampling_argmax(logits, x.shape[2:])
+        top, labels = logits.max(1)
+        labels = labels.to(torch.uint8 if logits.size(1) <= 256 else torch.int16)
+        if not confidence:
+            return labels
+        # softmax of the top class: 1 / sum(exp(logits - top))
+        return labels, torch.exp(logits - top.unsqueeze(1)).sum(1).reciprocal_()
+
+
+class SegBaseModel(SegPredictMixin, nn.Module):
     r"""Base Model for Semantic Segmentation
 
     Parameters
@@ -15,8 +88,14 @@ class SegBaseModel(nn.Module):
     backbone : string
         Pre-trained dilated backbone network type (default:'resnet50'; 'resnet50',
         'resnet101' or 'resnet152').
+
+    Subclasses implement `forward_head(size, c1, c2, c3, c4, aux=True)`, the head run on the
+    backbone features of images of the given size, unless they override `forward`. Those
+    whose head uses the low-level features `c1` or `c2` set `head_low_level`.
     """
 
+    head_low_level = False
+
     def __init__(self, nclass, aux, backbone='resnet50', jpu=False, pretrained_base=True, **kwargs):
         super(SegBaseModel, self).__init__()
         dilated = False if jpu else True
@@ -33,6 +112,9 @@ class SegBaseModel(nn.Module):
 
         self.jpu = JPU([512, 1024, 2048], width=512, **kwargs) if jpu else None
 
+    def forward(self, x, **kwargs):
+        return self.forward_head(x.size()[2:], *self.base_forward(x), **kwargs)
+
     def base_forward(self, x):
         """forwarding pre-trained network"""
         x = self.pretrained.conv1(x)
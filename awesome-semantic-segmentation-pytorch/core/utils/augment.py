@@ -0,0 +1,195 @@
+"""Batched training augmentation of decoded uint8 tensors"""
+import math
+import random
+import numpy as np
+import torch
+
+__all__ = ['BatchAugmentation', 'normalize']
+
+
+def normalize(images, sizes=None, mean=(.485, .456, .406), std=(.229, .224, .225)):
+    """Float B x 3 x H x W tensor of uint8 B x H x W x 3 images, scaled to [0, 1] and normalized
+    like `transforms.ToTensor` and `transforms.Normalize`, on the device of the images. With the
+    (height, width) sizes of the samples, the padding past them is set to 0 like the padding of
+    `pad_batch_collate`."""
+    mean = torch.tensor(mean, device=images.device).view(1, 3, 1, 1)
+    std = torch.tensor(std, device=images.device).view(1, 3, 1, 1)
+    # one pass converts and transposes into a contiguous batch, which is then scaled in place
+    b, h, w, c = images.shape
+    images = torch.empty((b, c, h, w), device=images.device).copy_(images.permute(0, 3, 1, 2))
+    images.mul_(1 / (255 * std)).sub_(mean / std)
+    if sizes is not None:
+        for i, (h, w) in enumerate(torch.as_tensor(sizes).tolist()):
+            images[i, :, h:] = 0
+            images[i, :, :h, w:] = 0
+    return images
+
+
+def _bilinear_coeffs(size, out_size, start, length, flip):
+    """Source indices and weights, of shape length x K, of the output pixels [start, start +
+    length) of a PIL bilinear resize of an axis from size to out_size, computed like PIL's
+    `precompute_coeffs`. Output pixels past out_size are padding and get zero weights."""
+    scale = size / out_size
+    support = max(scale, 1.0)
+    center = (start + np.arange(length) + 0.5) * scale
+    xmin = np.maximum(np.trunc(center - support + 0.5), 0).astype(np.int64)
+    xmax = np.minimum(np.trunc(center + support + 0.5), size).astype(np.int64)
+    index = xmin[:, None] + np.arange(int(math.ceil(support)) * 2 + 1)
+    weight = np.maximum(1 - np.abs((index - center[:, None] + 0.5) / support), 0)
+    weight[index >= xmax[:, None]] = 0
+    weight /= np.maximum(weight.sum(1, keepdims=True), 1e-12)
+    weight[start + np.arange(length) >= out_size] = 0
+    index = np.minimum(index, size - 1)
+    # the PIL path mirrors the image before resizing it
+    return (size - 1 - index if flip else index), weight
+
+
+def _nearest_index(size, out_size, start, length):
+    """Source indices of the output pixels [start, start + length) of a PIL nearest resize of an
+    axis, which adds the step to the pixel position in double precision."""
+    steps = np.full(start + length, size / out_size)
+    steps[0] *= 0.5
+    return np.minimum(np.cumsum(steps)[start:].astype(np.int64), size - 1)
+
+
+def _resample(images, index, weight):
+    """Weighted sum, over the K taps, of the rows index[b, i, k] of each B x N x ... tensor,
+    weighted by weight[b, i, k], as a float B x L x ... tensor. Each tap is one index_select of
+    whole rows of the batch flattened along its first two dimensions."""
+    b, n = images.shape[:2]
+    flat = images.reshape((b * n,) + images.shape[2:])
+    index = index + torch.arange(0, b * n, n, device=index.device)[:, None, None]
+    shape = (b, index.shape[1]) + images.shape[2:]
+    weight = weight.view(weight.shape + (1,) * (images.dim() - 2))
+    out = torch.zeros(shape, device=images.device)
+    for k in range(index.shape[2]):
+        out.addcmul_(weight[:, :, k], flat.index_select(0, index[:, :, k].reshape(-1)).view(shape).float())
+    return out
+
+
+def _stack(tables, dtype):
+    """Stacks length x K tables of different K into a B x length x K tensor, padded with zeros."""
+    width = max(table.shape[1] for table in tables)
+    return torch.from_numpy(np.stack([np.pad(table, ((0, 0), (0, width - table.shape[1]))) for table in tables])
+                            .astype(dtype))
+
+
+class BatchAugmentation(object):
+    """Random mirror, short-edge scale, pad, crop and Gaussian blur of a batch of images and
+    masks, with the semantics of `SegmentationDataset._sync_transform`.
+
+    The DataLoader workers then only decode the images and masks, which are collated with
+    `uint8_batch_collate` and augmented on the training device. The random parameters of
+    each sample are drawn from `random` in the same order as `_sync_transform`. The bilinear
+    resize uses the weights of PIL, antialiasing included, and the nearest resize of the masks
+    the same source pixels as PIL, so a mask is identical to the one of the PIL path for the
+    same random state and the image is within a few levels of it. The mirror, scale, pad and
+    crop are one `index_select` of whole rows per filter tap along each axis, restricted to the
+    region of the batch under the crops. The blur is the 3-pass box blur PIL approximates the
+    Gaussian with.
+
+    Parameters
+    ----------
+    base_size : int, default: 520
+        Short edge the random scale in [0.5, 2.0] applies to.
+    crop_size : int, default: 480
+        Size of the square crops.
+    mask_fill : int, default: -1
+        Target of the mask padding, `dataset.target_fill` of the dataset.
+    """
+
+    def __init__(self, base_size=520, crop_size=480, mask_fill=-1):
+        self.base_size = base_size
+        self.crop_size = crop_size
+        self.mask_fill = mask_fill
+
+    def sample_params(self, sizes):
+        """(flip, ow, oh, x1, y1, radius) of each (height, width), with radius None when the
+        sample is not blurred."""
+        crop_size = self.crop_size
+        params = []
+        for h, w in sizes:
+            flip = random.random() < 0.5
+            short_size = random.randint(int(self.base_size * 0.5), int(self.base_size * 2.0))
+            if h > w:
+                ow = short_size
+                oh = int(1.0 * h * ow / w)
+            else:
+                oh = short_size
+                ow = int(1.0 * w * oh / h)
+            x1 = random.randint(0, max(ow, crop_size) - crop_size)
+            y1 = random.randint(0, max(oh, crop_size) - crop_size)
+            radius = random.random() if random.random() < 0.5 else None
+            params.append((flip, ow, oh, x1, y1, radius))
+        return params
+
+    def __call__(self, images, masks, sizes, params=None):
+        """Augmented uint8 B x crop x crop x 3 images and B x crop x crop masks, from the
+        B x H x W x 3 images and B x H x W masks whose samples have the (height, width) sizes."""
+        sizes = [tuple(size) for size in torch.as_tensor(sizes).tolist()]
+        if params is None:
+            params = self.sample_params(sizes)
+        device, crop_size = images.device, self.crop_size
+        xs, wxs, ys, wys, mxs, mys = [], [], [], [], [], []
+        for (h, w), (flip, ow, oh, x1, y1, _) in zip(sizes, params):
+            index, weight = _bilinear_coeffs(w, ow, x1, crop_size, flip)
+            xs.append(index)
+            wxs.append(weight)
+            index, weight = _bilinear_coeffs(h, oh, y1, crop_size, False)
+            ys.append(index)
+            wys.append(weight)
+            index = _nearest_index(w, ow, x1, min(crop_size, ow - x1))
+            mxs.append(np.pad(w - 1 - index if flip else index, (0, crop_size - len(index)), constant_values=-1))
+            index = _nearest_index(h, oh, y1, min(crop_size, oh - y1))
+            mys.append(np.pad(index, (0, crop_size - len(index)), constant_values=-1))
+        xs, wxs = _stack(xs, np.int64).to(device), _stack(wxs, np.float32).to(device)
+        ys, wys = _stack(ys, np.int64).to(device), _stack(wys, np.float32).to(device)
+        # region of the batch under the crops
+        x0, x1 = int(xs[wxs > 0].min()), int(xs[wxs > 0].max()) + 1
+        y0, y1 = int(ys[wys > 0].min()), int(ys[wys > 0].max()) + 1
+        xs, ys = (xs - x0).clamp(0, x1 - x0 - 1), (ys - y0).clamp(0, y1 - y0 - 1)
+        # horizontal pass on the columns, rounded to uint8 levels like PIL, then vertical pass
+        columns = images[:, y0:y1, x0:x1].transpose(1, 2).contiguous()
+        rows = _resample(columns, xs, wxs).round_().clamp_(0, 255).to(torch.uint8).transpose(1, 2).contiguous()
+        images = _resample(rows, ys, wys).round_().clamp_(0, 255)
+        blurred = [i for i, param in enumerate(params) if param[5] is not None]
+        if blurred:
+            index = torch.tensor(blurred, device=device)
+            images[index] = self._blur(images[index], [params[i][5] for i in blurred])
+        images = images.round_().clamp_(0, 255).to(torch.uint8)
+        # nearest rows and columns of the masks, with -1 for the padding
+        mxs = torch.from_numpy(np.stack(mxs)).to(device)
+        mys = torch.from_numpy(np.stack(mys)).to(device)
+        b, h, w = masks.shape
+        rows = (mys.clamp(min=0) + torch.arange(0, b * h, h, device=device)[:, None]).reshape(-1)
+        masks = masks.reshape(b * h, w).index_select(0, rows).view(b, crop_size, w)
+        masks = masks.gather(2, mxs.clamp(min=0)[:, None, :].expand(b, crop_size, crop_size))
+        pad = (mys[:, :, None] < 0) | (mxs[:, None, :] < 0)
+        masks = masks.masked_fill(pad, self.mask_fill)
+        return images, masks
+
+    @staticmethod
+    def _blur(images, radii):
+        """Blur of the B x H x W x C images with the kernel of PIL's `GaussianBlur`: three passes
+        of a box blur of radius r^2 / (6 - 2 r^2) per axis, for radii below 1, with the edges
+        extended."""
+        kernels = []
+        for radius in radii:
+            a = radius * radius / (6 - 2 * radius * radius)
+            kernel = np.array([1.0])
+            for _ in range(3):
+                kernel = np.convolve(kernel, np.array([a, 1, a]) / (1 + 2 * a))
+            kernels.append(kernel)
+        kernels = torch.from_numpy(np.stack(kernels).astype(np.float32)).to(images.device).view(-1, 7, 1, 1, 1)
+        b, h, w, c = images.shape
+        rows = torch.arange(-3, h + 3, device=images.device).clamp_(0, h - 1)
+        columns = torch.arange(-3, w + 3, device=images.device).clamp_(0, w - 1)
+        padded = images.index_select(1, rows)
+        out = kernels[:, 0] * padded[:, :h]
+        for k in range(1, 7):
+            out.addcmul_(kernels[:, k], padded[:, k:k + h])
+        padded = out.index_select(2, columns)
+        out = kernels[:, 0] * padded[:, :, :w]
+        for k in range(1, 7):
+            out.addcmul_(kernels[:, k], padded[:, :, k:k + w])
+        return out
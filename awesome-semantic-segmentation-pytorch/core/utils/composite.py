@@ -0,0 +1,105 @@
+"""Color and overlay compositing of label maps with lookup tables"""
+import numpy as np
+import torch
+from PIL import Image
+
+__all__ = ['Palette', 'get_palette']
+
+
+class Palette(object):
+    """Color lookup table turning label maps into colors or overlays.
+
+    Colorizing is one gather into the 256 x 3 table, indexed by the labels cast to uint8, so
+    -1 maps to entry 255 like in the palette images of `get_color_pallete`. Overlays gather
+    the colors premultiplied by `alpha` in 8-bit fixed point and add them to the image scaled
+    by `1 - alpha`, all in integers. Labels and images can be numpy arrays or torch tensors,
+    on any device and with any leading batch dimensions; images are channel-last,
+    `..., H, W, 3`.
+
+    Parameters
+    ----------
+    colors : array_like
+        Flat list or N x 3 array of RGB colors, padded with black to 256 entries.
+    shift : int, default: 0
+        Offset added to the labels before the lookup, 1 for ADE20K whose palette starts with
+        the color of the ignored label.
+    """
+
+    def __init__(self, colors, shift=0):
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)[:256]
+        self.colors = np.zeros((256, 3), dtype=np.uint8)
+        self.colors[:len(colors)] = colors
+        self.shift = shift
+        # entry i holds the color of label i, so the lookup needs no addition
+        self.lut = np.roll(self.colors, -shift, 0)
+        self._tensors = {}
+
+    def _blend_table(self, weight):
+        return self.lut.astype(np.uint16) * np.uint16(weight)
+
+    def _tensor(self, table, key, device):
+        key = (key, device)
+        if key not in self._tensors:
+            self._tensors[key] = torch.from_numpy(table).to(device)
+        return self._tensors[key]
+
+    @staticmethod
+    def _gather(table, labels):
+        # index_select on the flattened labels is faster than advanced indexing
+        flat = labels.reshape(-1).long() & 255
+        return table.index_select(0, flat).reshape(labels.shape + table.shape[1:])
+
+    def colorize(self, labels):
+        """RGB uint8 colors of the labels, with shape `labels.shape + (3,)`."""
+        if isinstance(labels, torch.Tensor):
+            return self._gather(self._tensor(self.lut, 'lut', labels.device), labels)
+        # take is several times faster than advanced indexing with a 2-d table
+        return np.take(self.lut, labels.astype(np.uint8, copy=False), axis=0)
+
+    def overlay(self, image, labels, alpha=0.5):
+        """uint8 blend of the label colors over the RGB image, with weight `alpha`.
+
+        The weights are rounded to multiples of 1/256, so for weights other than 0, 0.5 and 1
+        the result can differ by one from a float blend truncated to uint8.
+        """
+        weight = int(round(alpha * 256))
+        if isinstance(labels, torch.Tensor):
+            table = self._tensor(self._blend_table(weight).astype(np.int32), ('blend', weight), labels.device)
+            out = image.to(torch.int32) * (256 - weight)
+            out += self._gather(table, labels)
+            return (out >> 8).to(torch.uint8)
+        out = np.multiply(image, np.uint16(256 - weight), dtype=np.uint16)
+        out += np.take(self._blend_table(weight), labels.astype(np.uint8, copy=False), axis=0)
+        out >>= 8
+        return out.astype(np.uint8)
+
+    def bgr(self):
+        """The same palette with the blue and red channels swapped, for OpenCV images."""
+        return Palette(self.colors[:, ::-1], self.shift)
+
+    def to_image(self, labels):
+        """Palette PIL image of an H x W label map, the index of a pixel being its label plus
+        `shift`."""
+        indices = labels.astype(np.uint8)
+        if self.shift:
+            indices += np.uint8(self.shift)
+        out_img = Image.fromarray(indices)
+        out_img.putpalette(self.colors.ravel().tolist())
+        return out_img
+
+
+_palettes = {}
+
+
+def get_palette(dataset='pascal_voc'):
+    """The cached `Palette` of a dataset, with the colors of `get_color_pallete`."""
+    from .visualize import vocpallete, adepallete, cityspallete
+
+    if dataset not in _palettes:
+        if dataset == 'ade20k':
+            _palettes[dataset] = Palette(adepallete, shift=1)
+        elif dataset == 'citys':
+            _palettes[dataset] = Palette(cityspallete)
+        else:
+            _palettes[dataset] = Palette(vocpallete)
+    return _palettes[dataset]
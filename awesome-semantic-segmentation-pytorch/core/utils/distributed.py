@@ -7,11 +7,14 @@ import pickle
 import torch
 import torch.utils.data as data
 import torch.distributed as dist
+import torch.nn.functional as F
 
 from torch.utils.data.sampler import Sampler, BatchSampler
+from torch.utils.data.dataloader import default_collate
 
 __all__ = ['get_world_size', 'get_rank', 'synchronize', 'is_main_process',
            'all_gather', 'make_data_sampler', 'make_batch_data_sampler',
+           'make_bucket_batch_sampler', 'pad_batch_collate', 'uint8_batch_collate',
            'reduce_dict', 'reduce_loss_dict']
 
 
@@ -165,6 +168,72 @@ def make_batch_data_sampler(sampler, images_per_batch, num_iters=None, start_ite
     return batch_sampler
 
 
+def make_bucket_batch_sampler(dataset, sampler, images_per_batch, max_pixels=None, size_divisor=None):
+    """
+    Builds a `BucketBatchSampler` over the indices of a sampler, reading the (height, width)
+    of every sample from `dataset.image_size` so that no image is decoded to bucket it.
+    """
+    sizes = [dataset.image_size(index) for index in range(len(dataset))]
+    return BucketBatchSampler(sampler, sizes, images_per_batch, max_pixels, size_divisor)
+
+
+def pad_batch_collate(batch):
+    """
+    Collates samples of different sizes by padding every image (3D tensor) with zeros and
+    every mask (2D tensor) with -1, which the metrics ignore, up to the largest size of the
+    batch. The original (height, width) of each sample is appended to the batch so that the
+    predictions can be cropped back with `pred[i, :h, :w]`.
+    """
+    sizes = torch.tensor([list(sample[0].shape[-2:]) for sample in batch])
+    height, width = sizes.max(0)[0].tolist()
+    fields = []
+    for field in zip(*batch):
+        if isinstance(field[0], torch.Tensor):
+            field = [F.pad(t, (0, width - t.shape[-1], 0, height - t.shape[-2]), value=0 if t.dim() == 3 else -1)
+                     for t in field]
+        fields.append(default_collate(list(field)))
+    return tuple(fields) + (sizes,)
+
+
+def _empty_batch(shape, dtype):
+    out = torch.empty(0, dtype=dtype)
+    if data.get_worker_info() is not None:
+        # in a worker the batch is allocated in shared memory, like default_collate does, so it
+        # is not copied again to be sent to the main process
+        storage = out._typed_storage()._new_shared(math.prod(shape), device=out.device)
+        return out.new(storage).resize_(*shape)
+    return out.new_empty(shape)
+
+
+def uint8_batch_collate(batch):
+    """
+    Collates samples whose images are uint8 H x W x 3 arrays, as the datasets return them
+    without a transform, into a uint8 B x H x W x 3 batch, and their masks into an int16
+    B x H x W batch, a quarter of the bytes of float images and int64 masks. Like
+    `pad_batch_collate`, samples of different sizes are padded with zeros and -1 up to the
+    largest size of the batch, and the original (height, width) of each sample is appended to
+    the batch. Each sample is copied once, into batches allocated in shared memory inside the
+    workers. Samples that are a single image are collated like `(image,)`.
+    """
+    batch = [sample if isinstance(sample, (tuple, list)) else (sample,) for sample in batch]
+    sizes = torch.tensor([list(sample[0].shape[:2]) for sample in batch])
+    height, width = sizes.max(0)[0].tolist()
+    fields = []
+    for field in zip(*batch):
+        if isinstance(field[0], str):
+            fields.append(list(field))
+            continue
+        image = field[0].ndim == 3
+        out = _empty_batch((len(field), height, width, 3) if image else (len(field), height, width),
+                           torch.uint8 if image else torch.int16)
+        for i, (h, w) in enumerate(sizes.tolist()):
+            out[i, :h, :w] = torch.as_tensor(field[i])
+            out[i, h:] = 0 if image else -1
+            out[i, :h, w:] = 0 if image else -1
+        fields.append(out)
+    return tuple(fields) + (sizes,)
+
+
 # Code is copy-pasted from https://github.com/facebookresearch/maskrcnn-benchmark/blob/master/maskrcnn_benchmark/data/samplers/distributed.py
 class DistributedSampler(Sampler):
     """Sampler that restricts data loading to a subset of the dataset.
@@ -254,5 +323,59 @@ class IterationBasedBatchSampler(BatchSampler):
         return self.num_iterations
 
 
+class BucketBatchSampler(Sampler):
+    """
+    Groups the indices of a sampler into batches of images with the same size, so that
+    evaluation can run at batch sizes above 1 on datasets of mixed resolutions.
+    Arguments:
+        sampler: Sampler the indices are drawn from.
+        sizes: (height, width) of every sample of the dataset.
+        images_per_batch: Maximum number of images in a batch.
+        max_pixels (optional): Maximum number of pixels in a batch, so that batches of
+            large images hold fewer of them. A single image is always allowed.
+        size_divisor (optional): If given, sizes are rounded up to a multiple of it before
+            bucketing, so that images of nearly the same size share a batch and are padded
+            to a common size by `pad_batch_collate`.
+    """
+
+    def __init__(self, sampler, sizes, images_per_batch, max_pixels=None, size_divisor=None):
+        self.sampler = sampler
+        self.sizes = sizes
+        self.images_per_batch = images_per_batch
+        self.max_pixels = max_pixels
+        self.size_divisor = size_divisor
+
+    def bucket(self, index):
+        height, width = self.sizes[index]
+        if self.size_divisor:
+            height = int(math.ceil(height / self.size_divisor)) * self.size_divisor
+            width = int(math.ceil(width / self.size_divisor)) * self.size_divisor
+        return height, width
+
+    def batch_limit(self, bucket):
+        if self.max_pixels is None:
+            return self.images_per_batch
+        return max(1, min(self.images_per_batch, self.max_pixels // (bucket[0] * bucket[1])))
+
+    def __iter__(self):
+        buckets = {}
+        for index in self.sampler:
+            bucket = self.bucket(index)
+            batch = buckets.setdefault(bucket, [])
+            batch.append(index)
+            if len(batch) >= self.batch_limit(bucket):
+                yield batch
+                del buckets[bucket]
+        for batch in buckets.values():
+            yield batch
+
+    def __len__(self):
+        counts = {}
+        for index in self.sampler:
+            bucket = self.bucket(index)
+            counts[bucket] = counts.get(bucket, 0) + 1
+        return sum(int(math.ceil(count / self.batch_limit(bucket))) for bucket, count in counts.items())
+
+
 if __name__ == '__main__':
     pass
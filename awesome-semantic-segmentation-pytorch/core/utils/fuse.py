@@ -0,0 +1,97 @@
+"""Fold BatchNorm into convolutions for inference"""
+import torch
+import torch.nn as nn
+import torch.fx as fx
+
+from torch.nn.modules.batchnorm import _BatchNorm
+from torch.nn.modules.dropout import _DropoutNd
+
+__all__ = ['fuse_for_inference']
+
+
+class _Tracer(fx.Tracer):
+    # keeps every BatchNorm a single call, including core.nn.syncbn.SyncBatchNorm
+    def is_leaf_module(self, m, module_qualified_name):
+        return isinstance(m, _BatchNorm) or super(_Tracer, self).is_leaf_module(m, module_qualified_name)
+
+
+def _conv_bn_pairs(module, prefix=''):
+    """Qualified names of the (conv, bn) pairs where the BN is the only consumer of the conv.
+
+    Data flow is read from a torch.fx trace. Modules that cannot be traced, for instance
+    because of data-dependent control flow, are searched child by child instead.
+    """
+    try:
+        graph = _Tracer().trace(module)
+    except Exception:
+        pairs = []
+        for name, child in module.named_children():
+            pairs += _conv_bn_pairs(child, prefix + name + '.')
+        return pairs
+    modules = dict(module.named_modules())
+    calls = {}
+    for node in graph.nodes:
+        if node.op == 'call_module':
+            calls.setdefault(node.target, []).append(node)
+    pairs = []
+    for target, nodes in calls.items():
+        if not isinstance(modules[target], _BatchNorm):
+            continue
+        convs = set(node.args[0].target if node.args and isinstance(node.args[0], fx.Node)
+                    and node.args[0].op == 'call_module' else None for node in nodes)
+        conv = convs.pop() if len(convs) == 1 else None
+        if conv is None or not isinstance(modules[conv], nn.Conv2d):
+            continue
+        # a module called several times, like a backbone run at multiple scales, must feed
+        # the same BN every time and nothing else
+        if all(list(node.users) == [bn] and bn.target == target
+               for node in calls[conv] for bn in node.users):
+            pairs.append((prefix + conv, prefix + target))
+    return pairs
+
+
+def _fold(conv, bn):
+    scale = bn.weight if bn.affine else torch.ones_like(bn.running_var)
+    shift = bn.bias if bn.affine else torch.zeros_like(bn.running_mean)
+    scale = scale / torch.sqrt(bn.running_var + bn.eps)
+    bias = conv.bias if conv.bias is not None else torch.zeros_like(bn.running_mean)
+    conv.weight.data.mul_(scale.reshape(-1, 1, 1, 1))
+    conv.bias = nn.Parameter((bias - bn.running_mean) * scale + shift)
+
+
+def _replace(model, name, module):
+    parent, _, attr = name.rpartition('.')
+    setattr(model.get_submodule(parent) if parent else model, attr, module)
+
+
+def fuse_for_inference(model):
+    """Prepare a model for inference by folding every eval-mode BatchNorm into the
+    convolution feeding it and replacing Dropout with identity.
+
+    Each folded BN is replaced by `nn.Identity`, which removes a full pass over its
+    feature map. Works for `nn.BatchNorm2d`, `nn.SyncBatchNorm` and
+    `core.nn.syncbn.SyncBatchNorm`. BNs that do not directly follow a convolution are kept.
+    The model is modified in place and put in eval mode.
+
+    Parameters
+    ----------
+    model : nn.Module
+        Model returned by `get_segmentation_model`.
+
+    Returns
+    -------
+    model : nn.Module
+        The same model, fused.
+    """
+    model.eval()
+    with torch.no_grad():
+        for conv_name, bn_name in _conv_bn_pairs(model):
+            bn = model.get_submodule(bn_name)
+            if bn.running_mean is None:
+                continue
+            _fold(model.get_submodule(conv_name), bn)
+            _replace(model, bn_name, nn.Identity())
+    for name, module in list(model.named_modules()):
+        if isinstance(module, (_DropoutNd, nn.AlphaDropout)):
+            _replace(model, name, nn.Identity())
+    return model
@@ -0,0 +1,173 @@
+"""Keyframe-based reuse of deep features across video frames"""
+import torch
+
+from ..models.segbase import SegBaseModel
+
+__all__ = ['KeyframeModel']
+
+
+def _apply(output, fn):
+    """`fn` applied to an output tensor, or to every tensor of a tuple of outputs."""
+    return fn(output) if isinstance(output, torch.Tensor) else tuple(fn(o) for o in output)
+
+
+def _cat(outputs):
+    if isinstance(outputs[0], torch.Tensor):
+        return torch.cat(outputs)
+    return tuple(torch.cat(parts) for parts in zip(*outputs))
+
+
+class KeyframeModel(object):
+    """Segments consecutive video frames, running the deep backbone stages only on keyframes.
+
+    Only keyframes go through `layer3` and `layer4`, which dominate the cost of a dilated
+    ResNet, and the other frames reuse the `c3` and `c4` of the last keyframe. Most heads, e.g.
+    PSP, DeepLabV3, FCN or DANet, only use `c3` and `c4`, so a frame between two keyframes
+    would get the exact output of its keyframe: these frames skip the backbone and the head
+    and hold the labels of their keyframe. Heads which use the low-level features, those of
+    models setting `head_low_level` such as DUNet, still run on every frame, with the frame's
+    own `c1` and `c2` from the stem, `layer1` and `layer2`.
+
+    Keyframes are taken every `interval` frames, or adaptively whenever the frame differs from
+    the last keyframe by more than `threshold`, measured on `c1` ('feature') or on the image
+    ('pixel') as the mean absolute difference relative to the keyframe's mean magnitude. In
+    adaptive modes `interval` bounds the number of frames between two keyframes. With label
+    holding, the 'feature' mode still runs the stem and `layer1` on every frame.
+
+    Parameters
+    ----------
+    model : SegBaseModel
+        Model without JPU whose head runs in `forward_head`.
+    interval : int, default: 5
+        Frames between two keyframes, or at most between two keyframes in adaptive modes.
+    mode : str, default: 'fixed'
+        'fixed', 'feature' or 'pixel'.
+    threshold : float, default: 0.2
+        Relative change starting a new keyframe in adaptive modes.
+    """
+
+    def __init__(self, model, interval=5, mode='fixed', threshold=0.2):
+        if not isinstance(model, SegBaseModel) or model.jpu or getattr(model, 'forward_head', None) is None:
+            raise ValueError('keyframe feature reuse needs a SegBaseModel with a forward_head and without JPU, '
+                             'got {}'.format(type(model).__name__))
+        if mode not in ('fixed', 'feature', 'pixel'):
+            raise ValueError('unknown keyframe mode: {}'.format(mode))
+        self.model = model
+        self.interval = max(1, interval)
+        self.mode = mode
+        self.threshold = threshold
+        self.frames = 0
+        self.keyframes = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the cached keyframe, at the start of a new video."""
+        self.features = None
+        self.held = None
+        self.reference = None
+        self.since = 0
+
+    def _layer1(self, x):
+        pretrained = self.model.pretrained
+        x = pretrained.maxpool(pretrained.relu(pretrained.bn1(pretrained.conv1(x))))
+        return pretrained.layer1(x)
+
+    def _changed(self, signal, reference):
+        return ((signal - reference).abs().mean() / (reference.abs().mean() + 1e-6)).item() > self.threshold
+
+    def _select_keyframes(self, signals):
+        """Indices of the keyframes of the batch, and for every frame the position of its
+        keyframe in [cached keyframe, keyframes of the batch]."""
+        keys, sources = [], []
+        for i in range(len(signals)):
+            if self.features is None and not keys:
+                key = True
+            elif self.since + 1 >= self.interval:
+                key = True
+            else:
+                key = self.mode != 'fixed' and self._changed(signals[i], self.reference)
+            if key:
+                keys.append(i)
+                self.reference = signals[i]
+                self.since = 0
+            else:
+                self.since += 1
+            sources.append(len(keys))
+        return keys, sources
+
+    def _low_level_head(self, x, run, c1, keys, index):
+        """Output of every frame, the head running on the frame's `c1`, `c2` and the `c3`, `c4`
+        of its keyframe."""
+        pretrained = self.model.pretrained
+        c2 = pretrained.layer2(c1)
+        c3, c4 = [], []
+        if self.features is not None:
+            c3.append(self.features[0])
+            c4.append(self.features[1])
+        if keys:
+            key_c3 = pretrained.layer3(c2[keys])
+            c3.append(key_c3)
+            c4.append(pretrained.layer4(key_c3))
+        c3, c4 = torch.cat(c3), torch.cat(c4)
+        self.features = (c3[-1:], c4[-1:])
+        return run(x, (c1, c2, c3.index_select(0, index), c4.index_select(0, index)))
+
+    def _held_labels(self, x, run, kind, c1, keys):
+        """Outputs of [cached keyframe, keyframes of the batch], the head running on keyframes only."""
+        pretrained = self.model.pretrained
+        outputs = []
+        if self.features is not None:
+            if self.held is None or self.held[0] != kind:
+                # the cached keyframe was last run through another of `__call__` and `predict`
+                self.held = (kind, run(x[:1], self.features))
+            outputs.append(self.held[1])
+        if keys:
+            key_c1 = self._layer1(x[keys]) if c1 is None else c1[keys]
+            key_c2 = pretrained.layer2(key_c1)
+            key_c3 = pretrained.layer3(key_c2)
+            features = (key_c1, key_c2, key_c3, pretrained.layer4(key_c3))
+            output = run(x[keys], features)
+            outputs.append(output)
+            self.features = tuple(f[-1:] for f in features)
+            self.held = (kind, _apply(output, lambda o: o[-1:]))
+        return _cat(outputs)
+
+    def _run(self, x, run, kind):
+        n = x.size(0)
+        hold = not self.model.head_low_level
+        with torch.no_grad():
+            c1 = self._layer1(x) if not hold or self.mode == 'feature' else None
+            signals = c1 if self.mode == 'feature' else x
+            # position 0 is the cached keyframe when there is one
+            offset = 0 if self.features is not None else 1
+            keys, sources = self._select_keyframes([signals[i:i + 1] for i in range(n)])
+            index = torch.tensor([s - offset for s in sources], device=x.device)
+            if hold:
+                output = _apply(self._held_labels(x, run, kind, c1, keys), lambda o: o.index_select(0, index))
+            else:
+                output = self._low_level_head(x, run, c1, keys, index)
+        self.frames += n
+        self.keyframes += len(keys)
+        return output
+
+    def __call__(self, x):
+        return self._run(x, lambda image, features: self.model.forward_head(image.size()[2:], *features),
+                         'forward')
+
+    def predict(self, x, confidence=False):
+        """uint8 label maps of consecutive frames, like `SegPredictMixin.predict`."""
+        return self._run(x, lambda image, features: self.model.predict(image, confidence, features=features),
+                         ('predict', confidence))
+
+    def report(self):
+        return 'Keyframes: {:d} of {:d} frames ({} mode, interval {})'.format(
+            self.keyframes, self.frames, self.mode, self.interval)
+
+    def eval(self):
+        self.model.eval()
+        return self
+
+    def to(self, device):
+        self.model = self.model.to(device)
+        self.reset()
+        return self
@@ -0,0 +1,160 @@
+"""ONNX export and ONNX Runtime inference for segmentation models"""
+import os
+import inspect
+import contextlib
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from torch.nn.modules.utils import _pair
+from .filesystem import try_import
+
+__all__ = ['export_onnx', 'check_onnx_parity', 'get_onnx_file', 'ONNXRuntimeModel']
+
+
+class _LogitsOnly(nn.Module):
+    """Keeps only the main output, so that the exported graph has a single `logits` output."""
+
+    def __init__(self, model):
+        super(_LogitsOnly, self).__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x)[0]
+
+
+def _pool_matrix(size, bins, input):
+    # row i averages positions [floor(i * size / bins), ceil((i + 1) * size / bins)), like adaptive pooling
+    index = torch.arange(bins, device=input.device)
+    start = torch.div(index * size, bins, rounding_mode='floor')
+    end = torch.div((index + 1) * size + bins - 1, bins, rounding_mode='floor')
+    pos = torch.arange(size, device=input.device)
+    mask = (pos.unsqueeze(0) >= start.unsqueeze(1)) & (pos.unsqueeze(0) < end.unsqueeze(1))
+    return mask.to(input.dtype) / (end - start).unsqueeze(1).to(input.dtype)
+
+
+def _matmul_adaptive_avg_pool2d(input, output_size):
+    out_h, out_w = _pair(output_size)
+    out_h = input.shape[-2] if out_h is None else out_h
+    out_w = input.shape[-1] if out_w is None else out_w
+    pooled = torch.matmul(_pool_matrix(input.shape[-2], out_h, input), input)
+    return torch.matmul(pooled, _pool_matrix(input.shape[-1], out_w, input).t())
+
+
+@contextlib.contextmanager
+def _exportable_adaptive_pooling():
+    """ONNX cannot express adaptive average pooling to more than one bin when the input size
+    is dynamic, which the pyramid pooling of PSPNet and ICNet needs. While exporting, it is
+    computed as two matrix products with averaging matrices built from the input shape instead.
+    """
+    adaptive_avg_pool2d = F.adaptive_avg_pool2d
+    F.adaptive_avg_pool2d = _matmul_adaptive_avg_pool2d
+    try:
+        yield
+    finally:
+        F.adaptive_avg_pool2d = adaptive_avg_pool2d
+
+
+def get_onnx_file(model, backbone, dataset, root='~/.torch/models'):
+    """Default path of the exported graph of a model, next to its pretrained weights."""
+    return os.path.join(os.path.expanduser(root), '{}_{}_{}.onnx'.format(model, backbone, dataset))
+
+
+def export_onnx(model, path, height=512, width=512, opset_version=13):
+    """Export a segmentation model to ONNX with dynamic batch size, height and width.
+
+    Parameters
+    ----------
+    model : nn.Module
+        Model returned by `get_segmentation_model`.
+    path : str
+        Where the ONNX graph is saved.
+    height, width : int
+        Size of the dummy input traced through the model.
+    opset_version : int, default: 13
+        ONNX opset used for the exported graph.
+    """
+    model = _LogitsOnly(model).eval()
+    device = next(model.parameters()).device
+    dummy = torch.randn(1, 3, height, width, device=device)
+    dynamic_axes = {'image': {0: 'batch', 2: 'height', 3: 'width'},
+                    'logits': {0: 'batch', 2: 'height', 3: 'width'}}
+    kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # the TorchScript exporter does not need onnxscript
+        kwargs['dynamo'] = False
+    with torch.no_grad(), _exportable_adaptive_pooling():
+        torch.onnx.export(model, (dummy,), path, input_names=['image'], output_names=['logits'],
+                          dynamic_axes=dynamic_axes, opset_version=opset_version, **kwargs)
+
+
+def check_onnx_parity(model, onnx_model, images):
+    """Compare the logits of an exported graph with the eager PyTorch model.
+
+    Parameters
+    ----------
+    model : nn.Module
+        The eager model.
+    onnx_model : ONNXRuntimeModel
+        The exported graph.
+    images : list of torch.Tensor
+        Normalized images with shape `1, 3, H, W`, preferably of sizes other than the one
+        traced during export.
+
+    Returns
+    -------
+    results : list of tuple
+        `(height, width, max_abs_diff, label_agreement)` per image, where `label_agreement`
+        is the fraction of pixels with the same argmax label.
+    """
+    model.eval()
+    device = next(model.parameters()).device
+    results = []
+    for image in images:
+        with torch.no_grad():
+            expected = model(image.to(device))[0].cpu()
+        actual = onnx_model(image)[0]
+        diff = (expected - actual).abs().max().item()
+        agreement = (expected.argmax(1) == actual.argmax(1)).float().mean().item()
+        results.append((image.shape[2], image.shape[3], diff, agreement))
+    return results
+
+
+class ONNXRuntimeModel(object):
+    """Runs an exported segmentation graph with ONNX Runtime.
+
+    It is called like the PyTorch models, with a batch of normalized images, and returns a
+    tuple holding the logits, so evaluators can use either one.
+
+    Parameters
+    ----------
+    path : str
+        Path to the graph saved by `export_onnx`.
+    threads : int, optional
+        Number of threads used within an operator, with the default left to ONNX Runtime.
+    providers : list of str, optional
+        ONNX Runtime execution providers, with the default being the CPU.
+    """
+
+    def __init__(self, path, threads=None, providers=None):
+        ort = try_import('onnxruntime', 'onnxruntime is required for the ONNX Runtime backend, '
+                                        'you can install it with `pip install onnxruntime`.')
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=providers or ['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, image):
+        image = np.ascontiguousarray(image.detach().cpu().numpy(), dtype=np.float32)
+        logits = self.session.run(None, {self.input_name: image})[0]
+        return (torch.from_numpy(logits),)
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
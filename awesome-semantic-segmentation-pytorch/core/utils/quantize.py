@@ -0,0 +1,149 @@
+"""Post-training static int8 quantization for SegBaseModel models"""
+import os
+import copy
+import warnings
+import torch
+import torch.nn as nn
+
+from ..models.segbase import SegBaseModel
+
+__all__ = ['quantize_int8', 'get_quantized_file', 'save_quantized_model', 'load_quantized_model']
+
+
+def _stages(model):
+    """(parent, name) of the submodules quantized as separate graphs: the backbone stem and
+    stages, which are called one by one from `base_forward`, and the heads."""
+    stages = [(model.pretrained, 'conv1')]
+    stages += [(model.pretrained, 'layer%d' % i) for i in range(1, 5)]
+    for name in ('head', 'auxlayer'):
+        if isinstance(getattr(model, name, None), nn.Module):
+            stages.append((model, name))
+    return stages
+
+
+def _stage_name(model, parent, name):
+    return 'pretrained.' + name if parent is model.pretrained else name
+
+
+def _record_inputs(model, stages, image):
+    inputs = {}
+    hooks = [getattr(parent, name).register_forward_pre_hook(
+        lambda module, args, key=(id(parent), name): inputs.setdefault(key, args))
+        for parent, name in stages]
+    try:
+        with torch.no_grad():
+            model(image)
+    finally:
+        for hook in hooks:
+            hook.remove()
+    return inputs
+
+
+def quantize_int8(model, images, backend='x86'):
+    """Quantize the convolutions of a SegBaseModel to int8 with static post-training quantization.
+
+    The stem, the four ResNet stages and the heads are each traced with torch.fx, their
+    conv+BN(+ReLU) sequences are folded and observers are inserted. The observers are then
+    calibrated on `images` and every stage is converted to int8 kernels. Stages that torch.fx
+    cannot trace, e.g. heads with data-dependent control flow, are kept in float with a
+    warning, and their names are listed in the `float_stages` attribute of the returned model.
+    The model takes and returns float tensors as before.
+
+    The int8 kernels need `torch.backends.quantized.engine` to be `backend` when the model
+    runs, so the engine is set for the whole process and left so. It is also stored in the
+    `quantized_engine` attribute, which `save_quantized_model` saves with the weights and
+    `load_quantized_model` sets again.
+
+    Parameters
+    ----------
+    model : SegBaseModel
+        Float model in eval mode, on the CPU.
+    images : iterable of torch.Tensor
+        Normalized calibration batches with shape `N, 3, H, W`.
+    backend : str, default: 'x86'
+        Quantized engine, 'x86', 'fbgemm' or 'qnnpack' (ARM).
+
+    Returns
+    -------
+    model : nn.Module
+        A quantized copy of the model.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+    from torch.fx.proxy import TraceError
+
+    if not isinstance(model, SegBaseModel):
+        raise ValueError('int8 quantization supports SegBaseModel models, got {}'.format(type(model).__name__))
+    torch.backends.quantized.engine = backend
+    model = copy.deepcopy(model).cpu().eval()
+    images = iter(images)
+    first = next(images)
+
+    # fold the stem's BN and ReLU into conv1 so that they are quantized together
+    pretrained = model.pretrained
+    pretrained.conv1 = nn.Sequential(pretrained.conv1, pretrained.bn1, pretrained.relu)
+    pretrained.bn1 = nn.Identity()
+    pretrained.relu = nn.Identity()
+
+    stages = _stages(model)
+    inputs = _record_inputs(model, stages, first)
+    qconfig_mapping = get_default_qconfig_mapping(backend)
+    prepared, float_stages = [], []
+    for parent, name in stages:
+        try:
+            module = prepare_fx(getattr(parent, name), qconfig_mapping, inputs[(id(parent), name)])
+        except TraceError:
+            float_stages.append(_stage_name(model, parent, name))
+            continue
+        setattr(parent, name, module)
+        prepared.append((parent, name))
+    if float_stages:
+        warnings.warn('{} stages cannot be traced and stay in float: {}'.format(
+            type(model).__name__, ', '.join(float_stages)))
+
+    with torch.no_grad():
+        model(first)
+        for image in images:
+            model(image)
+    for parent, name in prepared:
+        setattr(parent, name, convert_fx(getattr(parent, name)))
+    model.float_stages = float_stages
+    model.quantized_engine = backend
+    return model
+
+
+def get_quantized_file(model, backbone, dataset, root='~/.torch/models'):
+    """Default path of the quantized model, next to the float pretrained weights."""
+    return os.path.join(os.path.expanduser(root), '{}_{}_{}_int8.pth'.format(model, backbone, dataset))
+
+
+def save_quantized_model(model, path):
+    """Save a model returned by `quantize_int8` with its quantized engine."""
+    torch.save({'engine': model.quantized_engine, 'float_stages': model.float_stages,
+                'state_dict': model.state_dict()}, path)
+
+
+def load_quantized_model(model, path):
+    """Load the int8 weights saved by `save_quantized_model`.
+
+    The quantized graph is rebuilt from the float model with a dummy calibration pass and
+    the saved weights, scales and zero points are then loaded into it. The quantized engine
+    they were packed for is set for the process, like in `quantize_int8`.
+
+    Parameters
+    ----------
+    model : SegBaseModel
+        Float model with the same architecture as the quantized one.
+    path : str
+        Path to the saved model.
+    """
+    checkpoint = torch.load(path, map_location='cpu')
+    with warnings.catch_warnings():
+        # the stages kept in float were reported when the model was quantized
+        warnings.simplefilter('ignore')
+        quantized = quantize_int8(model, [torch.zeros(1, 3, 64, 64)], checkpoint['engine'])
+    if quantized.float_stages != checkpoint['float_stages']:
+        raise ValueError('{} was quantized with the stages {} in float, the model keeps {} in float'.format(
+            path, checkpoint['float_stages'], quantized.float_stages))
+    quantized.load_state_dict(checkpoint['state_dict'])
+    return quantized
@@ -23,7 +23,7 @@ class SegmentationMetric(object):
         labels : 'NumpyArray' or list of `NumpyArray`
             The labels of the data.
         preds : 'NumpyArray' or list of `NumpyArray`
-            Predicted values.
+            Predicted values, logits or label maps with the shape of the labels.
         """
 
         def evaluate_worker(self, pred, label):
@@ -65,11 +65,18 @@ class SegmentationMetric(object):
         self.total_label = 0
 
 
+def _labels(output, target):
+    """Predicted labels of 4D logits, or the label maps themselves."""
+    if output.dim() == target.dim():
+        return output.long()
+    return torch.argmax(output, 1)
+
+
 # pytorch version
 def batch_pix_accuracy(output, target):
     """PixAcc"""
-    # inputs are numpy array, output 4D, target 3D
-    predict = torch.argmax(output.long(), 1) + 1
+    # inputs are numpy array, output 4D (or 3D label maps), target 3D
+    predict = _labels(output, target) + 1
     target = target.long() + 1
 
     pixel_labeled = torch.sum(target > 0).item()
@@ -80,11 +87,11 @@ def batch_pix_accuracy(output, target):
 
 def batch_intersection_union(output, target, nclass):
     """mIoU"""
-    # inputs are numpy array, output 4D, target 3D
+    # inputs are numpy array, output 4D (or 3D label maps), target 3D
     mini = 1
     maxi = nclass
     nbins = nclass
-    predict = torch.argmax(output, 1) + 1
+    predict = _labels(output, target) + 1
     target = target.float() + 1
 
     predict = predict.float() * (target > 0).float()
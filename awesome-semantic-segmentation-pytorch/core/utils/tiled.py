@@ -0,0 +1,132 @@
+"""Sliding-window inference of images larger than the model can take at once"""
+import torch
+
+from torch.nn.modules.utils import _pair
+
+__all__ = ['TiledModel', 'tile_starts']
+
+
+def tile_starts(size, tile, overlap):
+    """Start offsets of tiles of length `tile` overlapping by at least `overlap` along an axis
+    of length `size`. The last tile is aligned with the end, so every tile is full-sized."""
+    if size <= tile:
+        return [0]
+    stride = tile - overlap
+    starts = list(range(0, size - tile, stride))
+    return starts + [size - tile]
+
+
+def _window(length, window):
+    if window == 'constant':
+        return torch.ones(length)
+    if window == 'linear':
+        ramp = torch.arange(1, length + 1, dtype=torch.float32)
+        return torch.min(ramp, ramp.flip(0)) / ((length + 1) // 2)
+    if window == 'hann':
+        # without the zero end points, so pixels on the image border keep a weight
+        return torch.hann_window(length + 2, periodic=False)[1:-1]
+    raise ValueError('unknown blending window: {}'.format(window))
+
+
+class TiledModel(object):
+    """Runs a segmentation model on overlapping tiles and blends their logits.
+
+    Tiles are taken in rows. The logits of the tiles of a row are accumulated with the weights
+    of the blending window into a buffer holding only the rows that tiles still overlap, and
+    rows are normalized and handed on as soon as no further tile covers them. Memory therefore
+    grows with the tile size and the image width, not with the image area. It is called like
+    the PyTorch models and returns a tuple holding the logits, so evaluators can use either.
+
+    Parameters
+    ----------
+    model : nn.Module or ONNXRuntimeModel
+        Model returning a tuple whose first element is the logits at the input size.
+    tile_size : int or tuple of int, default: 512
+        Height and width of the tiles.
+    overlap : int or tuple of int, default: 128
+        Minimum overlap of two neighbouring tiles.
+    window : str, default: 'hann'
+        Weights of the pixels of a tile when blending overlapping logits, 'constant',
+        'linear' or 'hann', the latter two favouring the centre of the tiles.
+    batch_size : int, default: 4
+        Number of tiles passed through the model at once.
+    """
+
+    def __init__(self, model, tile_size=512, overlap=128, window='hann', batch_size=4):
+        self.model = model
+        self.tile_size = _pair(tile_size)
+        self.overlap = _pair(overlap)
+        if any(o >= t for o, t in zip(self.overlap, self.tile_size)):
+            raise ValueError('the overlap must be smaller than the tile size')
+        self.window = window
+        self.batch_size = max(1, batch_size)
+        _window(1, window)
+        self.tiles = 0
+
+    def _logits(self, tiles):
+        with torch.no_grad():
+            return torch.cat([self.model(tiles[i:i + self.batch_size])[0]
+                              for i in range(0, tiles.size(0), self.batch_size)])
+
+    def _stitch(self, x, sink):
+        """Blend the tile logits of `x` and pass `sink(start, end, logits)` every finished
+        block of rows, with logits of shape `N, nclass, end - start, W`, top to bottom."""
+        n, _, height, width = x.shape
+        tile_h, tile_w = min(self.tile_size[0], height), min(self.tile_size[1], width)
+        rows = tile_starts(height, tile_h, self.overlap[0])
+        cols = tile_starts(width, tile_w, self.overlap[1])
+        weight = torch.outer(_window(tile_h, self.window), _window(tile_w, self.window)).to(x.device)
+        # buffer of the rows [top, top + buffer height) that tiles are still added to
+        top = 0
+        logits = weight_sum = None
+        for i, y in enumerate(rows):
+            tiles = torch.cat([x[:, :, y:y + tile_h, c:c + tile_w] for c in cols])
+            out = self._logits(tiles) * weight
+            self.tiles += tiles.size(0)
+            if logits is None:
+                logits = out.new_zeros(n, out.size(1), tile_h, width)
+                weight_sum = out.new_zeros(tile_h, width)
+            grow = y + tile_h - top - logits.size(2)
+            if grow > 0:
+                logits = torch.cat([logits, logits.new_zeros(n, logits.size(1), grow, width)], 2)
+                weight_sum = torch.cat([weight_sum, weight_sum.new_zeros(grow, width)], 0)
+            for j, c in enumerate(cols):
+                logits[:, :, y - top:y - top + tile_h, c:c + tile_w] += out[j * n:(j + 1) * n]
+                weight_sum[y - top:y - top + tile_h, c:c + tile_w] += weight
+            done = rows[i + 1] if i + 1 < len(rows) else height
+            sink(top, done, logits[:, :, :done - top] / weight_sum[:done - top])
+            logits, weight_sum = logits[:, :, done - top:], weight_sum[done - top:]
+            top = done
+
+    def __call__(self, x):
+        output = []
+        self._stitch(x, lambda start, end, logits: output.append(logits))
+        return (torch.cat(output, 2),)
+
+    def predict(self, x, confidence=False):
+        """Label maps of a batch of images, reduced block by block so that the full logits are
+        never held. Returns uint8 labels and, if `confidence` is set, top-1 probabilities,
+        like `SegPredictMixin.predict`."""
+        n, _, height, width = x.shape
+        labels = torch.empty(n, height, width, dtype=torch.int16, device=x.device)
+        probs = torch.empty(n, height, width, device=x.device) if confidence else None
+
+        def sink(start, end, logits):
+            top, index = logits.max(1)
+            labels[:, start:end] = index
+            if confidence:
+                probs[:, start:end] = torch.exp(logits - top.unsqueeze(1)).sum(1).reciprocal_()
+            sink.nclass = logits.size(1)
+
+        self._stitch(x, sink)
+        if sink.nclass <= 256:
+            labels = labels.to(torch.uint8)
+        return (labels, probs) if confidence else labels
+
+    def eval(self):
+        self.model.eval()
+        return self
+
+    def to(self, device):
+        self.model = self.model.to(device)
+        return self
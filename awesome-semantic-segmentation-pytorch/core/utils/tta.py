@@ -0,0 +1,111 @@
+"""Multi-scale and flip test-time augmentation"""
+import sys
+import time
+import torch
+import torch.nn.functional as F
+
+from ..models.segbase import SegPredictMixin
+
+try:
+    import resource
+except ImportError:
+    # Windows has no getrusage
+    resource = None
+
+__all__ = ['MultiScaleModel']
+
+
+def _max_rss():
+    """Peak resident set size of the process in bytes, or None where it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MultiScaleModel(object):
+    """Averages the logits of a model over several scales and horizontal flips.
+
+    Every scale is resized from the same normalized batch. The flipped images are stacked with
+    the originals into a single forward pass. The model's own upsampling to the scaled size is
+    skipped, and each scale's logits are upsampled once, directly to the output size, and added
+    in place into one accumulator instead of being stacked. It is called like the PyTorch
+    models and returns a tuple holding the averaged logits.
+
+    Parameters
+    ----------
+    model : nn.Module or callable
+        Model returning a tuple whose first element is the logits at the input size.
+    scales : list of float, default: (1.0,)
+        Factors the images are resized by.
+    flip : bool, default: False
+        Also segment the horizontally flipped images.
+    """
+
+    def __init__(self, model, scales=(1.0,), flip=False):
+        self.model = model
+        self.scales = list(scales)
+        self.flip = flip
+        self.times = [0.0] * len(self.scales)
+        self.peaks = [0] * len(self.scales)
+        self.images = 0
+
+    def _scale_logits(self, x, size):
+        """Logits of `x` resized to `size`, upsampled to the size of `x` only once."""
+        if size != tuple(x.shape[2:]):
+            x = F.interpolate(x, size, mode='bilinear', align_corners=True)
+        if getattr(self.model, 'upsamples_last', False):
+            return self.model(x, aux=False, upsample=False)[0]
+        if isinstance(self.model, SegPredictMixin):
+            return self.model(x, aux=False)[0]
+        return self.model(x)[0]
+
+    def __call__(self, x):
+        n, _, height, width = x.shape
+        device = x.device
+        batch = torch.cat([x, x.flip(3)]) if self.flip else x
+        output = None
+        with torch.no_grad():
+            for i, scale in enumerate(self.scales):
+                if device.type == 'cuda':
+                    torch.cuda.reset_peak_memory_stats(device)
+                start = time.time()
+                size = (int(height * scale + 0.5), int(width * scale + 0.5))
+                logits = self._scale_logits(batch, size)
+                if logits.shape[2:] != (height, width):
+                    logits = F.interpolate(logits, (height, width), mode='bilinear', align_corners=True)
+                if output is None:
+                    output = torch.zeros(n, logits.size(1), height, width, device=logits.device)
+                output += logits[:n]
+                if self.flip:
+                    output += logits[n:].flip(3)
+                if device.type == 'cuda':
+                    torch.cuda.synchronize(device)
+                    self.peaks[i] = max(self.peaks[i], torch.cuda.max_memory_allocated(device))
+                else:
+                    self.peaks[i] = _max_rss()
+                self.times[i] += time.time() - start
+        self.images += n
+        return (output.div_(len(self.scales) * (2 if self.flip else 1)),)
+
+    def report(self):
+        """Time per image and peak memory of every scale. On the CPU the peak is the resident
+        set size of the process, which only grows, so it shows which scale raised it. It is
+        not reported on Windows."""
+        lines = ['TTA: {} scales{}, {:d} images'.format(len(self.scales), ' with flips' if self.flip else '',
+                                                       self.images)]
+        for scale, elapsed, peak in zip(self.scales, self.times, self.peaks):
+            line = '  scale {:.2f}: {:.1f} ms per image'.format(scale, 1000 * elapsed / max(self.images, 1))
+            if peak is not None:
+                line += ', peak memory {:.0f} MB'.format(peak / 2 ** 20)
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def eval(self):
+        self.model.eval()
+        return self
+
+    def to(self, device):
+        self.model = self.model.to(device)
+        return self
@@ -0,0 +1,133 @@
+"""Argmax of upsampled logits without materializing the full-resolution logits"""
+import torch
+import torch.nn.functional as F
+
+__all__ = ['strip_argmax', 'label_upsampling_argmax']
+
+
+class _Upsampling(object):
+    """A bilinear upsampling of logits to the input size."""
+
+    def __init__(self, input, size, align_corners):
+        self.input = input
+        self.size = tuple(size)
+        self.align_corners = align_corners
+
+    def sources(self, axis, start, end):
+        """Source indices and weights of output positions [start, end) along `axis` (0: rows, 1: columns),
+        computed like the CPU and CUDA bilinear kernels."""
+        in_size, out_size = self.input.shape[axis - 2], self.size[axis]
+        device = self.input.device
+        dst = torch.arange(start, end, device=device, dtype=torch.float32)
+        if self.align_corners:
+            scale = (in_size - 1) / (out_size - 1) if out_size > 1 else 0.
+            src = dst * scale
+        else:
+            src = ((dst + 0.5) * (in_size / out_size) - 0.5).clamp(min=0)
+        index0 = src.long().clamp(max=in_size - 1)
+        index1 = (index0 + 1).clamp(max=in_size - 1)
+        weight1 = src - index0.float()
+        return index0, index1, 1 - weight1, weight1
+
+
+def _interpolate_columns(upsampling, rows):
+    """Upsample the width of rows which already have their output height."""
+    return F.interpolate(rows, (rows.size(2), upsampling.size[1]), mode='bilinear',
+                         align_corners=upsampling.align_corners)
+
+
+def _label_dtype(nclass):
+    return torch.uint8 if nclass <= 256 else torch.int16
+
+
+def strip_argmax(logits, size, strip_rows=64, confidence=False, align_corners=True):
+    """Argmax of the upsampled logits, computed `strip_rows` output rows at a time.
+
+    The rows of each strip are interpolated from their two source rows at feature resolution,
+    then upsampled along the width and reduced to labels right away. Peak memory is that of
+    one strip instead of the full `N, C, H, W` logits, and the labels are the same.
+
+    Parameters
+    ----------
+    logits : Tensor
+        `N, C, h, w` logits at the head's resolution.
+    size : tuple of int
+        Output height and width.
+    strip_rows : int, default: 64
+        Number of output rows upsampled at once.
+    confidence : bool, default: False
+        Also return the softmax probability of the predicted class.
+    align_corners : bool, default: True
+        Same as in `F.interpolate`.
+    """
+    upsampling = _Upsampling(logits, size, align_corners)
+    n, nclass = logits.shape[:2]
+    height, width = upsampling.size
+    labels = torch.empty(n, height, width, dtype=_label_dtype(nclass), device=logits.device)
+    probs = torch.empty(n, height, width, device=logits.device) if confidence else None
+    for start in range(0, height, strip_rows):
+        end = min(start + strip_rows, height)
+        index0, index1, weight0, weight1 = upsampling.sources(0, start, end)
+        rows = logits.index_select(2, index0) * weight0.view(1, 1, -1, 1)
+        rows += logits.index_select(2, index1) * weight1.view(1, 1, -1, 1)
+        strip = _interpolate_columns(upsampling, rows)
+        top, strip_labels = strip.max(1)
+        labels[:, start:end] = strip_labels
+        if confidence:
+            probs[:, start:end] = strip.sub_(top.unsqueeze(1)).exp_().sum(1).reciprocal_()
+    return (labels, probs) if confidence else labels
+
+
+def label_upsampling_argmax(logits, size, strip_rows=256, align_corners=True):
+    """Approximate argmax of the upsampled logits from the labels at the logits' resolution.
+
+    The argmax is taken at feature resolution, e.g. stride 8, and every output pixel whose four
+    source pixels share a label takes that label, which is exact. On edges, where the source
+    labels differ, the interpolated logits of those (at most four) candidate labels are compared.
+    Only a class which is not the argmax of any of the four source pixels can be missed.
+
+    Parameters
+    ----------
+    logits : Tensor
+        `N, C, h, w` logits at the head's resolution.
+    size : tuple of int
+        Output height and width.
+    strip_rows : int, default: 256
+        Number of output rows processed at once.
+    align_corners : bool, default: True
+        Same as in `F.interpolate`.
+    """
+    upsampling = _Upsampling(logits, size, align_corners)
+    n, nclass, in_height, in_width = logits.shape
+    height, width = upsampling.size
+    coarse = logits.argmax(1)
+    flat = logits.reshape(n, -1)
+    plane = in_height * in_width
+    labels = torch.empty(n, height, width, dtype=_label_dtype(nclass), device=logits.device)
+    col0, col1, colw0, colw1 = upsampling.sources(1, 0, width)
+    for start in range(0, height, strip_rows):
+        end = min(start + strip_rows, height)
+        row0, row1, roww0, roww1 = upsampling.sources(0, start, end)
+        corners = [(row0, col0, roww0, colw0), (row0, col1, roww0, colw1),
+                   (row1, col0, roww1, colw0), (row1, col1, roww1, colw1)]
+        # source pixel index and weight of every output pixel, `rows, width`
+        positions = [rows.view(-1, 1) * in_width + cols.view(1, -1) for rows, cols, _, _ in corners]
+        weights = [rw.view(-1, 1) * cw.view(1, -1) for _, _, rw, cw in corners]
+        candidates = [coarse.reshape(n, -1)[:, p.reshape(-1)].view(n, end - start, width) for p in positions]
+        strip = candidates[0].clone()
+        edge = (candidates[1] != strip) | (candidates[2] != strip) | (candidates[3] != strip)
+        b, y, x = edge.nonzero(as_tuple=True)
+        if b.numel():
+            best = None
+            for candidate in candidates:
+                c = candidate[b, y, x]
+                score = sum(flat[b, c * plane + p[y, x]] * w[y, x] for p, w in zip(positions, weights))
+                if best is None:
+                    best, best_score = c, score
+                else:
+                    better = score > best_score
+                    best = torch.where(better, c, best)
+                    best_score = torch.where(better, score, best_score)
+            strip[b, y, x] = best
+        labels[:, start:end] = strip
+    return labels
@@ -2,6 +2,8 @@ import os
 import numpy as np
 from PIL import Image
 
+from .composite import get_palette
+
 __all__ = ['get_color_pallete', 'print_iou', 'set_img_color',
            'show_prediction', 'show_colorful_images', 'save_colorful_images']
 
@@ -29,11 +31,23 @@ def print_iou(iu, mean_pixel_acc, class_names=None, show_no_back=False):
 
 
 def set_img_color(img, label, colors, background=0, show255=False):
-    for i in range(len(colors)):
-        if i != background:
-            img[np.where(label == i)] = colors[i]
+    # a single pass over the image: the pixels to recolor and their colors are looked up
+    # in tables indexed by the label, with a last entry standing for the labels out of
+    # range, instead of scanning the image once per class
+    size = max(len(colors), 256) + 1
+    lut = np.zeros((size,) + img.shape[label.ndim:], dtype=img.dtype)
+    lut[:len(colors)] = np.asarray(colors).reshape((len(colors),) + img.shape[label.ndim:])
+    recolor = np.zeros(size, dtype=bool)
+    recolor[:len(colors)] = True
+    if 0 <= background < len(colors):
+        recolor[background] = False
     if show255:
-        img[np.where(label == 255)] = 255
+        lut[255] = 255
+        recolor[255] = True
+    if label.min() < 0 or label.max() >= size - 1:
+        label = np.where((label < 0) | (label >= size - 1), size - 1, label)
+    mask = recolor[label]
+    img[mask] = lut[label[mask]]
 
     return img
 
@@ -77,22 +91,9 @@ def get_color_pallete(npimg, dataset='pascal_voc'):
     out_img : PIL.Image
         Image with color pallete
     """
-    # recovery boundary
-    if dataset in ('pascal_voc', 'pascal_aug'):
-        npimg[npimg == -1] = 255
-    # put colormap
-    if dataset == 'ade20k':
-        npimg = npimg + 1
-        out_img = Image.fromarray(npimg.astype('uint8'))
-        out_img.putpalette(adepallete)
-        return out_img
-    elif dataset == 'citys':
-        out_img = Image.fromarray(npimg.astype('uint8'))
-        out_img.putpalette(cityspallete)
-        return out_img
-    out_img = Image.fromarray(npimg.astype('uint8'))
-    out_img.putpalette(vocpallete)
-    return out_img
+    # the boundary label -1 becomes index 255 when cast to uint8, and the ADE20K indices
+    # are shifted by one, see `Palette.to_image`
+    return get_palette(dataset).to_image(npimg)
 
 
 def _getvocpallete(num_cls):
@@ -0,0 +1,125 @@
+"""Background writer for predicted masks and overlays"""
+import time
+import threading
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from PIL import Image
+from .composite import get_palette
+
+__all__ = ['MaskWriter']
+
+
+def _encode(pred, path, dataset, image=None, overlay_path=None, alpha=0.5):
+    start = time.time()
+    palette = get_palette(dataset)
+    palette.to_image(pred).save(path)
+    if image is not None:
+        Image.fromarray(palette.overlay(np.asarray(image), pred, alpha)).save(overlay_path)
+    return time.time() - start
+
+
+class MaskWriter(object):
+    """Writes predicted label maps as color palette PNGs (and optionally overlays on the
+    input images) from a pool of threads or processes, so that the inference loop only
+    hands over label arrays instead of waiting on palette mapping and PNG encoding.
+
+    At most `max_pending` label maps are queued at once: `write` blocks once that many are
+    waiting, which keeps memory bounded when encoding is slower than the model.
+
+    Parameters
+    ----------
+    dataset : str
+        The dataset whose color palette is used.
+    workers : int, default: 4
+        Number of threads or processes encoding images.
+    max_pending : int, default: 16
+        Maximum number of label maps waiting to be written.
+    processes : bool, default: False
+        Use processes instead of threads, for when the encoding holds the GIL.
+    """
+
+    def __init__(self, dataset, workers=4, max_pending=16, processes=False):
+        self.dataset = dataset
+        self.workers = workers
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self.pool = pool(max_workers=workers)
+        self.slots = threading.Semaphore(max_pending)
+        self.lock = threading.Lock()
+        self.futures = set()
+        self.errors = []
+        self.count = 0
+        self.encode_time = 0.0
+        self.wait_time = 0.0
+
+    def write(self, pred, path, image=None, overlay_path=None, alpha=0.5):
+        """Queues a label map to be written to `path`.
+
+        Parameters
+        ----------
+        pred : numpy.ndarray
+            Label map with shape `H, W`.
+        path : str
+            Where the color palette PNG is saved.
+        image : numpy.ndarray, optional
+            RGB input image with shape `H, W, 3`. If given, the colored mask blended over it
+            with weight `alpha` is also saved to `overlay_path`.
+        """
+        if self.errors:
+            raise self.errors[0]
+        start = time.time()
+        self.slots.acquire()
+        self.wait_time += time.time() - start
+        try:
+            future = self.pool.submit(_encode, pred, path, self.dataset, image, overlay_path, alpha)
+        except BaseException:
+            # e.g. the pool is shut down: the slot is not taken by any write
+            self.slots.release()
+            raise
+        with self.lock:
+            self.futures.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self.lock:
+            self.futures.discard(future)
+            if future.exception() is not None:
+                self.errors.append(future.exception())
+            else:
+                self.count += 1
+                self.encode_time += future.result()
+        self.slots.release()
+
+    def flush(self):
+        """Waits until every queued label map is written and raises the first error."""
+        while True:
+            with self.lock:
+                futures = list(self.futures)
+            if not futures:
+                break
+            for future in futures:
+                future.exception()
+        if self.errors:
+            raise self.errors[0]
+
+    def close(self):
+        self.flush()
+        self.pool.shutdown()
+
+    def report(self):
+        """Summary of the encode throughput, separate from the model throughput.
+
+        `blocked` is the time the inference loop spent waiting on a full queue: when it is
+        large, the writers and not the model are the bottleneck.
+        """
+        per_image = self.encode_time / self.count if self.count else 0.0
+        return ('Writer: {:d} images, {:.1f} ms encode per image, {:.1f} img/s over {:d} workers, '
+                'inference blocked {:.2f}s').format(self.count, per_image * 1000,
+                                                   self.workers / per_image if per_image else 0.0,
+                                                   self.workers, self.wait_time)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
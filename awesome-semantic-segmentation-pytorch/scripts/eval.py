@@ -2,6 +2,7 @@ from __future__ import print_function
 
 import os
 import sys
+import time
 
 cur_path = os.path.abspath(os.path.dirname(__file__))
 root_path = os.path.split(cur_path)[0]
@@ -16,9 +17,15 @@ from torchvision import transforms
 from core.data.dataloader import get_segmentation_dataset
 from core.models.model_zoo import get_segmentation_model
 from core.utils.score import SegmentationMetric
-from core.utils.visualize import get_color_pallete
+from core.utils.writer import MaskWriter
+from core.utils.onnx_export import ONNXRuntimeModel, get_onnx_file
+from core.utils.quantize import load_quantized_model, get_quantized_file
+from core.utils.tiled import TiledModel
+from core.utils.tta import MultiScaleModel
 from core.utils.logger import setup_logger
-from core.utils.distributed import synchronize, get_rank, make_data_sampler, make_batch_data_sampler
+from core.utils.augment import normalize
+from core.utils.distributed import synchronize, get_rank, make_data_sampler, \
+    make_bucket_batch_sampler, pad_batch_collate, uint8_batch_collate
 
 from train import parse_args
 
@@ -35,44 +42,73 @@ class Evaluator(object):
         ])
 
         # dataset and dataloader
-        val_dataset = get_segmentation_dataset(args.dataset, split='val', mode='testval', transform=input_transform)
+        dataset, data_kwargs = args.dataset, {'train_ids': True} if args.train_ids else {}
+        if args.packed_root:
+            dataset, data_kwargs = 'packed', {'root': args.packed_root}
+        # with uint8 transfers the images are normalized on the device instead
+        val_dataset = get_segmentation_dataset(dataset, split='val', mode='testval',
+                                               transform=None if args.uint8_transfer else input_transform,
+                                               **data_kwargs)
         val_sampler = make_data_sampler(val_dataset, False, args.distributed)
-        val_batch_sampler = make_batch_data_sampler(val_sampler, images_per_batch=1)
+        val_batch_sampler = make_bucket_batch_sampler(val_dataset, val_sampler, args.eval_batch_size,
+                                                      args.max_pixels, args.size_divisor)
         self.val_loader = data.DataLoader(dataset=val_dataset,
                                           batch_sampler=val_batch_sampler,
+                                          collate_fn=uint8_batch_collate if args.uint8_transfer else pad_batch_collate,
                                           num_workers=args.workers,
                                           pin_memory=True)
 
         # create network
-        BatchNorm2d = nn.SyncBatchNorm if args.distributed else nn.BatchNorm2d
-        self.model = get_segmentation_model(model=args.model, dataset=args.dataset, backbone=args.backbone,
-                                            aux=args.aux, pretrained=True, pretrained_base=False,
-                                            #local_rank=args.local_rank,
-                                            norm_layer=BatchNorm2d).to(self.device)
-        if args.distributed:
-            self.model = nn.parallel.DistributedDataParallel(self.model,
-                device_ids=[args.local_rank], output_device=args.local_rank)
-        self.model.to(self.device)
+        if args.backend == 'onnxruntime':
+            # ONNX Runtime runs the exported graph on the CPU
+            self.device = torch.device('cpu')
+            self.model = ONNXRuntimeModel(args.onnx_path or get_onnx_file(args.model, args.backbone, args.dataset))
+        else:
+            # inference only: every process keeps its own plain BatchNorm model, no DDP or SyncBatchNorm
+            self.model = get_segmentation_model(model=args.model, dataset=args.dataset, backbone=args.backbone,
+                                                aux=args.aux, pretrained=True, pretrained_base=False,
+                                                #local_rank=args.local_rank,
+                                                norm_layer=nn.BatchNorm2d).to(self.device)
+            if args.backend == 'int8':
+                # quantized kernels run on the CPU
+                self.device = torch.device('cpu')
+                self.model = load_quantized_model(self.model.cpu(), args.quantized_path or
+                                                  get_quantized_file(args.model, args.backbone, args.dataset))
+        if args.tile_size:
+            # sliding-window inference, memory bounded by the tile size instead of the image size
+            self.model = TiledModel(self.model, args.tile_size, args.tile_overlap, args.tile_window,
+                                    args.tile_batch_size)
+        if args.tta_scales or args.tta_flip:
+            # test-time augmentation, averaging the logits over scales and flips
+            self.model = MultiScaleModel(self.model, args.tta_scales or [1.0], args.tta_flip)
 
         self.metric = SegmentationMetric(val_dataset.num_class)
 
     def eval(self):
         self.metric.reset()
         self.model.eval()
-        if self.args.distributed:
-            model = self.model.module
-        else:
-            model = self.model
-        logger.info("Start validation, Total sample: {:d}".format(len(self.val_loader)))
+        model = self.model
+        logger.info("Start validation, Total sample: {:d}".format(len(self.val_loader.dataset)))
         avg_pixAcc = 0.0
         avg_mIoU = 0.0
         num_images = 0
-        for i, (image, target, filename) in enumerate(self.val_loader):
-            image = image.to(self.device)
-            target = target.to(self.device)
-
+        writer = MaskWriter(self.args.dataset, self.args.writer_workers, processes=self.args.writer_processes)
+        model_time = 0.0
+        model_images = 0
+        for i, (image, target, filename, sizes) in enumerate(self.val_loader):
+            image = image.to(self.device, non_blocking=True)
+            target = target.to(self.device, non_blocking=True)
+            if self.args.uint8_transfer:
+                image, target = normalize(image, sizes), target.long()
+
+            start = time.time()
             with torch.no_grad():
                 outputs = model(image)
+            if self.device.type == 'cuda':
+                torch.cuda.synchronize()
+            model_time += time.time() - start
+            model_images += image.size(0)
+            # padded pixels have a target of -1, so the metric ignores them
             self.metric.update(outputs[0], target)
             pixAcc, mIoU = self.metric.get()
             avg_mIoU += mIoU
@@ -84,14 +120,18 @@ class Evaluator(object):
                 pred = torch.argmax(outputs[0], 1)
                 pred = pred.cpu().data.numpy()
 
-                predict = pred.squeeze(0)
-                mask = get_color_pallete(predict, self.args.dataset)
-                mask.save(os.path.join(outdir, os.path.splitext(filename[0])[0] + '.png'))
+                for predict, name, (h, w) in zip(pred, filename, sizes.tolist()):
+                    writer.write(predict[:h, :w], os.path.join(outdir, os.path.splitext(name)[0] + '.png'))
             num_images += 1
         avg_pixAcc /= num_images
         avg_mIoU /= num_images
         logger.info("Average mIoU: {:.4f}, Average pixelAcc: {:.4f}".format(
                 mIoU * 100, pixAcc * 100))
+        writer.close()
+        logger.info("Model: {:d} images, {:.1f} img/s".format(model_images, model_images / max(model_time, 1e-6)))
+        logger.info(writer.report())
+        if isinstance(model, MultiScaleModel):
+            logger.info(model.report())
         synchronize()
 
 
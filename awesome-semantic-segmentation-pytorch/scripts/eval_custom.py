@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 
 cur_path = os.path.abspath(os.path.dirname(__file__))
 root_path = os.path.split(cur_path)[0]
@@ -12,12 +13,17 @@ import torch.backends.cudnn as cudnn
 import torch.utils.data as data
 import torch.nn as nn
 
-from core.utils.distributed import synchronize, get_rank, make_data_sampler, make_batch_data_sampler
+from core.utils.distributed import synchronize, get_rank, make_data_sampler, make_batch_data_sampler, \
+    uint8_batch_collate
 from core.utils.logger import setup_logger
 from core.models.model_zoo import get_segmentation_model
 from core.data.dataloader import get_segmentation_dataset
-from core.utils.visualize import get_color_pallete
+from core.utils.writer import MaskWriter
+from core.utils.onnx_export import ONNXRuntimeModel, get_onnx_file
+from core.utils.quantize import load_quantized_model, get_quantized_file
+from core.utils.tiled import TiledModel
 from core.utils.score import SegmentationMetric
+from core.utils.augment import normalize
 
 from train import parse_args
 
@@ -29,40 +35,65 @@ class CustomEvaluator(object):
             transforms.ToTensor(),
             transforms.Normalize([.485, .456, .406], [.229, .224, .225]),
         ])
-        dataset = get_segmentation_dataset('custom', input_pic=args.input_pic, mode='testval', transform=input_transform, split='val')
+        dataset = get_segmentation_dataset('custom', input_pic=args.input_pic, mode='testval',
+                                           transform=None if args.uint8_transfer else input_transform, split='val')
         sampler = make_data_sampler(dataset, False, args.distributed)
         batch_sampler = make_batch_data_sampler(sampler, images_per_batch=1)
-        self.dataloader = data.DataLoader(dataset=dataset, batch_sampler=batch_sampler, num_workers=args.workers, pin_memory=True)
+        self.dataloader = data.DataLoader(dataset=dataset, batch_sampler=batch_sampler,
+                                          collate_fn=uint8_batch_collate if args.uint8_transfer else None,
+                                          num_workers=args.workers, pin_memory=True)
         
-        BatchNorm2d = nn.SyncBatchNorm if args.distributed else nn.BatchNorm2d
-        self.model = get_segmentation_model(model=args.model, dataset=args.dataset, backbone=args.backbone,
-                                            aux=args.aux, pretrained=True, pretrained_base=False,
-                                            norm_layer=BatchNorm2d).to(self.device)
-        if args.distributed:
-            self.model = nn.parallel.DistributedDataParallel(self.model,
-                device_ids=[args.local_rank], output_device=args.local_rank)
-        self.model.to(self.device)
+        if args.backend == 'onnxruntime':
+            # ONNX Runtime runs the exported graph on the CPU
+            self.device = torch.device('cpu')
+            self.model = ONNXRuntimeModel(args.onnx_path or get_onnx_file(args.model, args.backbone, args.dataset))
+        else:
+            # inference only: every process keeps its own plain BatchNorm model, no DDP or SyncBatchNorm
+            self.model = get_segmentation_model(model=args.model, dataset=args.dataset, backbone=args.backbone,
+                                                aux=args.aux, pretrained=True, pretrained_base=False,
+                                                norm_layer=nn.BatchNorm2d).to(self.device)
+            if args.backend == 'int8':
+                # quantized kernels run on the CPU
+                self.device = torch.device('cpu')
+                self.model = load_quantized_model(self.model.cpu(), args.quantized_path or
+                                                  get_quantized_file(args.model, args.backbone, args.dataset))
+        if args.tile_size:
+            # sliding-window inference, memory bounded by the tile size instead of the image size
+            self.model = TiledModel(self.model, args.tile_size, args.tile_overlap, args.tile_window,
+                                    args.tile_batch_size)
 
     def eval(self):
         self.model.eval()
-        if self.args.distributed:
-            model = self.model.module
-        else:
-            model = self.model
+        model = self.model
+        writer = MaskWriter(self.args.dataset, self.args.writer_workers, processes=self.args.writer_processes)
+        model_time = 0.0
+        model_images = 0
         for i, (image) in enumerate(self.dataloader):
-            image = image.to(self.device)
+            if self.args.uint8_transfer:
+                image = normalize(image[0].to(self.device, non_blocking=True))
+            else:
+                image = image.to(self.device)
 
+            start = time.time()
             with torch.no_grad():
-                    outputs = model(image)
+                if hasattr(model, 'predict'):
+                    pred = model.predict(image)
+                else:
+                    pred = torch.argmax(model(image)[0], 1)
+            if self.device.type == 'cuda':
+                torch.cuda.synchronize()
+            model_time += time.time() - start
+            model_images += image.size(0)
 
             if self.args.save_pred:
-                pred = torch.argmax(outputs[0], 1)
                 pred = pred.cpu().data.numpy()
 
                 predict = pred.squeeze(0)
-                mask = get_color_pallete(predict, self.args.dataset)
                 logger.info('Saving to: ' + outpath)
-                mask.save(outpath)
+                writer.write(predict, outpath)
+        writer.close()
+        logger.info("Model: {:d} images, {:.1f} img/s".format(model_images, model_images / max(model_time, 1e-6)))
+        logger.info(writer.report())
         synchronize()
         logger.info('Validation complete')
 
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import argparse
+import torch
+import torch.nn as nn
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+root_path = os.path.split(cur_path)[0]
+sys.path.append(root_path)
+
+from torchvision import transforms
+from PIL import Image
+from core.models.model_zoo import get_segmentation_model
+from core.utils.onnx_export import export_onnx, check_onnx_parity, get_onnx_file, ONNXRuntimeModel
+
+parser = argparse.ArgumentParser(
+    description='Export a segmentation model to ONNX and check it against eager PyTorch')
+parser.add_argument('--model', type=str, default='psp',
+                    help='model name (default: psp)')
+parser.add_argument('--backbone', type=str, default='resnet50',
+                    help='backbone name (default: resnet50)')
+parser.add_argument('--dataset', type=str, default='citys',
+                    help='dataset the model was trained on (default: citys)')
+parser.add_argument('--save-folder', default='~/.torch/models',
+                    help='Directory of the pretrained models')
+parser.add_argument('--no-pretrained', action='store_true', default=False,
+                    help='export randomly initialized weights')
+parser.add_argument('--output', type=str, default=None,
+                    help='path of the ONNX graph (default: [save-folder]/[model]_[backbone]_[dataset].onnx)')
+parser.add_argument('--opset', type=int, default=13,
+                    help='ONNX opset version')
+parser.add_argument('--export-size', type=int, nargs=2, default=[512, 512], metavar=('H', 'W'),
+                    help='size of the dummy input traced during export')
+parser.add_argument('--check-images', nargs='*', default=[os.path.join(root_path, 'tests', 'test_img.jpg')],
+                    help='sample images the exported graph is compared on')
+parser.add_argument('--check-sizes', type=int, nargs='*', default=[384, 640],
+                    help='short sides the sample images are resized to, to check the dynamic height and width')
+parser.add_argument('--atol', type=float, default=1e-3,
+                    help='maximum absolute logit difference allowed')
+args = parser.parse_args()
+
+
+def export(config):
+    model = get_segmentation_model(model=config.model, dataset=config.dataset, backbone=config.backbone,
+                                   aux=False, pretrained=not config.no_pretrained, pretrained_base=False,
+                                   root=config.save_folder, norm_layer=nn.BatchNorm2d)
+    model.eval()
+    output = config.output
+    if output is None:
+        output = get_onnx_file(config.model, config.backbone, config.dataset, config.save_folder)
+    start = time.time()
+    export_onnx(model, output, *config.export_size, opset_version=config.opset)
+    print('Exported {} in {:.1f}s'.format(output, time.time() - start))
+
+    transform = transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Normalize([.485, .456, .406], [.229, .224, .225]),
+    ])
+    images = []
+    for path in config.check_images:
+        image = Image.open(path).convert('RGB')
+        for size in config.check_sizes:
+            w, h = image.size
+            scale = 1.0 * size / min(w, h)
+            images.append(transform(image.resize((int(w * scale), int(h * scale)), Image.BILINEAR)).unsqueeze(0))
+    passed = True
+    for h, w, diff, agreement in check_onnx_parity(model, ONNXRuntimeModel(output), images):
+        ok = diff <= config.atol
+        passed = passed and ok
+        print('{}x{}: max abs diff {:.2e}, label agreement {:.4f}% {}'.format(
+            h, w, diff, agreement * 100, 'OK' if ok else 'FAILED'))
+    if not passed:
+        sys.exit('The exported graph does not match eager PyTorch within atol={}'.format(config.atol))
+
+
+if __name__ == '__main__':
+    export(args)
@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+import argparse
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+root_path = os.path.split(cur_path)[0]
+sys.path.append(root_path)
+
+from core.data.dataloader.packed import pack_dataset
+
+parser = argparse.ArgumentParser(
+    description='Pack dataset splits into memory-mapped shards of raw images and masks')
+parser.add_argument('--dataset', type=str, default='citys',
+                    help='dataset name (default: citys)')
+parser.add_argument('--root', type=str, default=None,
+                    help='folder of the dataset (default: the dataset default)')
+parser.add_argument('--splits', nargs='+', default=['train', 'val'],
+                    help='splits that are packed')
+parser.add_argument('--output', type=str, default=None,
+                    help='folder of the packed dataset (default: ../datasets/packed/[dataset])')
+parser.add_argument('--shard-size', type=int, default=1024,
+                    help='size in MB after which a new shard is started')
+parser.add_argument('--train-ids', action='store_true', default=False,
+                    help='load the Cityscapes gtFine_labelTrainIds masks where they were converted')
+parser.add_argument('--workers', '-j', type=int, default=4,
+                    help='processes decoding the images')
+args = parser.parse_args()
+
+
+if __name__ == '__main__':
+    output = args.output or os.path.join('../datasets/packed', args.dataset)
+    kwargs = {'root': args.root} if args.root else {}
+    if args.train_ids:
+        kwargs['train_ids'] = True
+    for split in args.splits:
+        start = time.time()
+        path = pack_dataset(args.dataset, output, split, args.shard_size << 20, args.workers, **kwargs)
+        print('Packed the {} split in {:.1f}s: {}'.format(split, time.time() - start, path))
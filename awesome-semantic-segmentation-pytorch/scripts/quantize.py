@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import argparse
+import torch
+import torch.nn as nn
+import torch.utils.data as data
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+root_path = os.path.split(cur_path)[0]
+sys.path.append(root_path)
+
+from torchvision import transforms
+from core.models.model_zoo import get_segmentation_model
+from core.data.dataloader import get_segmentation_dataset
+from core.utils.score import SegmentationMetric
+from core.utils.quantize import quantize_int8, get_quantized_file, save_quantized_model
+
+parser = argparse.ArgumentParser(
+    description='Quantize a ResNet-based segmentation model to int8 and compare it with fp32')
+parser.add_argument('--model', type=str, default='psp',
+                    help='model name (default: psp)')
+parser.add_argument('--backbone', type=str, default='resnet50',
+                    help='backbone name (default: resnet50)')
+parser.add_argument('--dataset', type=str, default='citys',
+                    help='dataset the model was trained on (default: citys)')
+parser.add_argument('--save-folder', default='~/.torch/models',
+                    help='Directory of the pretrained models')
+parser.add_argument('--output', type=str, default=None,
+                    help='path of the int8 weights (default: [save-folder]/[model]_[backbone]_[dataset]_int8.pth)')
+parser.add_argument('--calib-split', type=str, default='train',
+                    help='dataset split the calibration images are drawn from')
+parser.add_argument('--calib-images', type=int, default=32,
+                    help='number of calibration images')
+parser.add_argument('--val-images', type=int, default=20,
+                    help='number of validation images fp32 and int8 are compared on')
+parser.add_argument('--engine', type=str, default='x86', choices=['x86', 'fbgemm', 'qnnpack'],
+                    help='quantized engine (qnnpack on ARM)')
+parser.add_argument('--workers', '-j', type=int, default=4,
+                    help='dataloader threads')
+args = parser.parse_args()
+
+
+def evaluate(model, loader, nclass):
+    metric = SegmentationMetric(nclass)
+    elapsed = 0.0
+    with torch.no_grad():
+        for image, target, _ in loader:
+            start = time.time()
+            outputs = model(image)
+            elapsed += time.time() - start
+            metric.update(outputs[0], target)
+    pixAcc, mIoU = metric.get()
+    return pixAcc, mIoU, elapsed / len(loader)
+
+
+def quantize(config):
+    input_transform = transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Normalize([.485, .456, .406], [.229, .224, .225]),
+    ])
+    calib_dataset = get_segmentation_dataset(config.dataset, split=config.calib_split, mode='val',
+                                             transform=input_transform)
+    val_dataset = get_segmentation_dataset(config.dataset, split='val', mode='testval', transform=input_transform)
+    calib_loader = data.DataLoader(data.Subset(calib_dataset, range(min(config.calib_images, len(calib_dataset)))),
+                                   batch_size=1, num_workers=config.workers)
+    val_loader = data.DataLoader(data.Subset(val_dataset, range(min(config.val_images, len(val_dataset)))),
+                                 batch_size=1, num_workers=config.workers)
+
+    model = get_segmentation_model(model=config.model, dataset=config.dataset, backbone=config.backbone,
+                                   aux=False, pretrained=True, pretrained_base=False,
+                                   root=config.save_folder, norm_layer=nn.BatchNorm2d).eval()
+    start = time.time()
+    quantized = quantize_int8(model, (batch[0] for batch in calib_loader), config.engine)
+    print('Calibrated on {} images and converted in {:.1f}s'.format(len(calib_loader), time.time() - start))
+    if quantized.float_stages:
+        print('Kept in float:', ', '.join(quantized.float_stages))
+    output = config.output or get_quantized_file(config.model, config.backbone, config.dataset, config.save_folder)
+    save_quantized_model(quantized, output)
+    print('Saved', output)
+
+    fp32 = evaluate(model, val_loader, val_dataset.num_class)
+    int8 = evaluate(quantized, val_loader, val_dataset.num_class)
+    print('{:>6} {:>8} {:>8} {:>12}'.format('', 'pixAcc', 'mIoU', 's / image'))
+    for name, (pixAcc, mIoU, latency) in (('fp32', fp32), ('int8', int8)):
+        print('{:>6} {:>8.2f} {:>8.2f} {:>12.3f}'.format(name, pixAcc * 100, mIoU * 100, latency))
+    print('mIoU delta: {:+.2f}, speedup: {:.2f}x over {} images'.format(
+        (int8[1] - fp32[1]) * 100, fp32[2] / int8[2], len(val_loader)))
+
+
+if __name__ == '__main__':
+    quantize(args)
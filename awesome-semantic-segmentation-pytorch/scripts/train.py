@@ -22,6 +22,7 @@ from core.utils.distributed import *
 from core.utils.logger import setup_logger
 from core.utils.lr_scheduler import WarmupPolyLR
 from core.utils.score import SegmentationMetric
+from core.utils.augment import BatchAugmentation, normalize
 
 
 def parse_args():
@@ -48,6 +49,14 @@ def parse_args():
                         help='base image size')
     parser.add_argument('--crop-size', type=int, default=480,
                         help='crop image size')
+    parser.add_argument('--train-ids', action='store_true', default=False,
+                        help='load the Cityscapes gtFine_labelTrainIds masks where they were converted')
+    parser.add_argument('--packed-root', type=str, default=None,
+                        help='load the dataset from the shards written by scripts/pack_dataset.py in this folder')
+    parser.add_argument('--batch-augment', action='store_true', default=False,
+                        help='augment the decoded training batches on the device instead of in the dataloader workers')
+    parser.add_argument('--uint8-transfer', action='store_true', default=False,
+                        help='send uint8 images and int16 masks to the device and normalize the images there')
     parser.add_argument('--workers', '-j', type=int, default=4,
                         metavar='N', help='dataloader threads')
     # training hyper params
@@ -105,6 +114,34 @@ def parse_args():
                         help='directory to the custom dataset folder to use for custom dataset evaluation')
     parser.add_argument('--outdir', default=None,
                         help='out directory where segmented images should be saved')
+    parser.add_argument('--eval-batch-size', type=int, default=1,
+                        help='number of images of the same size segmented together during evaluation')
+    parser.add_argument('--backend', type=str, default='pytorch', choices=['pytorch', 'onnxruntime', 'int8'],
+                        help='inference backend used by the evaluation scripts')
+    parser.add_argument('--onnx-path', default=None,
+                        help='ONNX graph run by the onnxruntime backend (default: exported by scripts/export_onnx.py)')
+    parser.add_argument('--quantized-path', default=None,
+                        help='int8 weights run by the int8 backend (default: saved by scripts/quantize.py)')
+    parser.add_argument('--writer-workers', type=int, default=4,
+                        help='number of background workers encoding the saved predictions')
+    parser.add_argument('--writer-processes', action='store_true', default=False,
+                        help='encode the saved predictions in processes instead of threads')
+    parser.add_argument('--max-pixels', type=int, default=None,
+                        help='maximum number of pixels in an evaluation batch')
+    parser.add_argument('--size-divisor', type=int, default=None,
+                        help='batch images whose sizes round up to the same multiple of size-divisor, padding them')
+    parser.add_argument('--tile-size', type=int, default=None,
+                        help='evaluate with overlapping tiles of this size instead of whole images')
+    parser.add_argument('--tile-overlap', type=int, default=128,
+                        help='minimum overlap of two neighbouring tiles')
+    parser.add_argument('--tile-window', type=str, default='hann', choices=['constant', 'linear', 'hann'],
+                        help='weights blending the logits of overlapping tiles')
+    parser.add_argument('--tile-batch-size', type=int, default=4,
+                        help='number of tiles passed through the model at once')
+    parser.add_argument('--tta-scales', type=float, nargs='+', default=None,
+                        help='evaluate with the logits averaged over these scales, e.g. 0.75 1.0 1.25')
+    parser.add_argument('--tta-flip', action='store_true', default=False,
+                        help='evaluate with the logits averaged over horizontal flips')
     args = parser.parse_args()
 
     # default settings for epochs, batch_size and lr
@@ -144,9 +181,25 @@ class Trainer(object):
             transforms.Normalize([.485, .456, .406], [.229, .224, .225]),
         ])
         # dataset and dataloader
-        data_kwargs = {'transform': input_transform, 'base_size': args.base_size, 'crop_size': args.crop_size}
-        train_dataset = get_segmentation_dataset(args.dataset, split='train', mode='train', **data_kwargs)
-        val_dataset = get_segmentation_dataset(args.dataset, split='val', mode='val', **data_kwargs)
+        # with uint8 transfers the samples are normalized on the device instead
+        self.uint8 = args.uint8_transfer or args.batch_augment
+        data_kwargs = {'transform': None if args.uint8_transfer else input_transform,
+                       'base_size': args.base_size, 'crop_size': args.crop_size}
+        dataset = args.dataset
+        if args.packed_root:
+            dataset = 'packed'
+            data_kwargs['root'] = args.packed_root
+        elif args.train_ids:
+            data_kwargs['train_ids'] = True
+        if args.batch_augment:
+            # the workers only decode the samples, which are cropped and normalized on the device
+            train_dataset = get_segmentation_dataset(dataset, split='train', mode='testval',
+                                                     **dict(data_kwargs, transform=None))
+            self.augment = BatchAugmentation(args.base_size, args.crop_size, train_dataset.target_fill)
+        else:
+            train_dataset = get_segmentation_dataset(dataset, split='train', mode='train', **data_kwargs)
+            self.augment = None
+        val_dataset = get_segmentation_dataset(dataset, split='val', mode='val', **data_kwargs)
         args.iters_per_epoch = len(train_dataset) // (args.num_gpus * args.batch_size)
         args.max_iters = args.epochs * args.iters_per_epoch
 
@@ -157,10 +210,12 @@ class Trainer(object):
 
         self.train_loader = data.DataLoader(dataset=train_dataset,
                                             batch_sampler=train_batch_sampler,
+                                            collate_fn=uint8_batch_collate if self.uint8 else None,
                                             num_workers=args.workers,
                                             pin_memory=True)
         self.val_loader = data.DataLoader(dataset=val_dataset,
                                           batch_sampler=val_batch_sampler,
+                                          collate_fn=uint8_batch_collate if args.uint8_transfer else None,
                                           num_workers=args.workers,
                                           pin_memory=True)
 
@@ -219,12 +274,16 @@ class Trainer(object):
         logger.info('Start training, Total Epochs: {:d} = Total Iterations {:d}'.format(epochs, max_iters))
 
         self.model.train()
-        for iteration, (images, targets, _) in enumerate(self.train_loader):
+        for iteration, batch in enumerate(self.train_loader):
             iteration = iteration + 1
             self.lr_scheduler.step()
 
-            images = images.to(self.device)
-            targets = targets.to(self.device)
+            images = batch[0].to(self.device, non_blocking=True)
+            targets = batch[1].to(self.device, non_blocking=True)
+            if self.augment is not None:
+                images, targets = self.augment(images, targets, batch[-1])
+            if self.uint8:
+                images, targets = normalize(images), targets.long()
 
             outputs = self.model(images)
             loss_dict = self.criterion(outputs, targets)
@@ -272,9 +331,11 @@ class Trainer(object):
             model = self.model
         torch.cuda.empty_cache()  # TODO check if it helps
         model.eval()
-        for i, (image, target, filename) in enumerate(self.val_loader):
-            image = image.to(self.device)
-            target = target.to(self.device)
+        for i, batch in enumerate(self.val_loader):
+            image = batch[0].to(self.device, non_blocking=True)
+            target = batch[1].to(self.device, non_blocking=True)
+            if self.args.uint8_transfer:
+                image, target = normalize(image), target.long()
 
             with torch.no_grad():
                 outputs = model(image)
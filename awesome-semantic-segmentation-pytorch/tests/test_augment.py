@@ -0,0 +1,101 @@
+import random
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from core.data.dataloader.segbase import SegmentationDataset
+from core.utils.augment import BatchAugmentation, normalize
+from core.utils.distributed import pad_batch_collate, uint8_batch_collate
+
+
+def _samples():
+    rs = np.random.RandomState(0)
+    samples = []
+    for h, w in [(96, 160), (120, 80), (40, 56)]:
+        # smooth images, whose statistics survive the resize, and blocky masks
+        coarse = rs.randint(0, 256, (h // 8 + 1, w // 8 + 1, 3)).astype(np.uint8)
+        image = np.array(Image.fromarray(coarse).resize((w, h), Image.BILINEAR))
+        mask = np.kron(rs.randint(0, 19, (h // 4, w // 4)), np.ones((4, 4), dtype=np.int64)).astype(np.uint8)
+        samples.append((image, mask, str(len(samples))))
+    return samples
+
+
+def _pil_path(samples, dataset):
+    crops = [dataset._sync_transform(Image.fromarray(image), Image.fromarray(mask)) for image, mask, _ in samples]
+    return np.stack([crop[0] for crop in crops]), np.stack([crop[1] for crop in crops])
+
+
+def testSameRandomState():
+    samples = _samples()
+    dataset = SegmentationDataset(None, 'train', 'train', None, base_size=100, crop_size=88)
+    dataset.mask_fill = 255
+    augment = BatchAugmentation(100, 88, mask_fill=255)
+    images, masks, names, sizes = uint8_batch_collate(samples)
+    assert images.shape == (3, 120, 160, 3) and names == ['0', '1', '2']
+    for seed in range(20):
+        random.seed(seed)
+        expected_images, expected_masks = _pil_path(samples, dataset)
+        random.seed(seed)
+        out_images, out_masks = augment(images, masks, sizes)
+        assert out_images.dtype == torch.uint8 and out_images.shape == (3, 88, 88, 3)
+        assert np.array_equal(out_masks.numpy(), expected_masks), seed
+        # the resize rounds like PIL, the box blur approximates its rounding
+        diff = np.abs(out_images.numpy().astype(int) - expected_images)
+        assert diff.max() <= 6 and diff.mean() < 0.5, seed
+
+
+def testStatisticalEquivalence():
+    samples = _samples()
+    dataset = SegmentationDataset(None, 'train', 'train', None, base_size=100, crop_size=88)
+    augment = BatchAugmentation(100, 88, mask_fill=0)
+    images, masks, _, sizes = uint8_batch_collate(samples)
+    pil_images, pil_masks, batch_images, batch_masks = [], [], [], []
+    # independent random streams for the two paths
+    random.seed(0)
+    for _ in range(100):
+        image, mask = _pil_path(samples, dataset)
+        pil_images.append(image)
+        pil_masks.append(mask)
+    random.seed(1)
+    for _ in range(100):
+        image, mask = augment(images, masks, sizes)
+        batch_images.append(image.numpy())
+        batch_masks.append(mask.numpy())
+    pil_images, batch_images = np.concatenate(pil_images), np.concatenate(batch_images)
+    pil_masks, batch_masks = np.concatenate(pil_masks), np.concatenate(batch_masks)
+    assert abs(pil_images.mean() - batch_images.mean()) < 0.02 * pil_images.mean()
+    assert abs(pil_images.std() - batch_images.std()) < 0.02 * pil_images.std()
+    # class frequencies, padding included, and the padded fraction of the crops
+    pil_freq = np.bincount(pil_masks.ravel(), minlength=19) / pil_masks.size
+    batch_freq = np.bincount(batch_masks.ravel(), minlength=19) / batch_masks.size
+    assert 0.5 * np.abs(pil_freq - batch_freq).sum() < 0.03
+    assert abs((pil_images == 0).all(-1).mean() - (batch_images == 0).all(-1).mean()) < 0.03
+
+
+def testNormalize():
+    image = np.random.RandomState(0).randint(0, 256, (24, 32, 3)).astype(np.uint8)
+    expected = transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Normalize([.485, .456, .406], [.229, .224, .225]),
+    ])(image)
+    assert torch.allclose(normalize(torch.from_numpy(image)[None])[0], expected, atol=1e-5)
+
+
+def testUint8BatchCollate():
+    rs = np.random.RandomState(0)
+    samples = [(rs.randint(0, 256, (h, w, 3)).astype(np.uint8), torch.from_numpy(rs.randint(-1, 19, (h, w))),
+                str(h)) for h, w in [(20, 30), (24, 16)]]
+    transform = transforms.Compose([
+        transforms.ToTensor(),
+        transforms.Normalize([.485, .456, .406], [.229, .224, .225]),
+    ])
+    expected = pad_batch_collate([(transform(image), mask, name) for image, mask, name in samples])
+    # collated in a worker, into shared memory
+    loader = torch.utils.data.DataLoader(samples, batch_size=2, num_workers=1, collate_fn=uint8_batch_collate)
+    for batch in [uint8_batch_collate(samples), next(iter(loader))]:
+        images, masks, names, sizes = batch
+        assert images.dtype == torch.uint8 and images.shape == (2, 24, 30, 3)
+        assert masks.dtype == torch.int16 and names == ['20', '24']
+        assert torch.equal(masks.long(), expected[1]) and torch.equal(sizes, expected[3])
+        assert torch.allclose(normalize(images, sizes), expected[0], atol=1e-5)
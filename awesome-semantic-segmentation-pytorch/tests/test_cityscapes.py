@@ -0,0 +1,16 @@
+import numpy as np
+
+from core.data.dataloader.cityscapes import _TARGETS, label_to_train_id
+
+
+def testTrainIds():
+    # the mapping of CitySegmentation before the lookup tables
+    key = np.array([-1, -1, -1, -1, -1, -1, -1, -1, 0, 1, -1, -1, 2, 3, 4, -1, -1, -1,
+                    5, -1, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, -1, -1, 16, 17, 18])
+    mapping = np.array(range(-1, len(key) - 1)).astype('int32')
+    mask = np.arange(-1, 34).reshape(5, 7)
+    expected = key[np.digitize(mask.ravel(), mapping, right=True)].reshape(mask.shape)
+    train_ids = label_to_train_id(mask)
+    assert train_ids.dtype == np.uint8 and set(np.unique(train_ids)) == set(range(19)) | {255}
+    assert np.array_equal(np.take(_TARGETS, train_ids), expected)
+    assert np.array_equal(np.take(_TARGETS, label_to_train_id(mask.astype(np.uint8))), expected)
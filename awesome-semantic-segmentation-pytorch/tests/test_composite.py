@@ -0,0 +1,75 @@
+import numpy as np
+import torch
+from PIL import Image
+
+from core.utils.composite import get_palette
+from core.utils.visualize import get_color_pallete, set_img_color, vocpallete, adepallete, cityspallete
+
+
+def _reference_pallete(npimg, dataset):
+    # get_color_pallete before it used the lookup tables
+    npimg = npimg.copy()
+    if dataset in ('pascal_voc', 'pascal_aug'):
+        npimg[npimg == -1] = 255
+    if dataset == 'ade20k':
+        out_img = Image.fromarray((npimg + 1).astype('uint8'))
+        out_img.putpalette(adepallete)
+    else:
+        out_img = Image.fromarray(npimg.astype('uint8'))
+        out_img.putpalette(cityspallete if dataset == 'citys' else vocpallete)
+    return out_img
+
+
+def testColorize():
+    labels = np.concatenate([np.arange(-1, 256), np.zeros(3, dtype=np.int64)]).reshape(4, 65)
+    for dataset in ['pascal_voc', 'ade20k', 'citys']:
+        expected = np.array(_reference_pallete(labels, dataset).convert('RGB'))
+        palette = get_palette(dataset)
+        assert np.array_equal(np.array(get_color_pallete(labels, dataset).convert('RGB')), expected), dataset
+        assert np.array_equal(palette.colorize(labels), expected), dataset
+        assert np.array_equal(palette.colorize(torch.from_numpy(labels)).numpy(), expected), dataset
+    # batches of uint8 label maps
+    batch = np.random.RandomState(0).randint(0, 19, (3, 20, 30)).astype(np.uint8)
+    colors = get_palette('citys').colorize(batch)
+    assert colors.shape == (3, 20, 30, 3)
+    assert np.array_equal(colors[1], np.array(_reference_pallete(batch[1], 'citys').convert('RGB')))
+    assert torch.equal(get_palette('citys').colorize(torch.from_numpy(batch)), torch.from_numpy(colors))
+
+
+def testOverlay():
+    rs = np.random.RandomState(0)
+    image = rs.randint(0, 256, (2, 24, 32, 3)).astype(np.uint8)
+    labels = rs.randint(0, 19, (2, 24, 32))
+    palette = get_palette('citys')
+    for alpha in [0.0, 0.3, 0.5]:
+        color = np.array(_reference_pallete(labels[0], 'citys').convert('RGB'), dtype=np.float32)
+        expected = (np.asarray(image[0], dtype=np.float32) * (1 - alpha) + color * alpha).astype('uint8')
+        out = palette.overlay(image, labels, alpha)
+        assert out.dtype == np.uint8 and out.shape == image.shape, alpha
+        # the fixed-point weights are exact for 0 and 0.5
+        assert np.abs(out[0].astype(int) - expected).max() <= (0 if alpha in (0.0, 0.5) else 1), alpha
+        out = palette.overlay(torch.from_numpy(image), torch.from_numpy(labels), alpha)
+        assert torch.equal(out, torch.from_numpy(palette.overlay(image, labels, alpha))), alpha
+
+
+def testBgr():
+    labels = np.random.RandomState(0).randint(0, 150, (24, 32))
+    for dataset in ['ade20k', 'citys']:
+        palette = get_palette(dataset)
+        assert np.array_equal(palette.bgr().colorize(labels), palette.colorize(labels)[..., ::-1]), dataset
+
+
+def testSetImgColor():
+    rs = np.random.RandomState(0)
+    colors = rs.randint(0, 256, (21, 3))
+    label = rs.randint(-1, 23, (30, 40))
+    label[:2] = 255
+    for background, show255 in [(0, False), (3, True), (-1, False)]:
+        expected = rs.randint(0, 256, (30, 40, 3)).astype(np.uint8)
+        img = expected.copy()
+        for i in range(len(colors)):
+            if i != background:
+                expected[np.where(label == i)] = colors[i]
+        if show255:
+            expected[np.where(label == 255)] = 255
+        assert np.array_equal(set_img_color(img, label, colors, background, show255), expected)
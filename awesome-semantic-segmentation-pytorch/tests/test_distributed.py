@@ -0,0 +1,34 @@
+import torch
+
+from core.utils.distributed import BucketBatchSampler, pad_batch_collate
+
+
+def testPadBatchCollate():
+    batch = [(torch.ones(3, 4, 6), torch.zeros(4, 6, dtype=torch.long), 'a.png'),
+             (torch.ones(3, 5, 3), torch.ones(5, 3, dtype=torch.long), 'b.png')]
+    images, masks, names, sizes = pad_batch_collate(batch)
+    assert images.shape == (2, 3, 5, 6) and masks.shape == (2, 5, 6)
+    assert sizes.tolist() == [[4, 6], [5, 3]] and list(names) == ['a.png', 'b.png']
+    # images are padded with zeros and masks with -1, which the metrics ignore
+    assert images[0, :, 4:].eq(0).all() and images[1, :, :, 3:].eq(0).all()
+    assert masks[0, 4:].eq(-1).all() and masks[1, :, 3:].eq(-1).all()
+    assert images[1, :, :5, :3].eq(1).all() and masks[1, :5, :3].eq(1).all()
+
+
+def testBucketBatchSampler():
+    sizes = [(512, 1024), (512, 1024), (480, 640), (512, 1024), (480, 640), (500, 1000)]
+    batches = list(BucketBatchSampler(range(len(sizes)), sizes, images_per_batch=2))
+    # every batch holds images of one size, and every index is sampled once
+    assert all(len(set(sizes[i] for i in batch)) == 1 for batch in batches)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(sizes)))
+    assert max(len(batch) for batch in batches) == 2
+    assert len(BucketBatchSampler(range(len(sizes)), sizes, 2)) == len(batches) == 4
+
+    # nearly equal sizes share a bucket once rounded up
+    sampler = BucketBatchSampler(range(len(sizes)), sizes, images_per_batch=4, size_divisor=32)
+    assert [0, 1, 3, 5] in list(sampler)
+
+    # batches of large images hold fewer of them, but at least one
+    sampler = BucketBatchSampler(range(len(sizes)), sizes, images_per_batch=4, max_pixels=512 * 1024)
+    assert all(len(batch) == 1 for batch in sampler if sizes[batch[0]] == (512, 1024))
+    assert len(list(BucketBatchSampler(range(2), sizes, 4, max_pixels=1))) == 2
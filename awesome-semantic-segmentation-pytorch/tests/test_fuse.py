@@ -0,0 +1,75 @@
+from core.nn.syncbn import SyncBatchNorm
+import torch
+import torch.nn as nn
+import numpy as np
+
+from torch.nn.modules.batchnorm import _BatchNorm
+from core.models.model_zoo import get_segmentation_model
+from core.utils.fuse import fuse_for_inference
+
+ATOL = 1e-4
+RTOL = 1e-3
+
+# deeplabv3_plus cannot be built: its head passes no norm_kwargs to _ASPP
+MODELS = ['fcn32s', 'fcn16s', 'fcn8s', 'fcn', 'psp', 'deeplabv3', 'danet', 'denseaspp', 'bisenet', 'encnet',
+          'dunet', 'icnet', 'enet', 'ocnet', 'ccnet', 'psanet', 'cgnet', 'espnet', 'lednet', 'dfanet']
+# psanet's attention is sized for 480x480 crops
+SIZES = {'psanet': 480}
+
+
+def _randomize_batchnorm(model):
+    # non-trivial statistics, so that folding is actually exercised
+    for m in model.modules():
+        if isinstance(m, _BatchNorm):
+            m.running_mean.uniform_(-0.5, 0.5)
+            m.running_var.uniform_(0.5, 2.0)
+            if m.affine:
+                m.weight.data.uniform_(0.5, 1.5)
+                m.bias.data.uniform_(-0.5, 0.5)
+
+
+def _assert_tensor_close(a, b, name, atol=ATOL, rtol=RTOL):
+    npa, npb = a.cpu().numpy(), b.cpu().numpy()
+    assert np.allclose(npa, npb, rtol=rtol, atol=atol * np.abs(npa).max()), \
+        '{}: fused output differs, adiff={}'.format(name, np.abs(npa - npb).max())
+
+
+def testFuseForInference():
+    torch.manual_seed(0)
+    for name in MODELS:
+        if name == 'ccnet' and not torch.cuda.is_available():
+            # criss-cross attention only has a CUDA kernel
+            continue
+        size = SIZES.get(name, 128)
+        image = torch.randn(1, 3, size, size)
+        model = get_segmentation_model(name, dataset='citys', pretrained=False, pretrained_base=False,
+                                       norm_layer=nn.BatchNorm2d)
+        with torch.no_grad():
+            _randomize_batchnorm(model)
+            model.eval()
+            expected = model(image)
+            batchnorms = sum(isinstance(m, _BatchNorm) for m in model.modules())
+            fuse_for_inference(model)
+            outputs = model(image)
+        assert sum(isinstance(m, _BatchNorm) for m in model.modules()) < batchnorms, name
+        assert not any(isinstance(m, nn.Dropout) for m in model.modules()), name
+        for a, b in zip(expected, outputs):
+            _assert_tensor_close(a, b, name)
+
+
+def testFuseSyncBatchNorm():
+    def _model(norm_layer, sync_norm_layer):
+        return nn.Sequential(nn.Conv2d(3, 8, 3, bias=False), norm_layer(8), nn.ReLU(),
+                             nn.Conv2d(8, 8, 1), sync_norm_layer(8))
+
+    # core.nn.syncbn.SyncBatchNorm cannot run on the CPU, so the reference uses BatchNorm2d
+    reference = _model(nn.BatchNorm2d, nn.BatchNorm2d)
+    model = _model(SyncBatchNorm, nn.SyncBatchNorm)
+    image = torch.randn(2, 3, 16, 16)
+    with torch.no_grad():
+        _randomize_batchnorm(reference)
+        model.load_state_dict(reference.state_dict())
+        expected = reference.eval()(image)
+        fuse_for_inference(model)
+        assert not any(isinstance(m, _BatchNorm) for m in model.modules())
+        _assert_tensor_close(expected, model(image), 'syncbn')
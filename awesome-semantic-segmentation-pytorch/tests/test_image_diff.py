@@ -0,0 +1,85 @@
+import os
+import sys
+import tempfile
+import numpy as np
+
+from PIL import Image
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+project_path = os.path.dirname(os.path.split(cur_path)[0])
+sys.path.append(project_path)
+
+from image_diff import label_diff, class_changes, read_labels, compare_labels_task, compare_pair, compare_task, \
+    pair_files
+
+
+def testComparePair():
+    image = np.random.RandomState(0).randint(0, 256, (32, 32, 3)).astype(np.uint8)
+    changed = image.copy()
+    changed[8:16, 8:16] = 0
+    with tempfile.TemporaryDirectory() as root:
+        dirA, dirB = os.path.join(root, 'a'), os.path.join(root, 'b')
+        os.makedirs(dirA)
+        os.makedirs(dirB)
+        Image.fromarray(image).save(os.path.join(dirA, 'same.png'))
+        Image.fromarray(image).save(os.path.join(dirB, 'same.png'))
+        Image.fromarray(image).save(os.path.join(dirA, 'changed.png'))
+        Image.fromarray(changed).save(os.path.join(dirB, 'changed.png'))
+        Image.fromarray(image[:16]).save(os.path.join(dirB, 'small.png'))
+        Image.fromarray(image).save(os.path.join(dirA, 'small.png'))
+        Image.fromarray(image).save(os.path.join(dirA, 'only.png'))
+        open(os.path.join(dirB, 'notes.txt'), 'w').close()
+        # images are paired by file name, other files are ignored
+        assert pair_files(dirA, dirB) == (['changed.png', 'same.png', 'small.png'], 1, 0)
+
+        score, contours = compare_pair(os.path.join(dirA, 'same.png'), os.path.join(dirB, 'same.png'))
+        assert abs(score - 1) < 1e-6
+        dest_path = os.path.join(root, 'diff')
+        score, contours = compare_pair(os.path.join(dirA, 'changed.png'), os.path.join(dirB, 'changed.png'),
+                                       dest_path)
+        assert score < 1 and contours > 0 and len(os.listdir(dest_path)) == 2
+        # pairs that cannot be compared are reported rather than raised
+        name, score, contours, error = compare_task(('small.png', os.path.join(dirA, 'small.png'),
+                                                     os.path.join(dirB, 'small.png'), None))
+        assert name == 'small.png' and score is None and 'different sizes' in error
+        assert 'cannot read' in compare_task(('x.png', os.path.join(dirA, 'x.png'),
+                                              os.path.join(dirB, 'x.png'), None))[3]
+
+
+def testLabelDiff():
+    labelsA = np.zeros((20, 30), dtype=np.uint8)
+    labelsA[:, 15:] = 1
+    labelsB = labelsA.copy()
+    # a 4 x 5 block of class 1 becomes class 2, and a single pixel of class 0 becomes class 1
+    labelsB[2:6, 20:25] = 2
+    labelsB[15, 3] = 1
+    confusion, regions = label_diff(labelsA, labelsB)
+    assert confusion.shape == (3, 3) and confusion.sum() == labelsA.size
+    assert confusion[1, 2] == 20 and confusion[0, 1] == 1
+    assert confusion[0, 0] == 299 and confusion[1, 1] == 280
+    # x, y, width, height and area of every changed region
+    assert sorted(map(tuple, regions[:, :5].tolist())) == [(3, 15, 1, 1, 1), (20, 2, 5, 4, 20)]
+    assert label_diff(labelsA, labelsB, min_area=2)[1][:, 4].tolist() == [20]
+
+    counts = class_changes(confusion)
+    # pixels in the first map, in the second, lost and gained
+    assert counts.tolist() == [[300, 299, 1, 0], [300, 281, 20, 1], [0, 20, 0, 20]]
+
+
+def testLabelDiffFiles():
+    labels = np.random.RandomState(0).randint(0, 19, (16, 16)).astype(np.uint8)
+    with tempfile.TemporaryDirectory() as root:
+        paths = [os.path.join(root, name) for name in ('a.png', 'b.png', 'c.png', 'rgb.png')]
+        palette_image = Image.fromarray(labels)
+        palette_image.putpalette([0, 0, 0] * 256)
+        palette_image.save(paths[0])
+        Image.fromarray(labels).save(paths[1])
+        Image.fromarray(labels[:8]).save(paths[2])
+        Image.fromarray(np.zeros((16, 16, 3), dtype=np.uint8)).save(paths[3])
+        # palette and grayscale label maps are read as classes
+        assert np.array_equal(read_labels(paths[0]), read_labels(paths[1]))
+        name, confusion, regions, error = compare_labels_task(('a.png', paths[0], paths[1], 1))
+        assert error is None and len(regions) == 0 and np.trace(confusion) == labels.size
+        # pairs that cannot be compared are reported rather than raised
+        assert 'different sizes' in compare_labels_task(('c.png', paths[0], paths[2], 1))[3]
+        assert 'not a label map' in compare_labels_task(('rgb.png', paths[0], paths[3], 1))[3]
@@ -0,0 +1,68 @@
+import torch
+import torch.nn as nn
+
+from core.models.model_zoo import get_segmentation_model
+from core.utils.keyframe import KeyframeModel
+
+
+def _model(name='psp'):
+    return get_segmentation_model(name, dataset='citys', aux=True, pretrained=False, pretrained_base=False,
+                                  norm_layer=nn.BatchNorm2d).eval()
+
+
+def testKeyframeModel():
+    torch.manual_seed(0)
+    model = _model()
+    frames = torch.randn(7, 3, 64, 80)
+    # a keyframe on every frame is plain per-frame inference
+    keyframes = KeyframeModel(model, interval=1)
+    assert torch.equal(keyframes.predict(frames), model.predict(frames))
+    assert keyframes.keyframes == 7
+
+    # keyframes are chosen the same way whatever the batches the frames come in
+    whole = KeyframeModel(model, interval=3)
+    expected = whole.predict(frames)
+    split = KeyframeModel(model, interval=3)
+    labels = torch.cat([split.predict(frames[:2]), split.predict(frames[2:6]), split.predict(frames[6:])])
+    assert torch.equal(labels, expected)
+    assert whole.keyframes == split.keyframes == 3
+
+    # the frames after a keyframe reuse its deep features, a copy of the keyframe gives its labels
+    still = KeyframeModel(model, interval=4)
+    labels = still.predict(frames[:1].repeat(4, 1, 1, 1))
+    assert all(torch.equal(labels[i], labels[0]) for i in range(4)) and still.keyframes == 1
+
+    # adaptive keyframes follow the changes of the frames
+    adaptive = KeyframeModel(model, interval=10, mode='pixel', threshold=0.5)
+    adaptive.predict(torch.cat([frames[:1].repeat(3, 1, 1, 1), frames[1:2].repeat(3, 1, 1, 1)]))
+    assert adaptive.keyframes == 2
+
+
+def testKeyframeLabelHolding():
+    torch.manual_seed(0)
+    model = _model()
+    frames = torch.randn(6, 3, 64, 80)
+    batches = []
+    model.pretrained.layer1.register_forward_hook(lambda module, input, output: batches.append(output.size(0)))
+    keyframes = KeyframeModel(model, interval=3)
+    labels = keyframes.predict(frames)
+    # the PSP head only uses c3 and c4: the frames between keyframes skip the backbone
+    assert sum(batches) == keyframes.keyframes == 2
+    expected = model.predict(frames[[0, 3]])
+    assert all(torch.equal(labels[i], expected[i // 3]) for i in range(6))
+
+    # a head using the low-level features still runs on every frame
+    model = _model('dunet')
+    keyframes = KeyframeModel(model, interval=3)
+    labels = keyframes.predict(frames)
+    assert keyframes.keyframes == 2 and not torch.equal(labels[1], labels[0])
+
+
+def testKeyframeModelUnsupported():
+    for name in ['icnet', 'bisenet']:
+        model = _model(name)
+        try:
+            KeyframeModel(model).predict(torch.randn(2, 3, 64, 64))
+        except (ValueError, RuntimeError):
+            continue
+        assert False, name
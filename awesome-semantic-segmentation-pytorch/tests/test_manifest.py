@@ -0,0 +1,30 @@
+import os
+import tempfile
+
+from core.data.dataloader.manifest import DatasetManifest
+
+
+def testDatasetManifest():
+    root = tempfile.mkdtemp()
+    cache = tempfile.mkdtemp()
+    for folder in ['images/a', 'images/b', 'masks/a']:
+        os.makedirs(os.path.join(root, folder))
+    for path in ['images/a/1.png', 'images/a/2.jpg', 'images/b/3.png', 'masks/a/1.png']:
+        with open(os.path.join(root, path), 'w') as f:
+            f.write(path)
+    folders = [os.path.join(root, 'images'), os.path.join(root, 'masks'), os.path.join(root, 'missing')]
+
+    manifest = DatasetManifest(folders, cache_dir=cache)
+    assert manifest.scanned and len(manifest) == 4
+    assert manifest.files(os.path.join(root, 'images'), '.png') == [os.path.join(root, 'images/a/1.png'),
+                                                                    os.path.join(root, 'images/b/3.png')]
+    assert manifest.isfile(os.path.join(root, 'masks/a/1.png')) and not manifest.isfile(os.path.join(root, 'masks/a/2.png'))
+    assert manifest.stat(os.path.join(root, 'images/a/2.jpg'))[0] == len('images/a/2.jpg')
+    # loaded from the saved manifest while no directory changes
+    assert not DatasetManifest(folders, cache_dir=cache).scanned
+    with open(os.path.join(root, 'masks/a/2.png'), 'w'):
+        pass
+    manifest = DatasetManifest(folders, cache_dir=cache)
+    assert manifest.scanned and manifest.isfile(os.path.join(root, 'masks/a/2.png'))
+    os.makedirs(os.path.join(root, 'missing'))
+    assert DatasetManifest(folders, cache_dir=cache).scanned
@@ -0,0 +1,28 @@
+import os
+import tempfile
+import pytest
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from core.models.model_zoo import get_segmentation_model
+from core.utils.onnx_export import export_onnx, check_onnx_parity, ONNXRuntimeModel
+
+
+def testExportParity():
+    pytest.importorskip('onnx')
+    pytest.importorskip('onnxruntime')
+    torch.manual_seed(0)
+    model = get_segmentation_model('psp', dataset='citys', aux=False, pretrained=False, pretrained_base=False,
+                                   norm_layer=nn.BatchNorm2d).eval()
+    adaptive_avg_pool2d = F.adaptive_avg_pool2d
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'psp.onnx')
+        export_onnx(model, path, height=64, width=64)
+        assert F.adaptive_avg_pool2d is adaptive_avg_pool2d
+        onnx_model = ONNXRuntimeModel(path, threads=1)
+        # sizes other than the traced one go through the dynamic axes
+        images = [torch.randn(1, 3, 64, 64), torch.randn(1, 3, 72, 96)]
+        for height, width, diff, agreement in check_onnx_parity(model, onnx_model, images):
+            assert diff < 1e-3 and agreement > 0.99, (height, width)
+        assert onnx_model(torch.randn(2, 3, 48, 56))[0].shape == (2, 19, 48, 56)
@@ -0,0 +1,47 @@
+import os
+import random
+import tempfile
+import numpy as np
+import torch
+from PIL import Image
+
+from core.data.dataloader import get_segmentation_dataset
+from core.data.dataloader.packed import pack_dataset
+
+
+def _cityscapes_split(root, sizes):
+    rs = np.random.RandomState(0)
+    for folder in ['leftImg8bit/val/city', 'gtFine/val/city']:
+        os.makedirs(os.path.join(root, folder))
+    for i, (h, w) in enumerate(sizes):
+        image = rs.randint(0, 256, (h, w, 3)).astype(np.uint8)
+        Image.fromarray(image).save(os.path.join(root, 'leftImg8bit/val/city/c_{:06d}_leftImg8bit.png'.format(i)))
+        mask = rs.randint(0, 34, (h, w)).astype(np.uint8)
+        Image.fromarray(mask).save(os.path.join(root, 'gtFine/val/city/c_{:06d}_gtFine_labelIds.png'.format(i)))
+
+
+def testPackedDataset():
+    root = tempfile.mkdtemp()
+    _cityscapes_split(os.path.join(root, 'citys'), [(48, 96), (80, 60), (30, 40)])
+    # small shards, to store the samples in several of them
+    pack_dataset('citys', os.path.join(root, 'packed'), split='val', shard_size=45000,
+                 root=os.path.join(root, 'citys'), manifest=False)
+    kwargs = {'split': 'val', 'base_size': 64, 'crop_size': 56}
+    source = get_segmentation_dataset('citys', root=os.path.join(root, 'citys'), manifest=False, **kwargs)
+    packed = get_segmentation_dataset('packed', root=os.path.join(root, 'packed'), **kwargs)
+    assert len(packed) == 3 and len(packed.shards) == 2
+    assert packed.num_class == 19 and packed.pred_offset == 0
+    for mode in ['testval', 'val', 'train']:
+        source.mode = packed.mode = mode
+        for i in range(len(source)):
+            for seed in range(6 if mode == 'train' else 1):
+                random.seed(seed)
+                img, mask, name = source[i]
+                random.seed(seed)
+                packed_img, packed_mask, packed_name = packed[i]
+                assert name == packed_name and packed_mask.dtype == torch.int64
+                assert torch.equal(mask, packed_mask), (mode, i, seed)
+                # the bilinear resize of a box of the image rounds slightly differently
+                assert np.abs(packed_img.astype(int) - np.asarray(img, dtype=int)).max() <= 2, (mode, i, seed)
+    packed.mode = 'testval'
+    assert packed.image_size(1) == (80, 60)
@@ -0,0 +1,73 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from core.models.model_zoo import get_segmentation_model
+from core.models.segbase import SegPredictMixin
+
+
+def testPredict():
+    torch.manual_seed(0)
+    image = torch.randn(2, 3, 96, 96)
+    for name in ['psp', 'danet', 'enet']:
+        model = get_segmentation_model(name, dataset='citys', aux=True, pretrained=False, pretrained_base=False,
+                                       norm_layer=nn.BatchNorm2d).eval()
+        with torch.no_grad():
+            logits = model(image)[0]
+        calls = []
+        if hasattr(model, 'auxlayer'):
+            model.auxlayer.register_forward_hook(lambda *args: calls.append(args))
+        labels, confidence = model.predict(image, confidence=True)
+        # the auxiliary heads do not run
+        assert not calls, name
+        assert labels.dtype == torch.uint8 and labels.shape == (2, 96, 96), name
+        assert torch.equal(labels.long(), logits.argmax(1)), name
+        assert torch.allclose(confidence, logits.softmax(1).max(1)[0], atol=1e-6), name
+        # and the aux flags of the model are left unchanged
+        assert all(m.aux for m in model.modules() if hasattr(m, 'aux')), name
+
+
+def testPredictUpsampling():
+    torch.manual_seed(0)
+    image = torch.randn(1, 3, 100, 132)
+    for name in ['psp', 'icnet', 'bisenet']:
+        model = get_segmentation_model(name, dataset='citys', pretrained=False, pretrained_base=False,
+                                       norm_layer=nn.BatchNorm2d).eval()
+        labels, confidence = model.predict(image, confidence=True)
+        strips, strip_confidence = model.predict(image, confidence=True, upsample='strips', strip_rows=7)
+        assert torch.equal(labels, strips), name
+        assert torch.allclose(confidence, strip_confidence, atol=1e-5), name
+        approximate = model.predict(image, upsample='labels')
+        assert (approximate == labels).float().mean() > 0.95, name
+
+
+def testHeadResolutionLogits():
+    torch.manual_seed(0)
+    image = torch.randn(1, 3, 64, 64)
+    model = get_segmentation_model('psp', dataset='citys', pretrained=False, pretrained_base=False,
+                                   norm_layer=nn.BatchNorm2d).eval()
+    with torch.no_grad():
+        assert model(image, aux=False, upsample=False)[0].shape == (1, 19, 8, 8)
+        model.predict(image, upsample='strips')
+        # predict leaves the model's own forward unchanged
+        assert model(image)[0].shape == (1, 19, 64, 64)
+
+
+def testPredictIntermediateUpsampling():
+    class Refined(SegPredictMixin, nn.Module):
+        # upsamples to the input size, then computes further
+        def __init__(self):
+            super(Refined, self).__init__()
+            self.conv = nn.Conv2d(3, 4, 3, stride=4, padding=1)
+            self.refine = nn.Conv2d(4, 4, 3, padding=1)
+
+        def forward(self, x, aux=True):
+            x = F.interpolate(self.conv(x), x.shape[2:], mode='bilinear', align_corners=True)
+            return self.refine(x),
+
+    image = torch.randn(1, 3, 32, 32)
+    model = Refined().eval()
+    labels = model.predict(image)
+    assert labels.shape == (1, 32, 32)
+    # without upsamples_last, the model upsamples its own logits
+    assert torch.equal(model.predict(image, upsample='strips'), labels)
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import warnings
+import torch
+import torch.nn as nn
+
+from core.models.model_zoo import get_segmentation_model
+from core.utils.quantize import quantize_int8, save_quantized_model, load_quantized_model
+
+
+def _model(name):
+    return get_segmentation_model(name, dataset='citys', aux=False, pretrained=False, pretrained_base=False,
+                                  norm_layer=nn.BatchNorm2d).eval()
+
+
+def testQuantizeRoundTrip():
+    torch.manual_seed(0)
+    model = _model('psp')
+    images = [torch.randn(1, 3, 64, 64) for _ in range(2)]
+    quantized = quantize_int8(model, images)
+    assert quantized.float_stages == []
+    with torch.no_grad():
+        logits = model(images[0])[0]
+        int8_logits = quantized(images[0])[0]
+    assert int8_logits.shape == logits.shape and int8_logits.dtype == torch.float32
+    assert (int8_logits.argmax(1) == logits.argmax(1)).float().mean() > 0.5
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'psp_int8.pth')
+        save_quantized_model(quantized, path)
+        torch.backends.quantized.engine = 'qnnpack' if 'qnnpack' in torch.backends.quantized.supported_engines \
+            else quantized.quantized_engine
+        loaded = load_quantized_model(_model('psp'), path)
+    # the engine the weights were packed for is set again
+    assert torch.backends.quantized.engine == quantized.quantized_engine
+    with torch.no_grad():
+        assert torch.equal(loaded(images[0])[0], int8_logits)
+
+
+def testQuantizeUntraceableStage():
+    model = _model('encnet')
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        quantized = quantize_int8(model, [torch.randn(1, 3, 64, 64)])
+    assert quantized.float_stages == ['head']
+    assert any('head' in str(w.message) for w in caught)
+    with torch.no_grad():
+        assert quantized(torch.randn(1, 3, 64, 64))[0].shape == (1, 19, 64, 64)
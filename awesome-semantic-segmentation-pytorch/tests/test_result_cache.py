@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import numpy as np
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+project_path = os.path.dirname(os.path.split(cur_path)[0])
+sys.path.append(project_path)
+
+from result_cache import ResultCache, JobJournal
+
+
+def _pred(seed):
+    return np.random.RandomState(seed).randint(0, 19, (32, 32)).astype(np.uint8)
+
+
+def testHitMiss():
+    with tempfile.TemporaryDirectory() as root:
+        cache = ResultCache(root, 'psp|resnet50|citys|weights')
+        key = cache.key(b'image bytes')
+        assert cache.get(key) is None
+        cache.put(key, _pred(0))
+        assert np.array_equal(cache.get(key), _pred(0))
+        assert (cache.hits, cache.misses) == (1, 1)
+        # the same image segmented by another model is another entry
+        assert ResultCache(root, 'psp|resnet101|citys|weights').key(b'image bytes') != key
+        # a rewritten key is counted once, and a new cache counts the entries on disk
+        cache.put(key, _pred(1))
+        assert cache.size == ResultCache(root, 'psp|resnet50|citys|weights').size == os.path.getsize(cache.path(key))
+
+
+def testEviction():
+    with tempfile.TemporaryDirectory() as root:
+        cache = ResultCache(root, 'namespace', max_bytes=1 << 30)
+        keys = [cache.key(str(i).encode()) for i in range(4)]
+        for i, key in enumerate(keys):
+            cache.put(key, _pred(i))
+            os.utime(cache.path(key), (i, i))
+        # a hit makes the oldest entry the most recently used one
+        assert cache.get(keys[0]) is not None
+        entry = os.path.getsize(cache.path(keys[1]))
+        cache.max_bytes = cache.size + entry // 2
+        cache.put(cache.key(b'new'), _pred(4))
+        # the least recently used entries go until the cache is under 90% of its limit
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) is not None and cache.get(cache.key(b'new')) is not None
+        assert cache.size <= cache.max_bytes * 0.9
+        assert cache.size == sum(size for _, size, _ in cache.entries())
+
+
+def testJournalResume():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'journal')
+        journal = JobJournal(path)
+        journal.add('a.png')
+        journal.add('b.png')
+        journal.close()
+        # a line cut short by an interruption is not counted as done
+        with open(path, 'a') as f:
+            f.write('c.p')
+        journal = JobJournal(path)
+        assert 'a.png' in journal and 'b.png' in journal and 'c.p' not in journal
+        journal.add('c.png')
+        journal.close()
+        journal = JobJournal(path)
+        assert 'c.png' in journal
+        journal.close()
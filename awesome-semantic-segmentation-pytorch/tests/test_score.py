@@ -0,0 +1,13 @@
+import torch
+
+from core.utils.score import SegmentationMetric
+
+
+def testLabelMaps():
+    torch.manual_seed(0)
+    logits = torch.randn(2, 5, 16, 16)
+    target = torch.randint(-1, 5, (2, 16, 16))
+    from_logits, from_labels = SegmentationMetric(5), SegmentationMetric(5)
+    from_logits.update(logits, target)
+    from_labels.update(logits.argmax(1).byte(), target)
+    assert from_logits.get() == from_labels.get()
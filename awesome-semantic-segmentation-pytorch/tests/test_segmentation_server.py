@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import threading
+import numpy as np
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+project_path = os.path.dirname(os.path.split(cur_path)[0])
+sys.path.append(project_path)
+
+import segmentation_server
+from segmentation_server import DynamicBatcher, ModelPool, ServerStats
+
+
+class _Segmenter(object):
+    """Labels every pixel of an image with its first pixel's red value."""
+
+    def __init__(self, *args, **kwargs):
+        self.batches = []
+        self.dataset = 'citys'
+        time.sleep(0.1)
+
+    def segment_batch(self, images):
+        self.batches.append(len(images))
+        if any(image[0, 0, 0] == 255 for image in images):
+            raise RuntimeError('bad image')
+        return [np.full(image.shape[:2], image[0, 0, 0], np.uint8) for image in images]
+
+
+def _image(value):
+    return np.full((4, 4, 3), value, np.uint8)
+
+
+def testDynamicBatcher():
+    segmenter = _Segmenter()
+    stats = ServerStats()
+    batcher = DynamicBatcher(segmenter, stats, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(_image(i)) for i in range(5)]
+    assert [future.result(10)[0, 0] for future in futures] == list(range(5))
+    # a full batch goes at once, the rest after waiting for other requests
+    assert segmenter.batches == [4, 1]
+    report = stats.report(batcher.queue_depth())
+    assert report['requests'] == 5 and report['batch_sizes'] == {'1': 1, '4': 1}
+
+    # a failed batch fails its requests, and the batcher keeps serving
+    try:
+        batcher.submit(_image(255)).result(10)
+    except RuntimeError:
+        pass
+    else:
+        assert False
+    assert batcher.submit(_image(7)).result(10)[0, 0] == 7
+
+
+def testModelPool():
+    built = []
+
+    class Counting(_Segmenter):
+        def __init__(self, model, *args, **kwargs):
+            built.append(model)
+            if model == 'broken':
+                raise RuntimeError('no weights')
+            super(Counting, self).__init__()
+
+    segmenter = segmentation_server.Segmenter
+    segmentation_server.Segmenter = Counting
+    try:
+        pool = ModelPool(max_wait_ms=1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pool.get('psp', 'resnet50', 'citys')))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # concurrent requests for a cold model wait for a single build
+        assert built == ['psp'] and len(set(id(batcher) for batcher, _ in results)) == 1
+        assert pool.report()['models'] == ['psp:resnet50:citys']
+        # a failed build is raised, and tried again on the next request
+        for _ in range(2):
+            try:
+                pool.get('broken', 'resnet50', 'citys')
+            except RuntimeError:
+                continue
+            assert False
+        assert built == ['psp', 'broken', 'broken'] and pool.report()['models'] == ['psp:resnet50:citys']
+    finally:
+        segmentation_server.Segmenter = segmenter
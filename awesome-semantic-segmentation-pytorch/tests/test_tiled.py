@@ -0,0 +1,35 @@
+import torch
+import torch.nn as nn
+
+from core.utils.tiled import TiledModel, tile_starts
+
+
+class _Pixelwise(nn.Module):
+    # logits depending on each pixel only, so that any tiling reproduces them exactly
+    def __init__(self):
+        super(_Pixelwise, self).__init__()
+        self.conv = nn.Conv2d(3, 5, 1)
+
+    def forward(self, x):
+        return (self.conv(x),)
+
+
+def testTileStarts():
+    assert tile_starts(100, 128, 32) == [0]
+    assert tile_starts(100, 40, 10) == [0, 30, 60]
+    assert tile_starts(128, 64, 16) == [0, 48, 64]
+
+
+def testTiledModel():
+    torch.manual_seed(0)
+    model = _Pixelwise().eval()
+    image = torch.randn(2, 3, 70, 93)
+    with torch.no_grad():
+        expected = model(image)[0]
+    for window in ['constant', 'linear', 'hann']:
+        tiled = TiledModel(model, (32, 40), (8, 12), window, batch_size=3)
+        logits = tiled(image)[0]
+        assert torch.allclose(logits, expected, atol=1e-5), window
+        labels, confidence = tiled.predict(image, confidence=True)
+        assert labels.dtype == torch.uint8 and torch.equal(labels.long(), expected.argmax(1)), window
+        assert torch.allclose(confidence, expected.softmax(1).max(1)[0], atol=1e-5), window
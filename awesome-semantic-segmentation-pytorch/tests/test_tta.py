@@ -0,0 +1,28 @@
+import torch
+import torch.nn as nn
+
+from core.models.model_zoo import get_segmentation_model
+from core.utils.tta import MultiScaleModel
+
+
+def testMultiScaleModel():
+    torch.manual_seed(0)
+    model = get_segmentation_model('psp', dataset='citys', aux=False, pretrained=False, pretrained_base=False,
+                                   norm_layer=nn.BatchNorm2d).eval()
+    image = torch.randn(2, 3, 96, 120)
+    with torch.no_grad():
+        expected = model(image)[0]
+    # a single scale upsamples the logits like the model itself
+    assert torch.allclose(MultiScaleModel(model)(image)[0], expected, atol=1e-5)
+
+    # averaging an image with its flip equals averaging the logits of both
+    with torch.no_grad():
+        flipped = model(image.flip(3))[0].flip(3)
+    tta = MultiScaleModel(model, flip=True)
+    assert torch.allclose(tta(image)[0], (expected + flipped) / 2, atol=1e-5)
+
+    tta = MultiScaleModel(model, [0.5, 1.0, 1.5], flip=True)
+    logits = tta(image)[0]
+    assert logits.shape == expected.shape
+    assert tta.images == 2 and all(t > 0 for t in tta.times)
+    assert 'scale 1.50' in tta.report()
@@ -0,0 +1,105 @@
+import os
+import sys
+import tempfile
+import cv2
+import numpy as np
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+project_path = os.path.dirname(os.path.split(cur_path)[0])
+sys.path.append(project_path)
+
+from video_pipeline import segment_video, sample_frames, seek_frames, FrameGate
+
+
+def _write_video(path, frames=20, fps=10):
+    # frame i is filled with 12 * i, so that the index of a decoded frame can be read back
+    video = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (32, 24))
+    for i in range(frames):
+        video.write(np.full((24, 32, 3), 12 * i, np.uint8))
+    video.release()
+
+
+def _index(frame):
+    return int(round(frame.mean() / 12))
+
+
+class _Segmenter(object):
+    """Labels every pixel of a frame with the frame's index."""
+
+    dataset = 'citys'
+    batch_size = 3
+
+    def __init__(self):
+        self.batches = []
+
+    def segment_batch(self, frames):
+        self.batches.append([_index(frame) for frame in frames])
+        return [np.full(frame.shape[:2], _index(frame) % 19, np.uint8) for frame in frames]
+
+
+def testSegmentVideo():
+    with tempfile.TemporaryDirectory() as root:
+        vid_path = os.path.join(root, 'in.avi')
+        _write_video(vid_path)
+        segmenter = _Segmenter()
+        dest_path = os.path.join(root, 'out.avi')
+        assert segment_video(segmenter, vid_path, dest_path, 2) == 4
+        # the frames are batched in order
+        assert segmenter.batches == [[0, 5, 10], [15]]
+        video = cv2.VideoCapture(dest_path)
+        count = 0
+        while video.read()[0]:
+            count += 1
+        video.release()
+        assert count == 4
+
+
+def testSegmentVideoError():
+    class Failing(_Segmenter):
+        def segment_batch(self, frames):
+            raise RuntimeError('out of memory')
+
+    with tempfile.TemporaryDirectory() as root:
+        vid_path = os.path.join(root, 'in.avi')
+        _write_video(vid_path)
+        # a failing stage stops the others instead of leaving them blocked on the queues
+        try:
+            segment_video(Failing(), vid_path, os.path.join(root, 'out.avi'), 10, queue_size=2)
+        except RuntimeError as e:
+            assert 'out of memory' in str(e)
+        else:
+            assert False
+
+
+def testSampleFrames():
+    with tempfile.TemporaryDirectory() as root:
+        vid_path = os.path.join(root, 'in.avi')
+        _write_video(vid_path)
+        # the single decoding pass takes the same frames as seeking to every sampling time
+        frames = [_index(frame) for frame in sample_frames(vid_path, 0.5)]
+        assert frames == [_index(frame) for frame in seek_frames(vid_path, 0.5)] == [0, 5, 10, 15]
+        # sampling faster than the frame rate repeats frames instead of skipping times
+        frames = [_index(frame) for frame in sample_frames(vid_path, 0.05)]
+        assert frames == [i // 2 for i in range(40)]
+
+
+def testFrameGate():
+    rs = np.random.RandomState(0)
+    first, second = rs.randint(0, 256, (2, 48, 64, 3)).astype(np.uint8)
+    gate = FrameGate(threshold=0.98, max_staleness=2)
+    # near duplicates are skipped, at most max_staleness in a row
+    assert [gate.skip(frame) for frame in [first, first, first, first, second, second]] == \
+        [False, True, True, False, False, True]
+    assert (gate.frames, gate.skipped) == (6, 3)
+    gate.reset()
+    assert not gate.skip(second)
+
+    with tempfile.TemporaryDirectory() as root:
+        vid_path = os.path.join(root, 'in.avi')
+        _write_video(vid_path)
+        segmenter = _Segmenter()
+        # with a zero threshold every frame is a near duplicate, and only the staleness limit
+        # makes frames segmented again; the skipped frames still get a label map
+        gate = FrameGate(threshold=0.0, max_staleness=3)
+        assert segment_video(segmenter, vid_path, os.path.join(root, 'out.avi'), 10, gate=gate) == 20
+        assert sum(segmenter.batches, []) == [0, 4, 8, 12, 16]
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import threading
+import numpy as np
+
+from PIL import Image
+from core.utils.writer import MaskWriter
+
+
+def testMaskWriter():
+    pred = np.random.RandomState(0).randint(0, 19, (24, 32)).astype(np.uint8)
+    image = np.zeros((24, 32, 3), dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as root:
+        with MaskWriter('citys', workers=2) as writer:
+            for i in range(5):
+                writer.write(pred, os.path.join(root, '%d.png' % i), image, os.path.join(root, '%d_overlay.png' % i))
+            writer.flush()
+            assert writer.count == 5
+            assert all(os.path.exists(os.path.join(root, '%d_overlay.png' % i)) for i in range(5))
+        assert np.array_equal(np.array(Image.open(os.path.join(root, '0.png'))), pred)
+
+        # a failed write is raised by flush
+        writer = MaskWriter('citys')
+        writer.write(pred, os.path.join(root, 'missing', 'mask.png'))
+        try:
+            writer.flush()
+        except (IOError, OSError):
+            writer.pool.shutdown()
+        else:
+            assert False
+
+
+def testMaskWriterBackpressure():
+    pred = np.zeros((8, 8), dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as root:
+        writer = MaskWriter('citys', workers=1, max_pending=2)
+        # the single worker is busy until released
+        release = threading.Event()
+        writer.pool.submit(release.wait, 60)
+        writer.write(pred, os.path.join(root, '0.png'))
+        writer.write(pred, os.path.join(root, '1.png'))
+        third = threading.Thread(target=writer.write, args=(pred, os.path.join(root, '2.png')))
+        third.start()
+        third.join(0.2)
+        # the queue is full, the third write waits for a slot
+        assert third.is_alive()
+        release.set()
+        third.join(60)
+        writer.close()
+        assert writer.count == 3 and writer.wait_time > 0
+
+        # a write after close fails without holding a slot
+        for _ in range(2):
+            try:
+                writer.write(pred, os.path.join(root, '3.png'))
+            except RuntimeError:
+                continue
+            assert False
+        assert writer.slots.acquire(blocking=False) and writer.slots.acquire(blocking=False)
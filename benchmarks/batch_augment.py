@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.split(cur_path)[0], 'awesome-semantic-segmentation-pytorch'))
+
+def parse_args():
+	"""
+	Builds an argument parser for the size of the synthetic samples, the crop and the device
+	of the batched augmentation.
+
+	Returns
+	-------
+	ArgumentParser
+		The object containing all the specifications for the arguments
+	"""
+	parser = argparse.ArgumentParser(description='Compare the PIL training transform with the batched tensor augmentation.')
+	parser.add_argument('--width', type=int, default=2048, help='width of the images')
+	parser.add_argument('--height', type=int, default=1024, help='height of the images')
+	parser.add_argument('--batch', type=int, default=4, help='number of images augmented at once')
+	parser.add_argument('--base-size', type=int, default=1024, help='base size of the random scale')
+	parser.add_argument('--crop-size', type=int, default=768, help='size of the crops')
+	parser.add_argument('--repeats', type=int, default=3, help='number of timed batches')
+	parser.add_argument('--device', type=str, default='cpu', help='device the batched augmentation runs on')
+	return parser.parse_args()
+
+def main():
+	import torch
+	from PIL import Image
+	from core.data.dataloader.segbase import SegmentationDataset
+	from core.utils.augment import BatchAugmentation, normalize
+	from core.utils.distributed import uint8_batch_collate
+
+	args = parse_args()
+	rs = np.random.RandomState(0)
+	samples = [(rs.randint(0, 256, (args.height, args.width, 3)).astype(np.uint8),
+				rs.randint(0, 19, (args.height, args.width)).astype(np.uint8), str(i)) for i in range(args.batch)]
+	dataset = SegmentationDataset(None, 'train', 'train', None, base_size=args.base_size, crop_size=args.crop_size)
+	device = torch.device(args.device)
+	augment = BatchAugmentation(args.base_size, args.crop_size)
+	images, masks, _, sizes = uint8_batch_collate(samples)
+	images, masks = images.to(device), masks.to(device)
+
+	def pil_path():
+		for image, mask, _ in samples:
+			dataset._sync_transform(Image.fromarray(image), Image.fromarray(mask))
+
+	def batched():
+		normalize(augment(images, masks, sizes)[0])
+		if device.type == 'cuda':
+			torch.cuda.synchronize(device)
+
+	batched()
+	print('batch of {} {}x{} images, crops of {}'.format(args.batch, args.width, args.height, args.crop_size))
+	print('{:<26} {:>14}'.format('method', 'ms per sample'))
+	for name, function in [('PIL, per sample', pil_path), ('tensors ({})'.format(device.type), batched)]:
+		random.seed(0)
+		start = time.perf_counter()
+		for _ in range(args.repeats):
+			function()
+		print('{:<26} {:>14.1f}'.format(name, 1000 * (time.perf_counter() - start) / (args.repeats * args.batch)))
+
+if __name__ == '__main__':
+	main()
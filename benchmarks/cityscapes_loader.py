@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.split(cur_path)[0], 'awesome-semantic-segmentation-pytorch'))
+
+def parse_args():
+	"""
+	Builds an argument parser for the Cityscapes folder or the size of the synthetic masks.
+
+	Returns
+	-------
+	ArgumentParser
+		The object containing all the specifications for the arguments
+	"""
+	parser = argparse.ArgumentParser(description='Compare the per-sample time of loading Cityscapes training targets.')
+	parser.add_argument('--root', type=str, default=None,
+						help='Cityscapes folder whose val masks are loaded, synthetic masks by default')
+	parser.add_argument('--samples', type=int, default=20, help='number of masks loaded')
+	parser.add_argument('--width', type=int, default=2048, help='width of the synthetic masks')
+	parser.add_argument('--height', type=int, default=1024, help='height of the synthetic masks')
+	return parser.parse_args()
+
+def synthetic_masks(folder, samples, width, height):
+	"""
+	Writes gtFine_labelIds masks made of random blocks of the 34 Cityscapes labels, with their
+	converted gtFine_labelTrainIds masks.
+
+	Returns
+	-------
+	list
+		The paths to the gtFine_labelIds masks
+	"""
+	from core.data.dataloader.cityscapes import label_to_train_id, train_id_path
+
+	rs = np.random.RandomState(0)
+	paths = []
+	for i in range(samples):
+		blocks = rs.randint(0, 34, (height // 32, width // 32)).astype(np.uint8)
+		mask = np.kron(blocks, np.ones((32, 32), dtype=np.uint8))
+		path = os.path.join(folder, '{:04d}_gtFine_labelIds.png'.format(i))
+		Image.fromarray(mask).save(path)
+		Image.fromarray(label_to_train_id(mask)).save(train_id_path(path))
+		paths.append(path)
+	return paths
+
+def digitize_targets(path):
+	"""
+	The training target of a gtFine_labelIds mask computed like CitySegmentation did before
+	the lookup tables: np.unique, a membership assertion per value and np.digitize.
+	"""
+	import torch
+
+	key = np.array([-1, -1, -1, -1, -1, -1, -1, -1, 0, 1, -1, -1, 2, 3, 4, -1, -1, -1,
+					5, -1, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, -1, -1, 16, 17, 18])
+	mapping = np.array(range(-1, len(key) - 1)).astype('int32')
+	mask = np.array(Image.open(path)).astype('int32')
+	for value in np.unique(mask):
+		assert value in mapping
+	index = np.digitize(mask.ravel(), mapping, right=True)
+	return torch.LongTensor(key[index].reshape(mask.shape).astype('int32'))
+
+def main():
+	import torch
+	from core.data.dataloader.cityscapes import _TARGETS, label_to_train_id, train_id_path
+
+	args = parse_args()
+	folder = None
+	if args.root is None:
+		folder = tempfile.mkdtemp()
+		paths = synthetic_masks(folder, args.samples, args.width, args.height)
+	else:
+		paths = []
+		for root, _, files in os.walk(os.path.join(args.root, 'gtFine', 'val')):
+			paths += [os.path.join(root, name) for name in sorted(files) if name.endswith('_gtFine_labelIds.png')]
+		paths = paths[:args.samples]
+	try:
+		methods = [
+			('labelIds, unique + digitize', digitize_targets),
+			('labelIds, 256-entry LUT', lambda path: torch.from_numpy(
+				np.take(_TARGETS, label_to_train_id(Image.open(path))))),
+			('labelTrainIds', lambda path: torch.from_numpy(np.take(_TARGETS, np.asarray(Image.open(train_id_path(path)))))),
+		]
+		reference = [digitize_targets(path) for path in paths]
+		print('{} masks of {}'.format(len(paths), 'x'.join(map(str, reference[0].shape[::-1]))))
+		print('{:<30} {:>14} {:>10}'.format('method', 'ms per sample', 'speedup'))
+		baseline = None
+		for name, load in methods:
+			start = time.perf_counter()
+			targets = [load(path) for path in paths]
+			elapsed = (time.perf_counter() - start) / len(paths)
+			assert all(torch.equal(target, expected) for target, expected in zip(targets, reference)), name
+			baseline = baseline or elapsed
+			print('{:<30} {:>14.1f} {:>10.1f}'.format(name, 1000 * elapsed, baseline / elapsed))
+	finally:
+		if folder is not None:
+			shutil.rmtree(folder)
+
+if __name__ == '__main__':
+	main()
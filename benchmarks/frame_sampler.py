@@ -0,0 +1,87 @@
+from posixpath import join
+import os
+import sys
+import time
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.split(cur_path)[0])
+
+from video_pipeline import sample_frames, seek_frames
+
+def parse_args():
+	"""
+	Builds an argument parser for the size of the generated test video and the sampling
+	intervals to benchmark.
+
+	Returns
+	-------
+	ArgumentParser
+		The object containing all the specifications for the arguments
+	"""
+	parser = argparse.ArgumentParser(description='Compare the sequential-decode frame sampler with per-frame seeking.')
+	parser.add_argument('--seconds', type=int, default=20, help='length of the generated test video')
+	parser.add_argument('--fps', type=int, default=30, help='frame rate of the generated test video')
+	parser.add_argument('--width', type=int, default=1280, help='width of the generated test video')
+	parser.add_argument('--height', type=int, default=720, help='height of the generated test video')
+	parser.add_argument('--intervals', type=float, nargs='+', default=[0.05, 0.2, 1.0],
+						help='seconds between two sampled frames')
+	return parser.parse_args()
+
+def generate_video(path, seconds, fps, width, height):
+	"""
+	Writes a synthetic MPEG-4 video with a moving pattern so that the codec produces
+	inter-coded frames between keyframes, like a real dashcam clip.
+
+	Parameters
+	----------
+	path: str
+		The path where the video is written
+	seconds: int
+		The length of the video
+	fps: int
+		The frame rate of the video
+	width: int
+		The width of the video frames
+	height: int
+		The height of the video frames
+	"""
+	video = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+	background = np.random.RandomState(0).randint(0, 255, (height, width, 3), dtype=np.uint8)
+	for i in range(seconds * fps):
+		frame = np.roll(background, 8 * i, axis=1)
+		cv2.putText(frame, str(i), (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 0), 3)
+		video.write(frame)
+	video.release()
+
+def time_source(source, vid_path, interval):
+	"""
+	Times how long a frame source takes to produce every sampled frame of a video.
+
+	Returns
+	-------
+	tuple
+		The number of sampled frames and the elapsed seconds
+	"""
+	start = time.perf_counter()
+	count = sum(1 for _ in source(vid_path, interval))
+	return count, time.perf_counter() - start
+
+def main():
+	args = parse_args()
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		vid_path = join(tmp_dir, 'test.mp4')
+		generate_video(vid_path, args.seconds, args.fps, args.width, args.height)
+		print('Generated {}s {}x{} test video at {} fps'.format(args.seconds, args.width, args.height, args.fps))
+		print('{:>10} {:>8} {:>10} {:>12} {:>8}'.format('interval', 'frames', 'seek (s)', 'sequential (s)', 'speedup'))
+		for interval in args.intervals:
+			seek_count, seek_time = time_source(seek_frames, vid_path, interval)
+			count, sequential_time = time_source(sample_frames, vid_path, interval)
+			print('{:>10} {:>8} {:>10.3f} {:>14.3f} {:>7.1f}x'.format(
+				interval, '{}/{}'.format(count, seek_count), seek_time, sequential_time, seek_time / sequential_time))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.split(cur_path)[0])
+sys.path.append(os.path.join(os.path.split(cur_path)[0], 'awesome-semantic-segmentation-pytorch'))
+
+from video_pipeline import sample_frames
+
+def parse_args():
+	"""
+	Builds an argument parser for the model, the test clip and the keyframe settings to
+	benchmark.
+
+	Returns
+	-------
+	ArgumentParser
+		The object containing all the specifications for the arguments
+	"""
+	parser = argparse.ArgumentParser(description='Compare keyframe feature reuse with per-frame inference on a video clip.')
+	parser.add_argument('--model', type=str, default='psp', help='model to run')
+	parser.add_argument('--backbone', type=str, default='resnet50', help='backbone of the model')
+	parser.add_argument('--dataset', type=str, default='citys', help='dataset the model was trained on')
+	parser.add_argument('--random-weights', action='store_true', help='run the model with random weights instead of the pretrained ones')
+	parser.add_argument('--vid', type=str, default=None,
+						help='local clip to segment, a synthetic pan over the test image by default')
+	parser.add_argument('--interval', type=float, default=0.1, help='seconds between two frames taken from the clip')
+	parser.add_argument('--frames', type=int, default=24, help='maximum number of frames segmented')
+	parser.add_argument('--width', type=int, default=512, help='width the frames are resized to')
+	parser.add_argument('--height', type=int, default=256, help='height the frames are resized to')
+	parser.add_argument('--batch-size', type=int, default=4, help='number of frames passed through the model at once')
+	parser.add_argument('--keyframe-intervals', type=int, nargs='+', default=[2, 5, 10],
+						help='frames between two keyframes to compare')
+	parser.add_argument('--modes', type=str, nargs='+', default=['fixed', 'feature', 'pixel'],
+						help='keyframe modes to compare')
+	parser.add_argument('--threshold', type=float, default=0.2, help='relative change starting a new keyframe in adaptive modes')
+	parser.add_argument('--device', type=str, default='cpu', help='device the model runs on')
+	return parser.parse_args()
+
+def synthetic_clip(num_frames, width, height):
+	"""
+	Pans and slowly zooms over the test image of the library, like a camera moving over a
+	static scene, with a cut to the mirrored image halfway so that adaptive keyframes have a
+	scene change to detect.
+
+	Parameters
+	----------
+	num_frames: int
+		The number of frames of the clip
+	width: int
+		The width of the frames
+	height: int
+		The height of the frames
+
+	Returns
+	-------
+	list
+		The RGB frames as uint8 arrays
+	"""
+	image = Image.open(os.path.join(os.path.split(cur_path)[0], 'awesome-semantic-segmentation-pytorch',
+									'tests', 'test_img.jpg')).convert('RGB')
+	frames = []
+	for i in range(num_frames):
+		source = image if i < num_frames // 2 else image.transpose(Image.FLIP_LEFT_RIGHT)
+		zoom = 0.8 - 0.1 * i / max(num_frames - 1, 1)
+		crop_w, crop_h = int(source.width * zoom), int(source.height * zoom)
+		left = int((source.width - crop_w) * i / max(num_frames - 1, 1))
+		top = (source.height - crop_h) // 2
+		crop = source.crop((left, top, left + crop_w, top + crop_h))
+		frames.append(np.array(crop.resize((width, height), Image.BILINEAR)))
+	return frames
+
+def load_clip(args):
+	"""
+	Reads the frames of the clip given with --vid, or builds the synthetic clip.
+
+	Parameters
+	----------
+	args: argparse.Namespace
+		The benchmark arguments
+
+	Returns
+	-------
+	list
+		The RGB frames as uint8 arrays
+	"""
+	if args.vid is None:
+		return synthetic_clip(args.frames, args.width, args.height)
+	frames = []
+	for frame in sample_frames(args.vid, args.interval):
+		rgb = Image.fromarray(frame[:, :, ::-1]).resize((args.width, args.height), Image.BILINEAR)
+		frames.append(np.array(rgb))
+		if len(frames) == args.frames:
+			break
+	return frames
+
+def segment_clip(predict, batch):
+	"""
+	Segments the frames in order, batch_size frames at a time.
+
+	Parameters
+	----------
+	predict: callable
+		Returns the label maps of a batch of consecutive frames
+	batch: Frames
+		The frames of the clip
+
+	Returns
+	-------
+	tuple
+		The label maps of the frames, and the elapsed seconds
+	"""
+	import torch
+
+	labels = []
+	start = time.perf_counter()
+	for i in range(0, len(batch), batch.batch_size):
+		labels.append(predict(batch[i:i + batch.batch_size]).cpu().numpy())
+	if batch.device.type == 'cuda':
+		torch.cuda.synchronize(batch.device)
+	return np.concatenate(labels), time.perf_counter() - start
+
+class Frames(object):
+	"""
+	The normalized frames of the clip on the device, sliced into consecutive batches.
+	"""
+	def __init__(self, frames, batch_size, device):
+		import torch
+		from torchvision import transforms
+
+		transform = transforms.Compose([
+			transforms.ToTensor(),
+			transforms.Normalize([.485, .456, .406], [.229, .224, .225]),
+		])
+		self.images = torch.stack([transform(frame) for frame in frames]).to(device)
+		self.batch_size = batch_size
+		self.device = device
+
+	def __len__(self):
+		return self.images.size(0)
+
+	def __getitem__(self, index):
+		return self.images[index]
+
+def mean_iou_drift(labels, reference, num_class):
+	"""
+	The mean IoU of the labels taking the per-frame labels as ground truth, over the classes
+	present in either.
+	"""
+	from core.utils.score import hist_info, compute_score
+
+	hist, labeled, correct = hist_info(labels.astype(np.int64), reference.astype(np.int64), num_class)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		return compute_score(hist, correct, labeled)[1], correct / labeled
+
+def main():
+	import torch
+	import torch.nn as nn
+	from core.models.model_zoo import get_segmentation_model
+	from core.utils.keyframe import KeyframeModel
+
+	args = parse_args()
+	device = torch.device(args.device)
+	model = get_segmentation_model(model=args.model, dataset=args.dataset, backbone=args.backbone, aux=False,
+								   pretrained=not args.random_weights, pretrained_base=False,
+								   norm_layer=nn.BatchNorm2d).to(device).eval()
+	frames = Frames(load_clip(args), args.batch_size, device)
+	print('{} {} on {} frames of {}x{}, batch size {}'.format(args.model, args.backbone, len(frames),
+															  args.width, args.height, args.batch_size))
+	# warm up, so that the first configuration does not pay for the allocator
+	model.predict(frames[:1])
+	reference, reference_time = segment_clip(model.predict, frames)
+	print('{:>8} {:>9} {:>10} {:>10} {:>8} {:>9} {:>9}'.format(
+		'mode', 'interval', 'keyframes', 'time (s)', 'speedup', 'mIoU', 'pixAcc'))
+	print('{:>8} {:>9} {:>10} {:>10.2f} {:>8.2f} {:>9.4f} {:>9.4f}'.format(
+		'frame', 1, len(frames), reference_time, 1.0, 1.0, 1.0))
+	for mode in args.modes:
+		for interval in args.keyframe_intervals:
+			keyframes = KeyframeModel(model, interval, mode, args.threshold)
+			labels, elapsed = segment_clip(keyframes.predict, frames)
+			mIoU, pixAcc = mean_iou_drift(labels, reference, model.nclass)
+			print('{:>8} {:>9} {:>10} {:>10.2f} {:>8.2f} {:>9.4f} {:>9.4f}'.format(
+				mode, interval, keyframes.keyframes, elapsed, reference_time / elapsed, mIoU, pixAcc))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.split(cur_path)[0], 'awesome-semantic-segmentation-pytorch'))
+
+def parse_args():
+	"""
+	Builds an argument parser for the Cityscapes folder or the size of the synthetic images,
+	and the crop of the training samples.
+
+	Returns
+	-------
+	ArgumentParser
+		The object containing all the specifications for the arguments
+	"""
+	parser = argparse.ArgumentParser(description='Compare the sample throughput of the PNG and the packed Cityscapes datasets.')
+	parser.add_argument('--root', type=str, default=None,
+						help='Cityscapes folder whose val split is packed, synthetic images by default')
+	parser.add_argument('--samples', type=int, default=12, help='number of images of the split')
+	parser.add_argument('--width', type=int, default=2048, help='width of the synthetic images')
+	parser.add_argument('--height', type=int, default=1024, help='height of the synthetic images')
+	parser.add_argument('--base-size', type=int, default=1024, help='base size of the random scale')
+	parser.add_argument('--crop-size', type=int, default=768, help='size of the training crops')
+	parser.add_argument('--epochs', type=int, default=2, help='number of passes over the split in each mode')
+	return parser.parse_args()
+
+def synthetic_split(root, samples, width, height):
+	"""
+	Writes a Cityscapes val split of smooth random images and masks made of blocks of the 34
+	Cityscapes labels.
+	"""
+	rs = np.random.RandomState(0)
+	images = os.path.join(root, 'leftImg8bit', 'val', 'city')
+	masks = os.path.join(root, 'gtFine', 'val', 'city')
+	os.makedirs(images)
+	os.makedirs(masks)
+	for i in range(samples):
+		coarse = Image.fromarray(rs.randint(0, 256, (height // 16, width // 16, 3)).astype(np.uint8))
+		coarse.resize((width, height), Image.BILINEAR).save(os.path.join(images, 'city_{:06d}_leftImg8bit.png'.format(i)))
+		blocks = rs.randint(0, 34, (height // 32, width // 32)).astype(np.uint8)
+		mask = Image.fromarray(np.kron(blocks, np.ones((32, 32), dtype=np.uint8)))
+		mask.save(os.path.join(masks, 'city_{:06d}_gtFine_labelIds.png'.format(i)))
+
+def folder_size(folder):
+	"""
+	Size in MB of the files under a folder.
+	"""
+	return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(folder) for name in files) / 2 ** 20
+
+def main():
+	from core.data.dataloader import get_segmentation_dataset
+	from core.data.dataloader.packed import pack_dataset
+
+	args = parse_args()
+	folder = tempfile.mkdtemp()
+	root = args.root
+	try:
+		if root is None:
+			root = os.path.join(folder, 'citys')
+			synthetic_split(root, args.samples, args.width, args.height)
+		packed = os.path.join(folder, 'packed')
+		start = time.perf_counter()
+		pack_dataset('citys', packed, split='val', root=root, manifest=False)
+		print('packed in {:.1f}s, {:.0f} MB of PNG files, {:.0f} MB of shards'.format(
+			time.perf_counter() - start, folder_size(os.path.join(root, 'leftImg8bit', 'val')) +
+			folder_size(os.path.join(root, 'gtFine', 'val')), folder_size(packed)))
+		kwargs = {'split': 'val', 'base_size': args.base_size, 'crop_size': args.crop_size}
+		datasets = [('PNG', get_segmentation_dataset('citys', root=root, manifest=False, **kwargs)),
+					('packed', get_segmentation_dataset('packed', root=packed, **kwargs))]
+		print('{:<8} {:<8} {:>14} {:>10} {:>10}'.format('mode', 'dataset', 'ms per sample', 'samples/s', 'speedup'))
+		for mode in ['train', 'val', 'testval']:
+			baseline = None
+			for name, dataset in datasets:
+				dataset.mode = mode
+				dataset[0]
+				random.seed(0)
+				start = time.perf_counter()
+				for _ in range(args.epochs):
+					for i in random.sample(range(len(dataset)), len(dataset)):
+						dataset[i]
+				elapsed = (time.perf_counter() - start) / (args.epochs * len(dataset))
+				baseline = baseline or elapsed
+				print('{:<8} {:<8} {:>14.1f} {:>10.1f} {:>10.1f}'.format(mode, name, 1000 * elapsed, 1 / elapsed,
+																	   baseline / elapsed))
+	finally:
+		shutil.rmtree(folder)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.split(cur_path)[0], 'awesome-semantic-segmentation-pytorch'))
+
+def parse_args():
+	"""
+	Builds an argument parser for the size and number of the synthetic label maps and the
+	number of classes.
+
+	Returns
+	-------
+	ArgumentParser
+		The object containing all the specifications for the arguments
+	"""
+	parser = argparse.ArgumentParser(description='Compare the lookup table compositing with the per-class and PIL palette functions.')
+	parser.add_argument('--width', type=int, default=2048, help='width of the label maps')
+	parser.add_argument('--height', type=int, default=1024, help='height of the label maps')
+	parser.add_argument('--batch', type=int, default=4, help='number of label maps composited at once')
+	parser.add_argument('--dataset', type=str, default='ade20k', help='dataset whose palette is used')
+	parser.add_argument('--classes', type=int, default=150, help='number of classes of the label maps')
+	parser.add_argument('--repeats', type=int, default=3, help='number of timed runs, the fastest being reported')
+	parser.add_argument('--device', type=str, default='cpu', help='device the torch lookups run on')
+	return parser.parse_args()
+
+def best_time(function, repeats, device=None):
+	"""
+	Runs a function several times and returns the fastest run in seconds.
+
+	Parameters
+	----------
+	function: callable
+		The function to time, taking no arguments
+	repeats: int
+		The number of timed runs
+	device: torch.device, optional
+		The device to synchronize before stopping the clock
+	"""
+	import torch
+
+	times = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		function()
+		if device is not None and device.type == 'cuda':
+			torch.cuda.synchronize(device)
+		times.append(time.perf_counter() - start)
+	return min(times)
+
+def main():
+	import torch
+	from PIL import Image
+	from core.utils.composite import get_palette
+	from core.utils.visualize import get_color_pallete, set_img_color
+
+	args = parse_args()
+	rs = np.random.RandomState(0)
+	labels = rs.randint(0, args.classes, (args.batch, args.height, args.width)).astype(np.uint8)
+	images = rs.randint(0, 256, (args.batch, args.height, args.width, 3)).astype(np.uint8)
+	palette = get_palette(args.dataset)
+	colors = palette.colorize(np.arange(args.classes))
+	device = torch.device(args.device)
+	labels_t = torch.from_numpy(labels).to(device)
+	images_t = torch.from_numpy(images).to(device)
+	palette.overlay(images_t[:1], labels_t[:1])
+
+	def per_class_loop():
+		# set_img_color before it used lookup tables, one scan of the image per class
+		for image, label in zip(images, labels):
+			img = image.copy()
+			for i in range(len(colors)):
+				if i != 0:
+					img[np.where(label == i)] = colors[i]
+
+	def pil_overlay():
+		# the writer's overlay before it used lookup tables
+		for image, label in zip(images, labels):
+			color = np.array(get_color_pallete(label, args.dataset).convert('RGB'), dtype=np.float32)
+			(np.asarray(image, dtype=np.float32) * 0.5 + color * 0.5).astype('uint8')
+
+	def pil_palette():
+		for label in labels:
+			np.array(get_color_pallete(label, args.dataset).convert('RGB'))
+
+	cases = [
+		('colorize', 'PIL palette convert', pil_palette),
+		('colorize', 'numpy LUT', lambda: palette.colorize(labels)),
+		('colorize', 'torch LUT ({})'.format(device.type), lambda: palette.colorize(labels_t)),
+		('set_img_color', 'per-class loop', per_class_loop),
+		('set_img_color', 'lookup tables', lambda: [set_img_color(image.copy(), label, colors)
+													for image, label in zip(images, labels)]),
+		('overlay', 'PIL palette + blend', pil_overlay),
+		('overlay', 'numpy LUT', lambda: palette.overlay(images, labels)),
+		('overlay', 'torch LUT ({})'.format(device.type), lambda: palette.overlay(images_t, labels_t)),
+	]
+	print('{} batch of {} {}x{} label maps with {} classes'.format(args.dataset, args.batch, args.width,
+																  args.height, args.classes))
+	print('{:<14} {:<22} {:>12} {:>10}'.format('operation', 'method', 'ms per map', 'MPix/s'))
+	for operation, method, function in cases:
+		elapsed = best_time(function, args.repeats, device)
+		print('{:<14} {:<22} {:>12.1f} {:>10.1f}'.format(operation, method, 1000 * elapsed / args.batch,
+														 args.batch * args.width * args.height / elapsed / 1e6))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import argparse
+import resource
+import multiprocessing as mp
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.split(cur_path)[0], 'awesome-semantic-segmentation-pytorch'))
+
+def parse_args():
+	"""
+	Builds an argument parser for the model, the size of the synthetic images and the tile
+	sizes to benchmark.
+
+	Returns
+	-------
+	ArgumentParser
+		The object containing all the specifications for the arguments
+	"""
+	parser = argparse.ArgumentParser(description='Compare the throughput and peak memory of tiled inference for several tile sizes.')
+	parser.add_argument('--model', type=str, default='psp', help='model to run, with random weights')
+	parser.add_argument('--backbone', type=str, default='resnet50', help='backbone of the model')
+	parser.add_argument('--width', type=int, default=2048, help='width of the images')
+	parser.add_argument('--height', type=int, default=1024, help='height of the images')
+	parser.add_argument('--images', type=int, default=2, help='number of images segmented per tile size')
+	parser.add_argument('--tile-sizes', type=int, nargs='+', default=[256, 384, 512, 768],
+						help='tile sizes to compare, 0 being whole images')
+	parser.add_argument('--overlap', type=int, default=128, help='minimum overlap of two neighbouring tiles')
+	parser.add_argument('--window', type=str, default='hann', help='blending window of the tiles')
+	parser.add_argument('--tile-batch-size', type=int, default=4, help='number of tiles passed through the model at once')
+	parser.add_argument('--device', type=str, default='cpu', help='device the model runs on')
+	return parser.parse_args()
+
+def run_tile_size(args, tile_size, results):
+	"""
+	Segments the images with one tile size, in a fresh process so that the peak memory of
+	other tile sizes does not hide its own.
+
+	Parameters
+	----------
+	args: argparse.Namespace
+		The benchmark arguments
+	tile_size: int
+		The tile size, 0 for whole images
+	results: multiprocessing.Queue
+		Receives the number of tiles, the elapsed seconds and the peak memory above the model
+		and the images, in bytes
+	"""
+	import torch
+	import torch.nn as nn
+	from core.models.model_zoo import get_segmentation_model
+	from core.utils.tiled import TiledModel
+
+	device = torch.device(args.device)
+	model = get_segmentation_model(model=args.model, dataset='citys', backbone=args.backbone, aux=False,
+								   pretrained=False, pretrained_base=False, norm_layer=nn.BatchNorm2d).to(device).eval()
+	tiled = TiledModel(model, tile_size, args.overlap, args.window, args.tile_batch_size) if tile_size else None
+	image = torch.randn(1, 3, args.height, args.width, device=device)
+	if device.type == 'cuda':
+		torch.cuda.reset_peak_memory_stats(device)
+		baseline = torch.cuda.memory_allocated(device)
+	else:
+		baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+	start = time.perf_counter()
+	for _ in range(args.images):
+		if tiled is not None:
+			tiled.predict(image)
+		else:
+			model.predict(image)
+	if device.type == 'cuda':
+		torch.cuda.synchronize(device)
+		peak = torch.cuda.max_memory_allocated(device)
+	else:
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+	tiles = tiled.tiles if tiled is not None else args.images
+	results.put((tiles, time.perf_counter() - start, peak - baseline))
+
+def main():
+	args = parse_args()
+	print('{} {} on {} {}x{} images, overlap {}, {} window'.format(
+		args.model, args.backbone, args.images, args.width, args.height, args.overlap, args.window))
+	print('{:>6} {:>8} {:>10} {:>8} {:>10} {:>12}'.format('tile', 'tiles', 'time (s)', 'img/s', 'MPix/s', 'peak (MB)'))
+	context = mp.get_context('spawn')
+	for tile_size in args.tile_sizes:
+		results = context.Queue()
+		process = context.Process(target=run_tile_size, args=(args, tile_size, results))
+		process.start()
+		tiles, elapsed, peak = results.get()
+		process.join()
+		print('{:>6} {:>8} {:>10.2f} {:>8.2f} {:>10.2f} {:>12.1f}'.format(
+			tile_size or 'whole', tiles, elapsed, args.images / elapsed,
+			args.images * args.width * args.height / elapsed / 1e6, peak / 2 ** 20))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.split(cur_path)[0], 'awesome-semantic-segmentation-pytorch'))
+
+def parse_args():
+	"""
+	Builds an argument parser for the size of the synthetic samples, the batches and the device
+	they are sent to.
+
+	Returns
+	-------
+	ArgumentParser
+		The object containing all the specifications for the arguments
+	"""
+	parser = argparse.ArgumentParser(description='Compare loading float batches with loading uint8 batches normalized on the device.')
+	parser.add_argument('--size', type=int, default=768, help='height and width of the samples')
+	parser.add_argument('--batch', type=int, default=8, help='number of samples per batch')
+	parser.add_argument('--batches', type=int, default=10, help='number of timed batches')
+	parser.add_argument('--workers', type=int, default=2, help='dataloader workers')
+	parser.add_argument('--device', type=str, default='cpu', help='device the batches are sent to')
+	return parser.parse_args()
+
+class CropDataset(object):
+	"""
+	Returns the same random training crop for every index, like a dataset in train mode.
+	"""
+	def __init__(self, size, length, transform=None):
+		import torch
+
+		rs = np.random.RandomState(0)
+		self.image = rs.randint(0, 256, (size, size, 3)).astype(np.uint8)
+		self.mask = torch.from_numpy(rs.randint(-1, 19, (size, size)))
+		self.length = length
+		self.transform = transform
+
+	def __getitem__(self, index):
+		image = self.image if self.transform is None else self.transform(self.image)
+		return image, self.mask, str(index)
+
+	def __len__(self):
+		return self.length
+
+def main():
+	import torch
+	import torch.utils.data as data
+	from torchvision import transforms
+	from core.utils.augment import normalize
+	from core.utils.distributed import uint8_batch_collate
+
+	args = parse_args()
+	device = torch.device(args.device)
+	input_transform = transforms.Compose([
+		transforms.ToTensor(),
+		transforms.Normalize([.485, .456, .406], [.229, .224, .225]),
+	])
+	length = args.batch * (args.batches + 1)
+	methods = [
+		('float32 + int64', CropDataset(args.size, length, input_transform), None, False),
+		('uint8 + int16', CropDataset(args.size, length), uint8_batch_collate, True),
+	]
+	print('{} batches of {} {}x{} samples, {} workers, sent to {}'.format(args.batches, args.batch, args.size, args.size,
+																		 args.workers, device.type))
+	print('{:<18} {:>14} {:>14}'.format('batch', 'MB per batch', 'ms per batch'))
+	for name, dataset, collate, uint8 in methods:
+		loader = data.DataLoader(dataset, batch_size=args.batch, num_workers=args.workers, collate_fn=collate,
+								 pin_memory=device.type == 'cuda')
+		nbytes, start = 0, None
+		for i, batch in enumerate(loader):
+			if i == 1:
+				# the first batch waits for the workers to start
+				start = time.perf_counter()
+			images = batch[0].to(device, non_blocking=True)
+			targets = batch[1].to(device, non_blocking=True)
+			nbytes = images.numel() * images.element_size() + targets.numel() * targets.element_size()
+			if uint8:
+				images, targets = normalize(images), targets.long()
+			if device.type == 'cuda':
+				torch.cuda.synchronize(device)
+		print('{:<18} {:>14.1f} {:>14.1f}'.format(name, nbytes / 2 ** 20,
+												 1000 * (time.perf_counter() - start) / args.batches))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import argparse
+import resource
+import multiprocessing as mp
+
+cur_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.split(cur_path)[0], 'awesome-semantic-segmentation-pytorch'))
+
+MODES = ['logits', 'strips', 'labels']
+
+def parse_args():
+	"""
+	Builds an argument parser for the size of the synthetic logits and the upsampling modes
+	to benchmark.
+
+	Returns
+	-------
+	ArgumentParser
+		The object containing all the specifications for the arguments
+	"""
+	parser = argparse.ArgumentParser(description='Compare the peak memory and time of upsampling logits before the argmax.')
+	parser.add_argument('--width', type=int, default=2048, help='width of the images')
+	parser.add_argument('--height', type=int, default=1024, help='height of the images')
+	parser.add_argument('--classes', type=int, default=150, help='number of classes (150 for ADE20K, 19 for Cityscapes)')
+	parser.add_argument('--stride', type=int, default=8, help='output stride of the segmentation head')
+	parser.add_argument('--batch-size', type=int, default=1, help='number of images per batch')
+	parser.add_argument('--strip-rows', type=int, default=64, help='rows per strip of the strips mode')
+	parser.add_argument('--device', type=str, default='cpu', help='device the logits are on')
+	parser.add_argument('--modes', type=str, nargs='+', default=MODES, choices=MODES, help='modes to benchmark')
+	return parser.parse_args()
+
+def peak_bytes(device):
+	"""
+	Returns the high-water mark of the memory used by the process, allocated tensors on CUDA
+	and the resident set size on the CPU.
+	"""
+	import torch
+
+	if device.type == 'cuda':
+		return torch.cuda.max_memory_allocated(device)
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def run_mode(args, mode, results):
+	"""
+	Upsamples synthetic logits to labels with one mode, in a fresh process so that the peak
+	memory of other modes does not hide its own.
+
+	Parameters
+	----------
+	args: argparse.Namespace
+		The benchmark arguments
+	mode: str
+		'logits' for the full upsampling, 'strips' or 'labels'
+	results: multiprocessing.Queue
+		Receives the elapsed seconds and the peak memory above the logits, in bytes
+	"""
+	import torch
+	import torch.nn.functional as F
+	from core.utils.upsample_argmax import strip_argmax, label_upsampling_argmax
+
+	device = torch.device(args.device)
+	size = (args.height, args.width)
+	low = (args.height // args.stride, args.width // args.stride)
+	# smooth logits, made of regions several feature pixels wide like a real head's
+	torch.manual_seed(0)
+	coarse = torch.randn(args.batch_size, args.classes, low[0] // 8 + 1, low[1] // 8 + 1)
+	logits = F.interpolate(coarse, low, mode='bilinear', align_corners=True).to(device)
+	if device.type == 'cuda':
+		torch.cuda.synchronize(device)
+		torch.cuda.reset_peak_memory_stats(device)
+	baseline = peak_bytes(device)
+	start = time.perf_counter()
+	with torch.no_grad():
+		if mode == 'logits':
+			labels = F.interpolate(logits, size, mode='bilinear', align_corners=True).argmax(1).byte()
+		elif mode == 'strips':
+			labels = strip_argmax(logits, size, args.strip_rows)
+		else:
+			labels = label_upsampling_argmax(logits, size)
+	if device.type == 'cuda':
+		torch.cuda.synchronize(device)
+	elapsed = time.perf_counter() - start
+	peak = peak_bytes(device) - baseline
+	reference = F.interpolate(logits, size, mode='bilinear', align_corners=True).argmax(1).byte()
+	agreement = (labels == reference).float().mean().item()
+	results.put((elapsed, peak, agreement))
+
+def main():
+	args = parse_args()
+	print('{} x {} images, {} classes at stride {}, batch size {}'.format(
+		args.width, args.height, args.classes, args.stride, args.batch_size))
+	print('{:>8} {:>10} {:>14} {:>10}'.format('mode', 'time (s)', 'peak (MB)', 'agreement'))
+	context = mp.get_context('spawn')
+	for mode in args.modes:
+		results = context.Queue()
+		process = context.Process(target=run_mode, args=(args, mode, results))
+		process.start()
+		elapsed, peak, agreement = results.get()
+		process.join()
+		print('{:>8} {:>10.3f} {:>14.1f} {:>9.2f}%'.format(mode, elapsed, peak / 2 ** 20, agreement * 100))
+
+if __name__ == '__main__':
+	main()
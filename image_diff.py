@@ -1,16 +1,23 @@
 from posixpath import join
 from skimage.metrics import structural_similarity as compare_ssim
 import argparse
+import csv
+import time
+import multiprocessing
+import sys
 import imutils
 import cv2
 import os
-from semantic_segmentation import get_file_name
+import numpy as np
+from PIL import Image
+from semantic_segmentation import get_file_name, IMG_EXTENSIONS
 
 def parse_args():
 	"""
 	Builds an argument parser that creates 2 flags. The first flag takes
 	in the path to the first image for comparison and the second flag takes
-	in the path to the second image for comparison.
+	in the path to the second image for comparison. When both paths are
+	directories, the images with the same file name in both are compared.
 
 	Returns
 	-------
@@ -18,8 +25,18 @@ def parse_args():
 		The object containing all the specifications for the arguments
 	"""
 	parser = argparse.ArgumentParser()
-	parser.add_argument("-f", "--first", required=True, help="first input image")
-	parser.add_argument("-s", "--second", required=True, help="second input image")
+	parser.add_argument("-f", "--first", required=True, help="first input image or directory of images")
+	parser.add_argument("-s", "--second", required=True, help="second input image or directory of images")
+	parser.add_argument("--workers", help="Use this flag to specify how many processes compare the images of two directories, with the default being one per CPU core",
+						default=None)
+	parser.add_argument("--save-images", help="Use this flag to also save the differential and threshold images of every pair of images of two directories",
+						action='store_true')
+	parser.add_argument("--labels", help="Use this flag to compare the classes of two label maps, such as the -seg.png outputs of two models, instead of their SSIM",
+						action='store_true')
+	parser.add_argument("--min-area", help="Use this flag to specify the smallest changed region in pixels listed with --labels",
+						default=1)
+	parser.add_argument("--max-changed", help="Use this flag with --labels to exit with an error when a label map has more than this fraction of its pixels changed",
+						default=None)
 	return parser.parse_args()
 
 def create_diff_image(pathA, pathB):
@@ -59,6 +76,381 @@ def create_diff_image(pathA, pathB):
 	dest_path = join('./diffs/', nameA + "-" + nameB)
 	write_images(diff, thresh, dest_path)
 
+def compare_pair(pathA, pathB, dest_path=None):
+	"""
+	Takes in the path to the first and second image and compares them like
+	create_diff_image, without printing anything. The differential and threshold
+	images are only saved when a destination path is given.
+
+	Parameters
+	----------
+	pathA: str
+		The path to the first image to compare
+	pathB: str
+		The path to the second image to compare
+	dest_path: str, optional
+		The path to the directory in which the differential and threshold images will be
+		saved, with the default being not to save them
+
+	Returns
+	-------
+	tuple
+		The SSIM of the two images and the number of contours of their differences
+	"""
+	grayA = cv2.imread(pathA, cv2.IMREAD_GRAYSCALE)
+	grayB = cv2.imread(pathB, cv2.IMREAD_GRAYSCALE)
+	if grayA is None or grayB is None:
+		raise ValueError('cannot read {}'.format(pathA if grayA is None else pathB))
+	if grayA.shape != grayB.shape:
+		raise ValueError('the images have different sizes, {} and {}'.format(grayA.shape, grayB.shape))
+
+	(score, diff) = compare_ssim(grayA, grayB, full=True)
+	diff = (diff * 255).astype("uint8")
+	thresh = cv2.threshold(diff, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+	cnts = get_contours(thresh.copy())
+	if dest_path is not None:
+		write_images(diff, thresh, dest_path)
+	return score, len(cnts)
+
+def pair_files(dirA, dirB):
+	"""
+	Pairs the images of two directories by file name.
+
+	Parameters
+	----------
+	dirA: str
+		The path to the first directory of images
+	dirB: str
+		The path to the second directory of images
+
+	Returns
+	-------
+	tuple
+		The sorted file names found in both directories, and the numbers of images found only
+		in the first and only in the second directory
+	"""
+	namesA = set(name for name in os.listdir(dirA) if name.lower().endswith(IMG_EXTENSIONS))
+	namesB = set(name for name in os.listdir(dirB) if name.lower().endswith(IMG_EXTENSIONS))
+	return sorted(namesA & namesB), len(namesA - namesB), len(namesB - namesA)
+
+def init_worker():
+	"""
+	Keeps OpenCV to a single thread in every process of the pool, since the pairs are already
+	spread over the CPU cores.
+	"""
+	cv2.setNumThreads(1)
+
+def compare_task(task):
+	"""
+	Compares a single pair of images in a process of the pool. An error, such as an unreadable
+	image, is returned rather than raised so that it does not stop the other pairs.
+
+	Parameters
+	----------
+	task: tuple
+		The file name, the paths to the two images and the directory the differential and
+		threshold images are saved in, or None
+
+	Returns
+	-------
+	tuple
+		The file name, the SSIM, the number of contours and the error message, the SSIM and
+		the number of contours being None if the pair could not be compared
+	"""
+	name, pathA, pathB, dest_path = task
+	try:
+		score, contours = compare_pair(pathA, pathB, dest_path)
+		return name, score, contours, None
+	except Exception as e:
+		return name, None, None, str(e)
+
+def create_diff_dir(dirA, dirB, workers=None, save_images=False, chunksize=4):
+	"""
+	Compares the images with the same file name in two directories, such as the outputs of
+	two segmentation runs, spreading the pairs over a pool of processes. The SSIM, the
+	difference score and the number of contours of every pair are written to a single table,
+	./diffs/[directory 1 name]-[directory 2 name]/summary.csv. The progress and throughput are
+	printed while the pairs are compared.
+
+	Parameters
+	----------
+	dirA: str
+		The path to the first directory of images
+	dirB: str
+		The path to the second directory of images
+	workers: int, optional
+		The number of processes comparing the images, with the default being one per CPU core
+	save_images: bool, optional
+		Also saves the differential and threshold images of every pair in a folder named after
+		the image
+	chunksize: int, optional
+		The number of pairs sent to a process at once
+
+	Returns
+	-------
+	list
+		The file name, SSIM, number of contours and error message of every pair, sorted by
+		file name
+	"""
+	names, onlyA, onlyB = pair_files(dirA, dirB)
+	dest_path = join('./diffs/', get_file_name(os.path.normpath(dirA)) + "-" + get_file_name(os.path.normpath(dirB)))
+	if not os.path.isdir(dest_path):
+		os.makedirs(dest_path)
+	print("Comparing {} pairs of images, {} images only in {} and {} only in {}".format(
+		len(names), onlyA, dirA, onlyB, dirB))
+	tasks = [(name, join(dirA, name), join(dirB, name), join(dest_path, get_file_name(name)) if save_images else None)
+			 for name in names]
+
+	rows = []
+	start = time.time()
+	step = max(1, len(tasks) // 20)
+	with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+		for row in pool.imap_unordered(compare_task, tasks, chunksize):
+			rows.append(row)
+			if len(rows) % step == 0 or len(rows) == len(tasks):
+				elapsed = time.time() - start
+				print("Compared {}/{} pairs, {:.1f} pairs per second".format(len(rows), len(tasks),
+																			 len(rows) / max(elapsed, 1e-6)))
+	rows.sort(key=lambda row: row[0])
+
+	summary_path = join(dest_path, 'summary.csv')
+	with open(summary_path, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['name', 'ssim', 'difference', 'contours', 'error'])
+		for name, score, contours, error in rows:
+			if error is None:
+				writer.writerow([name, '{:.6f}'.format(score), '{:.6f}'.format(1 - score), contours, ''])
+			else:
+				writer.writerow([name, '', '', '', error])
+
+	compared = [row for row in rows if row[3] is None]
+	elapsed = time.time() - start
+	print("Compared {} pairs in {:.1f} s, {:.1f} pairs per second, {} failed".format(
+		len(compared), elapsed, len(rows) / max(elapsed, 1e-6), len(rows) - len(compared)))
+	if compared:
+		least = min(compared, key=lambda row: row[1])
+		print("Mean SSIM: {:.4f}, lowest SSIM: {:.4f} ({})".format(
+			sum(row[1] for row in compared) / len(compared), least[1], least[0]))
+	print("Summary saved as", summary_path)
+	return rows
+
+def read_labels(path):
+	"""
+	Reads a label map saved as a palette or grayscale PNG, such as the -seg.png outputs, whose
+	pixel values are the classes.
+
+	Parameters
+	----------
+	path: str
+		The path to the label map
+
+	Returns
+	-------
+	numpy array
+		The H x W label map
+	"""
+	image = Image.open(path)
+	if image.mode not in ('P', 'L'):
+		raise ValueError('{} is a {} image, not a label map'.format(path, image.mode))
+	return np.array(image)
+
+def label_diff(labelsA, labelsB, min_area=1):
+	"""
+	Takes in 2 label maps of the same size and compares their classes. The confusion matrix of
+	the classes comes from a single bincount over both maps, and the changed regions are the
+	connected components of the pixels whose class differs.
+
+	Parameters
+	----------
+	labelsA: numpy array
+		The first H x W label map
+	labelsB: numpy array
+		The second H x W label map
+	min_area: int, optional
+		The smallest changed region in pixels that is returned
+
+	Returns
+	-------
+	tuple
+		The C x C confusion matrix, whose entry (a, b) counts the pixels of class a in the first
+		map and b in the second, C being one more than the largest class of either map, and the
+		x, y, width, height and area of every changed region
+	"""
+	if labelsA.shape != labelsB.shape:
+		raise ValueError('the label maps have different sizes, {} and {}'.format(labelsA.shape, labelsB.shape))
+	num_classes = int(max(labelsA.max(), labelsB.max())) + 1
+	index = labelsA.astype(np.int64) * num_classes + labelsB
+	confusion = np.bincount(index.ravel(), minlength=num_classes ** 2).reshape(num_classes, num_classes)
+	changed = (labelsA != labelsB).view(np.uint8)
+	count, _, stats, _ = cv2.connectedComponentsWithStats(changed, connectivity=8)
+	# component 0 is the unchanged background
+	regions = stats[1:][stats[1:, cv2.CC_STAT_AREA] >= min_area]
+	return confusion, regions
+
+def class_changes(confusion):
+	"""
+	Takes in a confusion matrix returned by label_diff and counts, for every class, the pixels
+	it has in each label map and the pixels it lost and gained from the first to the second.
+
+	Returns
+	-------
+	numpy array
+		The C x 4 counts of pixels in the first map, in the second map, lost and gained
+	"""
+	same = np.diag(confusion)
+	countsA = confusion.sum(1)
+	countsB = confusion.sum(0)
+	return np.stack([countsA, countsB, countsA - same, countsB - same], 1)
+
+def create_label_diff_image(pathA, pathB, min_area=1):
+	"""
+	Takes in the paths to two label maps and prints the fraction of pixels whose class
+	changed, the pixels lost and gained by every class and the bounding boxes of the changed
+	regions.
+
+	Parameters
+	----------
+	pathA: str
+		The path to the first label map
+	pathB: str
+		The path to the second label map
+	min_area: int, optional
+		The smallest changed region in pixels that is printed
+
+	Returns
+	-------
+	float
+		The fraction of the pixels whose class changed
+	"""
+	confusion, regions = label_diff(read_labels(pathA), read_labels(pathB), min_area)
+	changed = confusion.sum() - np.trace(confusion)
+	print("Changed pixels: {} of {} ({:.4%})".format(changed, confusion.sum(), changed / confusion.sum()))
+	for label, (countA, countB, lost, gained) in enumerate(class_changes(confusion)):
+		if lost or gained:
+			print("Class {}: {} -> {} pixels, {} lost, {} gained".format(label, countA, countB, lost, gained))
+	for x, y, w, h, area in regions:
+		print("Changed region at x={}, y={}, {}x{}, {} pixels".format(x, y, w, h, area))
+	return changed / confusion.sum()
+
+def compare_labels_task(task):
+	"""
+	Compares a single pair of label maps in a process of the pool, returning an error rather
+	than raising it like compare_task.
+
+	Parameters
+	----------
+	task: tuple
+		The file name, the paths to the two label maps and the smallest changed region listed
+
+	Returns
+	-------
+	tuple
+		The file name, the confusion matrix, the changed regions and the error message
+	"""
+	name, pathA, pathB, min_area = task
+	try:
+		confusion, regions = label_diff(read_labels(pathA), read_labels(pathB), min_area)
+		return name, confusion, regions, None
+	except Exception as e:
+		return name, None, None, str(e)
+
+def create_label_diff_dir(dirA, dirB, workers=None, min_area=1, max_changed=None, chunksize=4):
+	"""
+	Compares the label maps with the same file name in two directories, such as the outputs
+	of two versions of a model, spreading the pairs over a pool of processes. Writes to
+	./diffs/[directory 1 name]-[directory 2 name]-labels/:
+	- summary.csv: the changed pixels and regions of every pair
+	- regions.csv: the bounding box of every changed region
+	- classes.csv: the pixels of every class in both directories and the pixels it lost and gained
+	- confusion.csv: the confusion matrix of the classes over all the pairs
+
+	Parameters
+	----------
+	dirA: str
+		The path to the first directory of label maps
+	dirB: str
+		The path to the second directory of label maps
+	workers: int, optional
+		The number of processes comparing the label maps, with the default being one per CPU core
+	min_area: int, optional
+		The smallest changed region in pixels that is listed
+	max_changed: float, optional
+		The largest fraction of changed pixels a pair can have before the comparison fails
+	chunksize: int, optional
+		The number of pairs sent to a process at once
+
+	Returns
+	-------
+	boolean
+		False if a pair could not be compared or has more than max_changed of its pixels changed
+	"""
+	names, onlyA, onlyB = pair_files(dirA, dirB)
+	dest_path = join('./diffs/', get_file_name(os.path.normpath(dirA)) + "-" + get_file_name(os.path.normpath(dirB)) + '-labels')
+	if not os.path.isdir(dest_path):
+		os.makedirs(dest_path)
+	print("Comparing {} pairs of label maps, {} only in {} and {} only in {}".format(
+		len(names), onlyA, dirA, onlyB, dirB))
+	tasks = [(name, join(dirA, name), join(dirB, name), min_area) for name in names]
+
+	total = np.zeros((256, 256), dtype=np.int64)
+	rows = []
+	start = time.time()
+	step = max(1, len(tasks) // 20)
+	with open(join(dest_path, 'regions.csv'), 'w', newline='') as f:
+		regions_writer = csv.writer(f)
+		regions_writer.writerow(['name', 'x', 'y', 'width', 'height', 'area'])
+		with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+			for name, confusion, regions, error in pool.imap_unordered(compare_labels_task, tasks, chunksize):
+				if error is None:
+					size = confusion.shape[0]
+					total[:size, :size] += confusion
+					changed = confusion.sum() - np.trace(confusion)
+					rows.append((name, confusion.sum(), changed, len(regions), None))
+					for region in regions:
+						regions_writer.writerow([name] + region.tolist())
+				else:
+					rows.append((name, None, None, None, error))
+				if len(rows) % step == 0 or len(rows) == len(tasks):
+					elapsed = time.time() - start
+					print("Compared {}/{} pairs, {:.1f} pairs per second".format(len(rows), len(tasks),
+																				 len(rows) / max(elapsed, 1e-6)))
+	rows.sort(key=lambda row: row[0])
+
+	failed = []
+	with open(join(dest_path, 'summary.csv'), 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['name', 'pixels', 'changed', 'changed fraction', 'regions', 'error'])
+		for name, pixels, changed, regions, error in rows:
+			if error is None:
+				writer.writerow([name, pixels, changed, '{:.6f}'.format(changed / pixels), regions, ''])
+				if max_changed is not None and changed / pixels > max_changed:
+					failed.append(name)
+			else:
+				writer.writerow([name, '', '', '', '', error])
+				failed.append(name)
+
+	classes = np.flatnonzero(total.sum(0) + total.sum(1))
+	with open(join(dest_path, 'classes.csv'), 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['class', 'pixels first', 'pixels second', 'lost', 'gained'])
+		for label, counts in zip(classes, class_changes(total)[classes]):
+			writer.writerow([label] + counts.tolist())
+	with open(join(dest_path, 'confusion.csv'), 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['first/second'] + classes.tolist())
+		for label in classes:
+			writer.writerow([label] + total[label, classes].tolist())
+
+	elapsed = time.time() - start
+	changed = total.sum() - np.trace(total)
+	print("Compared {} pairs in {:.1f} s, {:.1f} pairs per second".format(len(rows), elapsed,
+																		   len(rows) / max(elapsed, 1e-6)))
+	print("Changed pixels: {} of {} ({:.4%})".format(changed, total.sum(), changed / max(total.sum(), 1)))
+	if failed:
+		print("{} pairs failed or changed more than {}: {}".format(len(failed), max_changed, ', '.join(failed[:10])))
+	print("Results saved in", dest_path)
+	return not failed
+
 def calculate_diff(grayA, grayB):
 	"""
 	Takes in 2 grayscale images and calculates the difference between the 
@@ -83,6 +475,46 @@ def calculate_diff(grayA, grayB):
 	print('Difference:', 1 - score)
 	return diff
 
+def downscale_gray(image, width=64):
+	"""
+	Converts an RGB image to grayscale and shrinks it to the given width, keeping its aspect
+	ratio, so that comparing two frames with similarity_score is cheap.
+
+	Parameters
+	----------
+	image: numpy array
+		The H x W x 3 RGB or H x W grayscale image
+	width: int, optional
+		The width of the downscaled image
+
+	Returns
+	-------
+	numpy array
+		The downscaled grayscale image
+	"""
+	gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+	height = max(7, int(round(gray.shape[0] * width / gray.shape[1])))
+	return cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+
+def similarity_score(grayA, grayB):
+	"""
+	Takes in 2 grayscale images of the same size and returns their SSIM, like calculate_diff
+	but without building the differential image or printing the score.
+
+	Parameters
+	----------
+	grayA: numpy array
+		The first grayscale image to compare
+	grayB: numpy array
+		The second grayscale image to compare
+
+	Returns
+	-------
+	float
+		The SSIM of the two images, 1 for identical images
+	"""
+	return compare_ssim(grayA, grayB, data_range=255)
+
 def get_contours(thresh):
 	"""
 	Takes in the differential matrix pixel and returns the 
@@ -126,4 +558,16 @@ def write_images(diff_image, thresh_image, dest_path):
 
 if __name__ == '__main__':
 	args = parse_args()
-	create_diff_image(args.first, args.second)
+	workers = int(args.workers) if args.workers else None
+	max_changed = float(args.max_changed) if args.max_changed else None
+	if args.labels and os.path.isdir(args.first) and os.path.isdir(args.second):
+		if not create_label_diff_dir(args.first, args.second, workers, int(args.min_area), max_changed):
+			sys.exit(1)
+	elif args.labels:
+		changed = create_label_diff_image(args.first, args.second, int(args.min_area))
+		if max_changed is not None and changed > max_changed:
+			sys.exit(1)
+	elif os.path.isdir(args.first) and os.path.isdir(args.second):
+		create_diff_dir(args.first, args.second, workers, args.save_images)
+	else:
+		create_diff_image(args.first, args.second)
@@ -0,0 +1,178 @@
+from posixpath import join
+import os
+import hashlib
+import numpy as np
+from PIL import Image
+
+class ResultCache(object):
+	"""
+	Content-addressed cache of predicted label maps. Each entry is keyed on the hash of the
+	image's content together with the model, backbone, dataset and weights that produced it,
+	so renamed images still hit and images segmented by another model never do. Entries are
+	stored as grayscale PNG label maps and the least recently used ones are evicted once the
+	cache grows past its size limit.
+
+	Parameters
+	----------
+	cache_dir: str
+		The path to the directory holding the cached label maps
+	namespace: str
+		The description of the model, backbone, dataset and weights the cached label maps
+		belong to
+	max_bytes: int, optional
+		The maximum total size of the cached label maps
+	"""
+	def __init__(self, cache_dir, namespace, max_bytes=1 << 30):
+		self.cache_dir = cache_dir
+		self.namespace = namespace.encode()
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		self.size = sum(size for _, size, _ in self.entries())
+
+	def key(self, data):
+		"""
+		Takes in the encoded bytes of an image and returns its cache key.
+		"""
+		return hashlib.sha256(self.namespace + b'\0' + data).hexdigest()
+
+	def path(self, key):
+		return join(self.cache_dir, key[:2], key + '.png')
+
+	def get(self, key):
+		"""
+		Returns the cached label map of the given key, or None on a cache miss. A hit marks
+		the entry as recently used.
+		"""
+		path = self.path(key)
+		try:
+			pred = np.array(Image.open(path))
+			os.utime(path)
+		except (OSError, ValueError):
+			self.misses += 1
+			return None
+		self.hits += 1
+		return pred
+
+	def put(self, key, pred):
+		"""
+		Stores a label map under the given key and evicts the least recently used entries if
+		the cache is over its size limit.
+		"""
+		path = self.path(key)
+		if not os.path.isdir(os.path.dirname(path)):
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+		Image.fromarray(pred.astype('uint8')).save(tmp_path, format='PNG')
+		# a rewritten key only adds the difference to the counted size
+		old_size = os.path.getsize(path) if os.path.exists(path) else 0
+		os.replace(tmp_path, path)
+		self.size += os.path.getsize(path) - old_size
+		if self.size > self.max_bytes:
+			self.evict()
+
+	def entries(self):
+		"""
+		Lists every cached entry as a (path, size, last use time) tuple.
+		"""
+		for bucket in os.scandir(self.cache_dir):
+			if not bucket.is_dir():
+				continue
+			for entry in os.scandir(bucket.path):
+				if entry.name.endswith('.png'):
+					stat = entry.stat()
+					yield entry.path, stat.st_size, stat.st_mtime
+
+	def evict(self):
+		"""
+		Removes the least recently used entries until the cache is back under 90% of its size
+		limit, so that eviction does not run again on every insertion.
+		"""
+		entries = sorted(self.entries(), key=lambda entry: entry[2])
+		self.size = sum(size for _, size, _ in entries)
+		target = self.max_bytes * 0.9
+		for path, size, _ in entries:
+			if self.size <= target:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				continue
+			self.size -= size
+
+class JobJournal(object):
+	"""
+	Append-only record of the images of a directory run whose results have been written, so
+	that an interrupted run can resume where it stopped instead of starting over.
+
+	Parameters
+	----------
+	path: str
+		The path to the journal file
+	"""
+	def __init__(self, path):
+		self.path = path
+		self.done = set()
+		partial = False
+		if os.path.isfile(path):
+			with open(path) as f:
+				lines = f.readlines()
+			self.done = set(line.rstrip('\n') for line in lines if line.endswith('\n'))
+			partial = bool(lines) and not lines[-1].endswith('\n')
+		self.file = open(path, 'a')
+		if partial:
+			# ends the line cut short by an interruption so that it stays apart from the next
+			self.file.write('\n')
+
+	def __contains__(self, name):
+		return name in self.done
+
+	def add(self, name):
+		"""
+		Records that the result of the given image has been written.
+		"""
+		self.done.add(name)
+		self.file.write(name + '\n')
+		self.file.flush()
+
+	def close(self):
+		self.file.close()
+
+def weights_digest(model):
+	"""
+	Takes in a model and returns a hash of its weights, identifying the weights file it was
+	loaded from.
+
+	Parameters
+	----------
+	model: torch.nn.Module
+		The loaded model
+
+	Returns
+	-------
+	str
+		The SHA-1 hex digest of the model's parameters and buffers
+	"""
+	sha1 = hashlib.sha1()
+	for name, tensor in sorted(model.state_dict().items()):
+		sha1.update(name.encode())
+		sha1.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+	return sha1.hexdigest()
+
+def file_digest(path):
+	"""
+	Takes in the path to a model file and returns a hash of its content, identifying the
+	weights of a model that is not loaded with PyTorch.
+
+	Returns
+	-------
+	str
+		The SHA-1 hex digest of the file
+	"""
+	sha1 = hashlib.sha1()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(1 << 20), b''):
+			sha1.update(chunk)
+	return sha1.hexdigest()
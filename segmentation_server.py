@@ -0,0 +1,317 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import Future
+from collections import Counter, deque
+import io
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import socketserver
+import numpy as np
+from PIL import Image
+from semantic_segmentation import Segmenter, DATASET, dataset_palette
+
+class ServerStats(object):
+	"""
+	Collects the statistics reported by the daemon: the number of requests waiting to be
+	batched, a histogram of the batch sizes sent to the models and the request latencies.
+
+	Parameters
+	----------
+	window: int, optional
+		The number of most recent request latencies used to compute the percentiles
+	"""
+	def __init__(self, window=10000):
+		self.lock = threading.Lock()
+		self.batch_sizes = Counter()
+		self.latencies = deque(maxlen=window)
+		self.requests = 0
+
+	def record_batch(self, latencies):
+		"""
+		Records a finished batch along with the latency, in seconds, of each of its requests.
+		"""
+		with self.lock:
+			self.batch_sizes[len(latencies)] += 1
+			self.latencies.extend(latencies)
+			self.requests += len(latencies)
+
+	def report(self, queue_depth):
+		"""
+		Builds the statistics report.
+
+		Parameters
+		----------
+		queue_depth: int
+			The number of requests currently waiting to be batched
+
+		Returns
+		-------
+		dict
+			The queue depth, the batch size histogram, the number of served requests and the
+			p50/p99 latencies in milliseconds
+		"""
+		with self.lock:
+			latencies = np.array(self.latencies) * 1000
+			report = {
+				'queue_depth': queue_depth,
+				'requests': self.requests,
+				'batch_sizes': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+			}
+		if len(latencies):
+			report['latency_ms'] = {'p50': float(np.percentile(latencies, 50)), 'p99': float(np.percentile(latencies, 99))}
+		else:
+			report['latency_ms'] = {'p50': None, 'p99': None}
+		return report
+
+class DynamicBatcher(object):
+	"""
+	Gathers concurrent segmentation requests for one warm model into dynamic batches. A batch
+	is sent to the model as soon as it holds max_batch_size images or the oldest request in it
+	has waited max_wait_ms milliseconds, whichever comes first.
+
+	Parameters
+	----------
+	segmenter: Segmenter
+		The loaded Segmenter the batches are sent to
+	stats: ServerStats
+		The statistics object the finished batches are recorded in
+	max_batch_size: int, optional
+		The maximum number of images in a single batch
+	max_wait_ms: double, optional
+		The maximum time a request waits for other requests to join its batch
+	"""
+	def __init__(self, segmenter, stats, max_batch_size=8, max_wait_ms=10):
+		self.segmenter = segmenter
+		self.segmenter.batch_size = max_batch_size
+		self.stats = stats
+		self.max_batch_size = max_batch_size
+		self.max_wait = max_wait_ms / 1000.0
+		self.requests = queue.Queue()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def submit(self, image):
+		"""
+		Queues an image to be segmented in the next batch.
+
+		Parameters
+		----------
+		image: numpy.ndarray
+			The RGB image to segment
+
+		Returns
+		-------
+		Future
+			The future resolved with the H x W label map of the image
+		"""
+		future = Future()
+		self.requests.put((image, future, time.perf_counter()))
+		return future
+
+	def queue_depth(self):
+		return self.requests.qsize()
+
+	def run(self):
+		while True:
+			batch = [self.requests.get()]
+			deadline = batch[0][2] + self.max_wait
+			while len(batch) < self.max_batch_size:
+				timeout = deadline - time.perf_counter()
+				if timeout <= 0:
+					break
+				try:
+					batch.append(self.requests.get(timeout=timeout))
+				except queue.Empty:
+					break
+			try:
+				preds = self.segmenter.segment_batch([image for image, _, _ in batch])
+			except Exception as e:
+				for _, future, _ in batch:
+					future.set_exception(e)
+				continue
+			end = time.perf_counter()
+			for (_, future, _), pred in zip(batch, preds):
+				future.set_result(pred)
+			self.stats.record_batch([end - start for _, _, start in batch])
+
+class ModelPool(object):
+	"""
+	Keeps one warm Segmenter and DynamicBatcher per (model, backbone, dataset). Models that
+	are not preloaded are built the first time they are requested.
+
+	Parameters
+	----------
+	max_batch_size: int, optional
+		The maximum number of images in a single batch
+	max_wait_ms: double, optional
+		The maximum time a request waits for other requests to join its batch
+	ngpus: int, optional
+		The number of GPUs each model utilizes
+	"""
+	def __init__(self, max_batch_size=8, max_wait_ms=10, ngpus=1):
+		self.max_batch_size = max_batch_size
+		self.max_wait_ms = max_wait_ms
+		self.ngpus = ngpus
+		self.stats = ServerStats()
+		self.batchers = {}
+		self.palettes = {}
+		self.loading = {}
+		self.lock = threading.Lock()
+
+	def get(self, model, backbone, dataset):
+		"""
+		Returns the batcher of the given model, building the model if it is not warm yet. The
+		model is built outside of the pool's lock, so that requests for warm models are not held
+		up, and concurrent requests for the same model wait for a single build.
+		"""
+		key = (model, backbone, dataset)
+		with self.lock:
+			if key in self.batchers:
+				return self.batchers[key], self.palettes[key]
+			future = self.loading.get(key)
+			if future is None:
+				future = self.loading[key] = Future()
+				building = True
+			else:
+				building = False
+		if not building:
+			return future.result()
+		try:
+			print('Loading model', key)
+			segmenter = Segmenter(model, backbone, dataset, ngpus=self.ngpus)
+			palette = dataset_palette(dataset)
+			batcher = DynamicBatcher(segmenter, self.stats, self.max_batch_size, self.max_wait_ms)
+		except Exception as e:
+			# the waiting requests fail too, and the next request tries again
+			with self.lock:
+				del self.loading[key]
+			future.set_exception(e)
+			raise
+		with self.lock:
+			self.batchers[key] = batcher
+			self.palettes[key] = palette
+			del self.loading[key]
+		future.set_result((batcher, palette))
+		return batcher, palette
+
+	def report(self):
+		with self.lock:
+			queue_depth = sum(batcher.queue_depth() for batcher in self.batchers.values())
+			models = [':'.join(key) for key in self.batchers]
+		report = self.stats.report(queue_depth)
+		report['models'] = models
+		return report
+
+class SegmentationHandler(BaseHTTPRequestHandler):
+	"""
+	Serves the daemon's endpoints:
+	- POST /segment?model=M&backbone=B&dataset=D with an encoded image as the body, answered
+	  with the label map as a palette PNG
+	- GET /stats, answered with the statistics report as JSON
+	"""
+	def do_GET(self):
+		if urlparse(self.path).path != '/stats':
+			self.send_error(404)
+			return
+		self.reply(200, 'application/json', json.dumps(self.server.pool.report()).encode())
+
+	def do_POST(self):
+		url = urlparse(self.path)
+		if url.path != '/segment':
+			self.send_error(404)
+			return
+		params = {key: values[0] for key, values in parse_qs(url.query).items()}
+		try:
+			batcher, palette = self.server.pool.get(params.get('model', 'psp'), params.get('backbone', 'resnet50'),
+													params.get('dataset', DATASET))
+			body = self.rfile.read(int(self.headers['Content-Length']))
+			image = np.array(Image.open(io.BytesIO(body)).convert('RGB'))
+			pred = batcher.submit(image).result()
+		except Exception as e:
+			self.send_error(500, type(e).__name__, str(e))
+			return
+		out_img = palette.to_image(pred)
+		buffer = io.BytesIO()
+		out_img.save(buffer, format='PNG')
+		self.reply(200, 'image/png', buffer.getvalue())
+
+	def reply(self, code, content_type, body):
+		self.send_response(code)
+		self.send_header('Content-Type', content_type)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+def report_stats(pool, interval):
+	"""
+	Prints the statistics report every interval seconds.
+	"""
+	while True:
+		time.sleep(interval)
+		print(json.dumps(pool.report()))
+
+def parse_args():
+	"""
+	Builds a parser for the models to keep warm, the batching limits and the address the
+	daemon listens on.
+
+	Returns
+	-------
+	ArgumentParser
+		The parser object containing all the specified configurations
+	"""
+	parser = argparse.ArgumentParser(
+		description='Serve segmentation requests from warm models with dynamic batching.',
+		usage='segmentation_server.py [ --port P | --socket S ] --models [ model:backbone:dataset ... ]')
+	address_group = parser.add_mutually_exclusive_group()
+	address_group.add_argument('--port', type=int, default=8000, help='Use this flag to listen on localhost HTTP port P')
+	address_group.add_argument('--socket', default=None, help='Use this flag to listen on the Unix socket S instead')
+	parser.add_argument('--models', nargs='+', default=['psp:resnet50:' + DATASET],
+						help='Use this flag to specify the model:backbone:dataset combinations to keep warm')
+	parser.add_argument('--max-batch-size', type=int, default=8,
+						help='Use this flag to specify the maximum number of images in a batch')
+	parser.add_argument('--max-wait-ms', type=float, default=10,
+						help='Use this flag to specify how long a request may wait for a batch to fill up')
+	parser.add_argument('--ngpus', type=int, default=1,
+						help='Use this flag to specify how many GPUs each model should utilize')
+	parser.add_argument('--report-interval', type=float, default=60,
+						help='Use this flag to specify how often, in seconds, the statistics are printed')
+	return parser.parse_args()
+
+def main():
+	"""
+	Loads the requested models and serves segmentation requests until interrupted.
+	"""
+	args = parse_args()
+	pool = ModelPool(args.max_batch_size, args.max_wait_ms, args.ngpus)
+	for spec in args.models:
+		pool.get(*spec.split(':'))
+	if args.socket:
+		if os.path.exists(args.socket):
+			os.remove(args.socket)
+		server = UnixHTTPServer(args.socket, SegmentationHandler)
+		print('Listening on unix:' + args.socket)
+	else:
+		server = ThreadingHTTPServer(('127.0.0.1', args.port), SegmentationHandler)
+		print('Listening on 127.0.0.1:' + str(args.port))
+	server.pool = pool
+	threading.Thread(target=report_stats, args=(pool, args.report_interval), daemon=True).start()
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+if __name__ == '__main__':
+	main()
@@ -5,15 +5,634 @@ import cv2
 import random
 import string
 import re
+import sys
+import io
+import queue
+import socket
+import traceback
+import http.client
+import numpy as np
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from video_pipeline import segment_video, sample_frames, FrameGate
+from result_cache import ResultCache, JobJournal
 
-MODEL = ' --model '
-BACKBONE = ' --backbone '
-DATASET = ' --dataset citys'
+cur_path = os.path.abspath(os.path.dirname(__file__))
+LIB_PATH = join(cur_path, 'awesome-semantic-segmentation-pytorch')
+DATASET = 'citys'
+IMG_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
 
-def apply_segmentation_dir(model, backbone, dir_path, dest_path, ngpus=1):
+def dataset_palette(dataset):
+	"""
+	Returns the cached Palette with the colors of the given dataset, which turns label maps
+	into color coded palette images and RGB arrays.
+	"""
+	if LIB_PATH not in sys.path:
+		sys.path.append(LIB_PATH)
+	from core.utils.composite import get_palette
+	return get_palette(dataset)
+
+class Segmenter(object):
+	"""
+	Builds the trained Tramac neural network model once and keeps it resident in memory, so
+	that images, directories and video frames can be segmented without starting a new Python
+	interpreter and rebuilding the model for every call.
+
+	Parameters
+	----------
+	model: str, optional
+		The model to use to perform evaluation, with the default being PSPNet
+	backbone: str, optional
+		The backbone to use to perform evaluation, with the default being ResNet50
+	dataset: str, optional
+		The dataset the model was trained on, with the default being Cityscapes
+	ngpus: int, optional
+		The number of GPUs the user wants to utilize for evaluation
+	batch_size: int, optional
+		The maximum number of images passed through the model in a single forward pass
+	device: str, optional
+		The device the model runs on, with the default being the first GPU if there is one
+		and the CPU otherwise
+	backend: str, optional
+		Either 'pytorch' or 'onnxruntime', which runs the model's ONNX graph on the CPU and
+		exports it on first use
+	upsample: str, optional
+		How the PyTorch models bring their logits to the image size before the argmax: 'logits'
+		upsamples all of them at once, 'strips' a few rows at a time with the same labels and a
+		fraction of the memory, and 'labels' takes the argmax at the head's resolution and only
+		refines label edges, which is faster but approximate
+	tile_size: int, optional
+		Segments every image in overlapping tiles of this size, so that memory is bounded by the
+		tile size rather than the image size, with the default being whole images
+	tile_overlap: int, optional
+		The minimum overlap of two neighbouring tiles, whose logits are blended
+	keyframe_interval: int, optional
+		Segments the frames of videos running the deep backbone stages only on keyframes, taken
+		at most this many frames apart, with the default being every frame. Unless the head
+		uses the low-level features, the other frames hold the labels of their keyframe
+	keyframe_mode: str, optional
+		Either 'fixed' for a keyframe every keyframe_interval frames, or 'feature' or 'pixel' for
+		a new keyframe as soon as the low-level features or the pixels of a frame change
+	keyframe_threshold: float, optional
+		The relative change starting a new keyframe in the 'feature' and 'pixel' modes
+	"""
+	def __init__(self, model='psp', backbone='resnet50', dataset=DATASET, ngpus=1, batch_size=4, device=None,
+				backend='pytorch', upsample='logits', tile_size=None, tile_overlap=128, keyframe_interval=None,
+				keyframe_mode='fixed', keyframe_threshold=0.2):
+		if LIB_PATH not in sys.path:
+			sys.path.append(LIB_PATH)
+		import torch
+		import torch.nn as nn
+		from torchvision import transforms
+		from core.models.model_zoo import get_segmentation_model
+		from core.utils.tiled import TiledModel
+		from core.utils.keyframe import KeyframeModel
+
+		self.model_name = model
+		self.backbone = backbone
+		self.dataset = dataset
+		self.batch_size = max(1, batch_size)
+		self.backend = backend
+		self.upsample = upsample
+		if device is None:
+			device = 'cuda' if torch.cuda.is_available() else 'cpu'
+		self.device = torch.device(device)
+		self.transform = transforms.Compose([
+			transforms.ToTensor(),
+			transforms.Normalize([.485, .456, .406], [.229, .224, .225]),
+		])
+		if backend == 'onnxruntime':
+			from core.utils.onnx_export import export_onnx, get_onnx_file, ONNXRuntimeModel
+			self.device = torch.device('cpu')
+			onnx_path = get_onnx_file(model, backbone, dataset)
+			if not os.path.isfile(onnx_path):
+				print("Exporting", model, backbone, "to", onnx_path)
+				export_onnx(get_segmentation_model(model=model, dataset=dataset, backbone=backbone, aux=False,
+												   pretrained=True, pretrained_base=False, norm_layer=nn.BatchNorm2d),
+							onnx_path)
+			self.model = ONNXRuntimeModel(onnx_path, threads=torch.get_num_threads())
+		else:
+			self.model = get_segmentation_model(model=model, dataset=dataset, backbone=backbone,
+												aux=False, pretrained=True, pretrained_base=False,
+												norm_layer=nn.BatchNorm2d).to(self.device)
+			if ngpus > 1 and self.device.type == 'cuda' and torch.cuda.device_count() > 1:
+				self.model = nn.DataParallel(self.model, device_ids=list(range(min(ngpus, torch.cuda.device_count()))))
+			self.model.eval()
+		# the tiles of an image are batched, so they are spread over the GPUs of a DataParallel model
+		self.tiled = TiledModel(self.model, tile_size, tile_overlap, batch_size=self.batch_size) if tile_size else None
+		self.keyframes = None
+		if keyframe_interval:
+			if backend != 'pytorch':
+				raise ValueError('keyframe feature reuse needs the pytorch backend')
+			model = self.model.module if hasattr(self.model, 'module') else self.model
+			self.keyframes = KeyframeModel(model, keyframe_interval, keyframe_mode, keyframe_threshold)
+
+	def segment(self, image):
+		"""
+		Segments a single image with the resident model.
+
+		Parameters
+		----------
+		image: str, PIL.Image or numpy.ndarray
+			The path to the image, a PIL image or an RGB array of shape H x W x 3
+
+		Returns
+		-------
+		numpy.ndarray
+			The H x W uint8 label map containing the predicted class of every pixel
+		"""
+		return self.segment_batch([image])[0]
+
+	def segment_batch(self, images):
+		"""
+		Segments a list of images with the resident model. Consecutive images sharing the same
+		size are stacked into batches of at most batch_size images.
+
+		Parameters
+		----------
+		images: list
+			The images to segment, given as paths, PIL images or RGB arrays
+
+		Returns
+		-------
+		list
+			The H x W uint8 label maps, in the same order as the given images
+		"""
+		import torch
+
+		tensors = [self.transform(load_image(image)) for image in images]
+		preds = []
+		start = 0
+		while start < len(tensors):
+			end = start + 1
+			while (end < len(tensors) and end - start < self.batch_size
+					and tensors[end].shape == tensors[start].shape):
+				end += 1
+			batch = torch.stack(tensors[start:end]).to(self.device)
+			if self.tiled is not None:
+				pred = self.tiled.predict(batch).cpu().numpy()
+			elif hasattr(self.model, 'predict'):
+				# skips the auxiliary heads and copies uint8 labels instead of the logits
+				pred = self.model.predict(batch, upsample=self.upsample).cpu().numpy()
+			else:
+				with torch.no_grad():
+					outputs = self.model(batch)
+				pred = torch.argmax(outputs[0], 1).byte().cpu().numpy()
+			preds.extend(list(pred))
+			start = end
+		return preds
+
+	def segment_frames(self, frames):
+		"""
+		Segments consecutive frames of a video. With keyframe_interval set, the deep features
+		of the last keyframe are reused for the following frames, including across calls until
+		reset_frames is called. Otherwise the frames are segmented like segment_batch.
+
+		Parameters
+		----------
+		frames: list
+			Consecutive video frames, given as paths, PIL images or RGB arrays
+
+		Returns
+		-------
+		list
+			The H x W uint8 label maps, in the same order as the given frames
+		"""
+		import torch
+
+		if self.keyframes is None:
+			return self.segment_batch(frames)
+		batch = torch.stack([self.transform(load_image(frame)) for frame in frames]).to(self.device)
+		return list(self.keyframes.predict(batch).cpu().numpy())
+
+	def reset_frames(self):
+		"""
+		Forgets the cached keyframe before the frames of a new video are segmented.
+		"""
+		if self.keyframes is not None:
+			self.keyframes.reset()
+
+	def segment_dir(self, dir_path, dest_path, cache=None, journal=None):
+		"""
+		Segments every image in a directory and writes the color coded result for each image
+		to [dest_path]/[image name]-seg.png. With a cache, only the images missing from the
+		cache are passed through the model, and with a journal, the images already written by
+		an interrupted run are skipped.
+
+		Parameters
+		----------
+		dir_path: str
+			The path to the directory containing the images to be segmented
+		dest_path: str
+			The path to the destination directory where the segmented images will be stored
+		cache: ResultCache, optional
+			The cache of label maps to read from and add the new results to
+		journal: JobJournal, optional
+			The journal of the images whose results have already been written
+
+		Returns
+		-------
+		list
+			The paths of the segmented images
+		"""
+		if not os.path.isdir(dest_path):
+			os.makedirs(dest_path)
+		names = sorted(name for name in os.listdir(dir_path) if name.lower().endswith(IMG_EXTENSIONS))
+		out_paths = [join(dest_path, get_file_name(name) + '-seg.png') for name in names]
+		misses = []
+		for name, out_path in zip(names, out_paths):
+			if journal is not None and name in journal:
+				continue
+			key = None
+			if cache is not None:
+				with open(join(dir_path, name), 'rb') as f:
+					key = cache.key(f.read())
+				pred = cache.get(key)
+				if pred is not None:
+					self.write_result(pred, out_path, name, journal)
+					continue
+			misses.append((name, out_path, key))
+		for i in range(0, len(misses), self.batch_size):
+			batch = misses[i:i + self.batch_size]
+			preds = self.segment_batch([join(dir_path, name) for name, _, _ in batch])
+			for (name, out_path, key), pred in zip(batch, preds):
+				if cache is not None:
+					cache.put(key, pred)
+				self.write_result(pred, out_path, name, journal)
+		return out_paths
+
+	def write_result(self, pred, out_path, name, journal=None):
+		"""
+		Writes the color coded label map of an image and records it in the journal.
+		"""
+		self.colorize(pred).save(out_path)
+		if journal is not None:
+			journal.add(name)
+
+	def cache_namespace(self):
+		"""
+		Describes the model, backbone, dataset and weights whose results a ResultCache holds.
+
+		Returns
+		-------
+		str
+			The cache namespace of the loaded model
+		"""
+		from result_cache import weights_digest, file_digest
+		if self.backend == 'onnxruntime':
+			namespace = [self.model_name, self.backbone, self.dataset, file_digest(self.model.path)]
+		else:
+			model = self.model.module if hasattr(self.model, 'module') else self.model
+			namespace = [self.model_name, self.backbone, self.dataset, weights_digest(model)]
+		if self.upsample == 'labels':
+			# approximate label maps are kept apart from the exact ones
+			namespace.append(self.upsample)
+		if self.tiled is not None:
+			namespace.append('tiles {}x{} overlap {}x{}'.format(*(self.tiled.tile_size + self.tiled.overlap)))
+		return '|'.join(namespace)
+
+	def evaluate(self, img_path, mask_path):
+		"""
+		Segments a Cityscapes image like segment, with the same backend, tiles and upsampling,
+		and scores the prediction against its Cityscapes mask.
+
+		Parameters
+		----------
+		img_path: str
+			The path to the Cityscapes image
+		mask_path: str
+			The path to the Cityscapes mask image
+
+		Returns
+		-------
+		tuple
+			The pixel accuracy and the mean IoU of the prediction
+		"""
+		import torch
+		from core.data.dataloader import get_segmentation_dataset
+		from core.utils.score import SegmentationMetric
+
+		dataset = get_segmentation_dataset('custom-metric', input_pic=img_path, input_gt=mask_path,
+										   mode='testval', split='val')
+		image, target = dataset[0]
+		pred = self.segment(image)
+		metric = SegmentationMetric(dataset.num_class)
+		metric.update(torch.from_numpy(pred).unsqueeze(0), target.unsqueeze(0))
+		return metric.get()
+
+	def colorize(self, pred):
+		"""
+		Converts a label map into the color coded overlay image of the model's dataset.
+
+		Parameters
+		----------
+		pred: numpy.ndarray
+			The H x W label map returned by segment or segment_batch
+
+		Returns
+		-------
+		PIL.Image
+			The palette image with the dataset's colors
+		"""
+		return dataset_palette(self.dataset).to_image(pred)
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+	"""
+	HTTP connection over a Unix socket, used to talk to a segmentation server listening on
+	a socket path instead of a localhost port.
+	"""
+	def __init__(self, socket_path, timeout=None):
+		super(UnixHTTPConnection, self).__init__('localhost', timeout=timeout)
+		self.socket_path = socket_path
+
+	def connect(self):
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.settimeout(self.timeout)
+		self.sock.connect(self.socket_path)
+
+class SegmentationClient(object):
+	"""
+	Client for a running segmentation_server.py daemon. It exposes the same segment,
+	segment_batch, segment_dir and colorize methods as Segmenter, so it can be passed to
+	process_input in place of a locally loaded model. Images of a batch are sent as concurrent
+	requests so that the server can batch them together.
+
+	Parameters
+	----------
+	address: str
+		The address of the server, either host:port or unix:[socket path]
+	model: str, optional
+		The model to use to perform evaluation, with the default being PSPNet
+	backbone: str, optional
+		The backbone to use to perform evaluation, with the default being ResNet50
+	dataset: str, optional
+		The dataset the model was trained on, with the default being Cityscapes
+	batch_size: int, optional
+		The maximum number of requests sent to the server at once
+	timeout: double, optional
+		The number of seconds to wait for a response from the server
+	"""
+	def __init__(self, address, model='psp', backbone='resnet50', dataset=DATASET, batch_size=4, timeout=600):
+		self.address = address
+		self.model_name = model
+		self.backbone = backbone
+		self.dataset = dataset
+		self.batch_size = max(1, batch_size)
+		self.timeout = timeout
+
+	def connect(self):
+		if self.address.startswith('unix:'):
+			return UnixHTTPConnection(self.address[len('unix:'):], timeout=self.timeout)
+		address = self.address[len('http://'):] if self.address.startswith('http://') else self.address
+		return http.client.HTTPConnection(address, timeout=self.timeout)
+
+	def request(self, image):
+		"""
+		Sends a single image to the server and returns its label map.
+		"""
+		from PIL import Image
+
+		buffer = io.BytesIO()
+		image = load_image(image)
+		if not isinstance(image, Image.Image):
+			image = Image.fromarray(image)
+		image.save(buffer, format='PNG')
+		query = urlencode({'model': self.model_name, 'backbone': self.backbone, 'dataset': self.dataset})
+		conn = self.connect()
+		try:
+			conn.request('POST', '/segment?' + query, body=buffer.getvalue(), headers={'Content-Type': 'image/png'})
+			response = conn.getresponse()
+			body = response.read()
+		finally:
+			conn.close()
+		if response.status != 200:
+			raise RuntimeError('Segmentation server returned {} {}'.format(response.status, response.reason))
+		# the server sends the palette image Segmenter.colorize would give
+		pred = np.array(Image.open(io.BytesIO(body)))
+		shift = dataset_palette(self.dataset).shift
+		if shift:
+			pred -= np.uint8(shift)
+		return pred
+
+	def segment(self, image):
+		return self.request(image)
+
+	def segment_batch(self, images):
+		with ThreadPoolExecutor(max_workers=self.batch_size) as executor:
+			return list(executor.map(self.request, images))
+
+	def segment_dir(self, dir_path, dest_path, cache=None, journal=None):
+		return Segmenter.segment_dir(self, dir_path, dest_path, cache, journal)
+
+	def write_result(self, pred, out_path, name, journal=None):
+		return Segmenter.write_result(self, pred, out_path, name, journal)
+
+	def colorize(self, pred):
+		return Segmenter.colorize(self, pred)
+
+class ShardedSegmenter(object):
+	"""
+	Splits the images of every batch across worker processes, each holding its own copy of
+	the model with plain BatchNorm and a fixed number of threads, and merges the label maps
+	back in their original order. The workers share no process group and never communicate
+	with each other, so unlike DistributedDataParallel this works on CPU-only machines and
+	adds no collective overhead. It exposes the same methods as Segmenter, so it can be
+	passed to process_input in its place.
+
+	Parameters
+	----------
+	model: str, optional
+		The model to use to perform evaluation, with the default being PSPNet
+	backbone: str, optional
+		The backbone to use to perform evaluation, with the default being ResNet50
+	dataset: str, optional
+		The dataset the model was trained on, with the default being Cityscapes
+	workers: int, optional
+		The number of worker processes
+	threads: int, optional
+		The number of threads each worker runs the model with, with the default being the
+		number of CPU cores divided by the number of workers
+	batch_size: int, optional
+		The maximum number of images passed through each worker's model in a single forward pass
+	backend: str, optional
+		Either 'pytorch' or 'onnxruntime', the backend every worker runs its model with
+	upsample: str, optional
+		Either 'logits', 'strips' or 'labels', how every worker upsamples its model's logits
+	tile_size: int, optional
+		Segments every image in overlapping tiles of this size, with the default being whole images
+	tile_overlap: int, optional
+		The minimum overlap of two neighbouring tiles
+	"""
+	def __init__(self, model='psp', backbone='resnet50', dataset=DATASET, workers=2, threads=None, batch_size=4,
+				backend='pytorch', upsample='logits', tile_size=None, tile_overlap=128):
+		import multiprocessing
+		import torch
+		if LIB_PATH not in sys.path:
+			sys.path.append(LIB_PATH)
+
+		self.model_name = model
+		self.backbone = backbone
+		self.dataset = dataset
+		self.backend = backend
+		self.workers = max(1, workers)
+		self.worker_batch_size = max(1, batch_size)
+		# a batch holds enough images to keep every worker busy
+		self.batch_size = self.worker_batch_size * self.workers
+		cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+		if threads is None:
+			threads = max(1, len(cores) // self.workers)
+		ngpus = torch.cuda.device_count() if backend == 'pytorch' else 0
+		if backend == 'onnxruntime':
+			# export once before the workers would all try to
+			Segmenter(model, backbone, dataset, backend=backend)
+		context = multiprocessing.get_context('spawn')
+		self.results = context.Queue()
+		self.tasks = []
+		self.processes = []
+		self.seq = 0
+		for rank in range(self.workers):
+			device = 'cuda:' + str(rank % ngpus) if ngpus else 'cpu'
+			worker_cores = cores[rank * threads:(rank + 1) * threads] if len(cores) >= self.workers * threads else None
+			tasks = context.Queue()
+			process = context.Process(target=run_shard, daemon=True,
+									  args=(rank, model, backbone, dataset, self.worker_batch_size, device, backend,
+											upsample, tile_size, tile_overlap, threads, worker_cores, tasks, self.results))
+			process.start()
+			self.tasks.append(tasks)
+			self.processes.append(process)
+		try:
+			self.collect([-1 - rank for rank in range(self.workers)])
+		except BaseException:
+			self.close()
+			raise
+
+	def submit(self, rank, method, *args):
+		"""
+		Asks a worker to call one of its Segmenter's methods and returns the sequence number
+		its result will be tagged with.
+		"""
+		seq = self.seq
+		self.seq += 1
+		self.tasks[rank].put((seq, method, args))
+		return seq
+
+	def collect(self, seqs):
+		"""
+		Waits for the results of the given sequence numbers and returns them in that order.
+		"""
+		pending = set(seqs)
+		results = {}
+		while pending:
+			try:
+				seq, result, error = self.results.get(timeout=1)
+			except queue.Empty:
+				for process in self.processes:
+					if not process.is_alive():
+						raise RuntimeError('Segmentation worker exited with code ' + str(process.exitcode))
+				continue
+			if error is not None:
+				raise RuntimeError('Segmentation worker failed:\n' + error)
+			if seq in pending:
+				pending.remove(seq)
+				results[seq] = result
+		return [results[seq] for seq in seqs]
+
+	def segment(self, image):
+		return self.segment_batch([image])[0]
+
+	def segment_batch(self, images):
+		"""
+		Splits the images into one chunk per worker, or more if a chunk would exceed a worker's
+		batch size, and returns the label maps in the same order as the given images.
+		"""
+		size = min(self.worker_batch_size, -(-len(images) // self.workers)) if images else 1
+		chunks = [images[i:i + size] for i in range(0, len(images), size)]
+		seqs = [self.submit(i % self.workers, 'segment_batch', chunk) for i, chunk in enumerate(chunks)]
+		return [pred for preds in self.collect(seqs) for pred in preds]
+
+	def segment_dir(self, dir_path, dest_path, cache=None, journal=None):
+		return Segmenter.segment_dir(self, dir_path, dest_path, cache, journal)
+
+	def write_result(self, pred, out_path, name, journal=None):
+		return Segmenter.write_result(self, pred, out_path, name, journal)
+
+	def cache_namespace(self):
+		return self.collect([self.submit(0, 'cache_namespace')])[0]
+
+	def evaluate(self, img_path, mask_path):
+		return self.collect([self.submit(0, 'evaluate', img_path, mask_path)])[0]
+
+	def colorize(self, pred):
+		return Segmenter.colorize(self, pred)
+
+	def close(self):
+		"""
+		Stops the worker processes.
+		"""
+		for tasks, process in zip(self.tasks, self.processes):
+			if process.is_alive():
+				tasks.put(None)
+		for process in self.processes:
+			process.join()
+
+def run_shard(rank, model, backbone, dataset, batch_size, device, backend, upsample, tile_size, tile_overlap, threads,
+			  cores, tasks, results):
+	"""
+	Runs in a ShardedSegmenter worker process: builds the worker's Segmenter, reports that it
+	is ready and then serves method calls from its task queue until it receives None.
+	"""
+	import torch
+	if cores is not None:
+		os.sched_setaffinity(0, cores)
+	torch.set_num_threads(threads)
+	try:
+		segmenter = Segmenter(model, backbone, dataset, batch_size=batch_size, device=device, backend=backend,
+							  upsample=upsample, tile_size=tile_size, tile_overlap=tile_overlap)
+	except Exception:
+		results.put((-1 - rank, None, traceback.format_exc()))
+		return
+	results.put((-1 - rank, None, None))
+	while True:
+		task = tasks.get()
+		if task is None:
+			break
+		seq, method, args = task
+		try:
+			results.put((seq, getattr(segmenter, method)(*args), None))
+		except Exception:
+			results.put((seq, None, traceback.format_exc()))
+
+def load_image(image):
+	"""
+	Takes in an image path, a PIL image or an array and returns it as an RGB image.
+
+	Parameters
+	----------
+	image: str, PIL.Image or numpy.ndarray
+		The image to load
+
+	Returns
+	-------
+	PIL.Image or numpy.ndarray
+		The RGB image, ready to be passed to the model's input transform
+	"""
+	from PIL import Image
+	if isinstance(image, str):
+		return Image.open(image).convert('RGB')
+	if isinstance(image, Image.Image):
+		return image.convert('RGB')
+	return image
+
+def apply_segmentation_dir(model, backbone, dir_path, dest_path, ngpus=1, segmenter=None, cache_dir=None,
+						cache_size=1 << 30):
 	"""
 	Takes in image paths from a directory and feeds each image into the trained Tramac neural 
 	network model. Writes the resulting overlays for each image to a specified directory.
+
+	The images whose overlays were written are recorded in a journal inside the destination
+	directory, so running again with the same destination resumes an interrupted run. With a
+	cache directory, only the images that are new or changed since they were last segmented
+	by the same model and weights are passed through the model.
 	
 	Parameters
 	----------
@@ -27,21 +646,29 @@ def apply_segmentation_dir(model, backbone, dir_path, dest_path, ngpus=1):
 		The path to the destination directory where the segmented images will be stored
 	ngpus: int, optional
 		The number of GPUs the user wants to utilize for evaluation
+	segmenter: Segmenter, optional
+		An already loaded Segmenter to reuse instead of building a new model
+	cache_dir: str, optional
+		The path to the directory caching label maps across runs, with the default being no cache
+	cache_size: int, optional
+		The maximum size in bytes of the cache before the least recently used results are evicted
 	"""
-	os.chdir('./awesome-semantic-segmentation-pytorch/scripts')
-	if not os.path.isdir(dir_path):
-		dir_path = join('../../', dir_path)
-	dest_path = join('../../', dest_path)
-	outdir = ' --outdir ' + dest_path
-	input_folder = ' --custom-dataset ' + dir_path
-	parameters = MODEL + model + BACKBONE + backbone + DATASET + input_folder + outdir
-	if ngpus > 1:
-		os.system('python -m torch.distributed.launch --nproc_per_node=' + str(ngpus) + '  eval_custom_dataset.py' + parameters)
-	else:
-		os.system('python eval_custom_dataset.py' + parameters)
-	os.chdir('../..')
-
-def apply_single_segmentation(model, backbone, img_path, dest_path, mask_path=None, ngpus=1):
+	if segmenter is None:
+		segmenter = Segmenter(model, backbone, ngpus=ngpus)
+	cache = None
+	if cache_dir:
+		cache = ResultCache(cache_dir, segmenter.cache_namespace(), cache_size)
+	if not os.path.isdir(dest_path):
+		os.makedirs(dest_path)
+	journal = JobJournal(join(dest_path, '.journal'))
+	try:
+		segmenter.segment_dir(dir_path, dest_path, cache, journal)
+	finally:
+		journal.close()
+	if cache is not None:
+		print("Result cache hits:", cache.hits, "misses:", cache.misses)
+
+def apply_single_segmentation(model, backbone, img_path, dest_path, mask_path=None, ngpus=1, segmenter=None):
 	"""
 	Takes in a single image path and feeds the image into the trained Tramac neural network model.
 	Writes the resulting overlay image to the specified directory path. 
@@ -60,32 +687,21 @@ def apply_single_segmentation(model, backbone, img_path, dest_path, mask_path=No
 		The path to the mask image for performing metric evaluation
 	ngpus: int, optional
 		The number of GPUs the user wants to utilize for evaluation
+	segmenter: Segmenter, optional
+		An already loaded Segmenter to reuse instead of building a new model
 	"""
-	os.chdir('./awesome-semantic-segmentation-pytorch/scripts')
-	if not os.path.isfile(img_path):
-		img_path = join('../../', img_path)
-	dest_path = join('../../', dest_path)
-	img = ' --input-pic ' + img_path
-	outdir = ' --outdir ' + dest_path
-	parameters = MODEL + model + BACKBONE + backbone + DATASET + img + outdir
-	if ngpus > 1:
-		if not mask_path:
-			os.system('python -m torch.distributed.launch --nproc_per_node=' + str(ngpus) + ' eval_custom.py' + parameters)
-		else:
-			mask = ' --input-gt ' + mask_path
-			mask_parameters = MODEL + model + BACKBONE + backbone + DATASET + img + outdir + mask
-			os.system('python -m torch.distributed.launch --nproc_per_node=' + str(ngpus) + ' eval_custom_metric.py' + mask_parameters)
-	else:
-		if not mask_path:
-			os.system('python eval_custom.py' + parameters)
-		else:
-			mask = ' --input-gt ' + mask_path
-			mask_parameters = MODEL + model + BACKBONE + backbone + DATASET + img + outdir + mask
-			os.system('python eval_custom_metric.py' + mask_parameters)
-	os.chdir('../..')
+	if segmenter is None:
+		segmenter = Segmenter(model, backbone, ngpus=ngpus)
+	if mask_path:
+		pixAcc, mIoU = segmenter.evaluate(img_path, mask_path)
+		print("PixAcc: {:.4f}, mIoU: {:.4f}".format(pixAcc * 100, mIoU * 100))
+	segmenter.colorize(segmenter.segment(img_path)).save(dest_path)
 					
 def process_input(model='psp', backbone='resnet50', img_path=None, dir_path=None, 
-				vid_path=None, frame_rate=0.5, mask_path=None, ngpus=1):
+				vid_path=None, frame_rate=0.5, mask_path=None, ngpus=1, batch_size=4, segmenter=None,
+				cache_dir=None, cache_size=1 << 30, run_id=None, workers=1, backend='pytorch', upsample='logits',
+				tile_size=None, tile_overlap=128, keyframe_interval=None, keyframe_mode='fixed', keyframe_threshold=0.2,
+				skip_similar=None, max_staleness=30):
 	"""
 	Reads the given image, images in the given directory, or image frames from the given video.
 	Based on the format of the input, processes the image(s) by applying segmentation to each
@@ -95,6 +711,9 @@ def process_input(model='psp', backbone='resnet50', img_path=None, dir_path=None
 	- For a single image/directory of images: ./runs/[random string code]/[image name]-seg.jpg
 	- For a video: ./runs/[random string code]/[video name]-seg.mp4
 
+	Videos are segmented in a single streaming pass, so no intermediate frame images are
+	written to disk.
+
 	Parameters
 	----------
 	model: str, optional
@@ -113,8 +732,57 @@ def process_input(model='psp', backbone='resnet50', img_path=None, dir_path=None
 		The path to the mask image for performing metric evaluation
 	ngpus: int, optional
 		The number of GPUs the user wants to utilize for evaluation with the default as 1
+	batch_size: int, optional
+		The maximum number of images passed through the model in a single forward pass
+	segmenter: Segmenter, optional
+		An already loaded Segmenter to reuse instead of building a new model
+	cache_dir: str, optional
+		The path to the directory caching label maps across runs, with the default being no cache
+	cache_size: int, optional
+		The maximum size in bytes of the cache
+	run_id: str, optional
+		The string code of an earlier run to resume, with the default being a new run
+	workers: int, optional
+		The number of processes the images are sharded across, each with its own copy of the model
+	backend: str, optional
+		Either 'pytorch' or 'onnxruntime', the backend the model is run with
+	upsample: str, optional
+		Either 'logits', 'strips' or 'labels', how the logits are upsampled before the argmax
+	tile_size: int, optional
+		Segments every image in overlapping tiles of this size, with the default being whole images
+	tile_overlap: int, optional
+		The minimum overlap of two neighbouring tiles
+	keyframe_interval: int, optional
+		Reuses the deep features of keyframes taken at most this many frames apart for the frames
+		of a video, with the default being every frame; needs a single process
+	keyframe_mode: str, optional
+		Either 'fixed', 'feature' or 'pixel', how keyframes are chosen
+	keyframe_threshold: float, optional
+		The relative change starting a new keyframe in the 'feature' and 'pixel' modes
+	skip_similar: float, optional
+		Reuses the label map of the last segmented frame of a video for the following frames
+		whose downscaled SSIM with it is at least this value, with the default being to
+		segment every frame
+	max_staleness: int, optional
+		The maximum number of consecutive frames reusing the same label map
 	"""
-	run_id = generate_id()
+	if keyframe_interval and workers > 1:
+		raise ValueError('keyframe feature reuse follows the frames in order and needs a single process')
+	if segmenter is None and workers > 1:
+		segmenter = ShardedSegmenter(model, backbone, workers=workers, batch_size=batch_size, backend=backend,
+									 upsample=upsample, tile_size=tile_size, tile_overlap=tile_overlap)
+		try:
+			return process_input(model, backbone, img_path, dir_path, vid_path, frame_rate, mask_path, ngpus,
+								 batch_size, segmenter, cache_dir, cache_size, run_id, skip_similar=skip_similar,
+								 max_staleness=max_staleness)
+		finally:
+			segmenter.close()
+	if segmenter is None:
+		segmenter = Segmenter(model, backbone, ngpus=ngpus, batch_size=batch_size, backend=backend, upsample=upsample,
+							  tile_size=tile_size, tile_overlap=tile_overlap, keyframe_interval=keyframe_interval,
+							  keyframe_mode=keyframe_mode, keyframe_threshold=keyframe_threshold)
+	if run_id is None:
+		run_id = generate_id()
 	dest_path = join("./runs", run_id)
 	if not os.path.isdir(dest_path):
 		os.makedirs(dest_path)
@@ -123,31 +791,29 @@ def process_input(model='psp', backbone='resnet50', img_path=None, dir_path=None
 		print("Completed reading image:", img_path)
 		
 		dest_path = join(dest_path, get_file_name(img_path) + "-seg" + get_file_extension(img_path))
-		apply_single_segmentation(model, backbone, img_path, dest_path, mask_path, ngpus)
+		apply_single_segmentation(model, backbone, img_path, dest_path, mask_path, ngpus, segmenter)
 		
 		print("Completed segmentation evaluation. Result is saved as", dest_path)
 	if dir_path:
 		assert os.path.isdir(dir_path)
 		print("Completed reading images from directory:", dir_path)
 
-		apply_segmentation_dir(model, backbone, dir_path, dest_path, ngpus)
+		apply_segmentation_dir(model, backbone, dir_path, dest_path, ngpus, segmenter, cache_dir, cache_size)
 		
 		print("Completed segmentation evaluation. Result is saved in", dest_path)
 	if vid_path:
-		frames_dir = join(dest_path, get_file_name(vid_path) + '-frames')
-		vid_to_frames(vid_path, frames_dir, 1 / frame_rate)
-		
-		print("Completed converting video to frames at", frame_rate, "frames per second")
-		assert os.path.isdir(frames_dir)
-		
-		segmented_frames_dir = join(dest_path, get_file_name(vid_path) + '-seg-frames')
-		if not os.path.isdir(segmented_frames_dir):
-			os.makedirs(segmented_frames_dir)
+		assert os.path.isfile(vid_path)
+		print("Completed reading video:", vid_path)
+
 		dest_path = join(dest_path, get_file_name(vid_path) + "-seg" + get_file_extension(vid_path))
-		
-		apply_segmentation_dir(model, backbone, join('../../',frames_dir), segmented_frames_dir, ngpus)
-		
-		frames_to_vid(segmented_frames_dir, dest_path, frame_rate)
+		gate = FrameGate(skip_similar, max_staleness) if skip_similar else None
+		num_frames = segment_video(segmenter, vid_path, dest_path, frame_rate, gate=gate)
+		if getattr(segmenter, 'keyframes', None) is not None:
+			print(segmenter.keyframes.report())
+		if gate is not None:
+			print(gate.report())
+
+		print("Segmented", num_frames, "frames at", frame_rate, "frames per second")
 		print("Completed segmentation evaluation. Result is saved as", dest_path)
 	
 def frames_to_vid(frames_dir_path, dest_path, frame_rate):
@@ -182,7 +848,8 @@ def frames_to_vid(frames_dir_path, dest_path, frame_rate):
 
 def vid_to_frames(vid_path, frames_dir, frame_rate):
 	"""
-	Converts a video into image frames and saves it to the given frames directory.
+	Converts a video into image frames and saves it to the given frames directory. The video
+	is decoded once from front to back instead of seeking to every captured frame.
 
 	Parameters
 	----------
@@ -201,44 +868,9 @@ def vid_to_frames(vid_path, frames_dir, frame_rate):
 	"""
 	if not os.path.isdir(frames_dir):
 		os.mkdir(frames_dir)
-	vidcap = cv2.VideoCapture(vid_path)
-	sec = 0
-	num = 0
-	success = get_frame(vidcap, sec, num, frames_dir)
-	while success:
-		sec = round(sec + frame_rate, 2)
-		success = get_frame(vidcap, sec, num, frames_dir)
-		num += 1
-	return frames_dir
-
-def get_frame(vidcap, sec, num, frames_dir):
-	"""
-	Gets a single frame using the VideoCapture object and saves the frame image to the
-	directory ./[video name]-frames/
-
-	Parameters
-	----------
-	vidcap: VideoCapture object
-		The VideoCapture object read from the video file path
-	sec: double
-		The second value of the video to capture
-	num: int
-		The frame number
-	frames_dir: str
-		The path to the directory in which the video frames will be stored
-
-	Returns
-	-------
-	boolean
-		True if the function was able to save the frame image to the directory
-		and False otherwise
-
-	"""
-	vidcap.set(cv2.CAP_PROP_POS_MSEC, sec * 1000)
-	hasFrames, img = vidcap.read()
-	if hasFrames:
+	for num, img in enumerate(sample_frames(vid_path, frame_rate)):
 		cv2.imwrite(frames_dir + "/image" + str(num) + ".png", img)
-	return hasFrames
+	return frames_dir
 
 def generate_id():
 	"""
@@ -314,7 +946,42 @@ def parse_args():
 						default='psp')
 	parser.add_argument("--backbone", help='Use this flag to specify a backbone to use for evaluation other than the default PSPNet',
 						default='resnet50')
-	return parser.parse_args()
+	parser.add_argument("--server", help='Use this flag to send the images to a running segmentation_server.py at host:port or unix:[socket path]',
+						default=None)
+	parser.add_argument("--cache-dir", help='Use this flag to cache label maps in a directory so that re-running a directory only segments new or changed images',
+						default=None)
+	parser.add_argument("--cache-size", help='Use this flag to specify the maximum size of the cache in MB',
+						default=1024)
+	parser.add_argument("--resume", help='Use this flag to resume an interrupted run given its string code',
+						default=None)
+	parser.add_argument("--workers", help='Use this flag to shard the images or video frames across this many processes, each running its own copy of the model',
+						default=1)
+	parser.add_argument("--backend", help='Use this flag to run the model with onnxruntime instead of the default pytorch, exporting it to ONNX on first use',
+						choices=['pytorch', 'onnxruntime'], default='pytorch')
+	parser.add_argument("--upsample", help="Use this flag to upsample the logits in strips of rows, which gives the same labels with less memory, or to upsample the labels, which is faster but approximate",
+						choices=['logits', 'strips', 'labels'], default='logits')
+	parser.add_argument("--tile-size", help='Use this flag to segment every image in overlapping tiles of this size, so that large images fit in memory',
+						default=None)
+	parser.add_argument("--tile-overlap", help='Use this flag to specify the minimum overlap in pixels of two neighbouring tiles',
+						default=128)
+	parser.add_argument("--keyframe-interval", help='Use this flag with --vid to run the deep layers of the model only on keyframes at most this many frames apart, reusing their features in between',
+						default=None)
+	parser.add_argument("--keyframe-mode", help='Use this flag to take keyframes at a fixed interval or when the low-level features or pixels of a frame change',
+						choices=['fixed', 'feature', 'pixel'], default='fixed')
+	parser.add_argument("--keyframe-threshold", help='Use this flag to specify the relative change of a frame starting a new keyframe',
+						default=0.2)
+	parser.add_argument("--skip-similar", help='Use this flag with --vid to reuse the label map of the last segmented frame for frames whose downscaled SSIM with it is at least this value, such as 0.98',
+						default=None)
+	parser.add_argument("--max-staleness", help='Use this flag to specify how many consecutive frames can reuse the same label map',
+						default=30)
+	parser.add_argument("--batch-size", help='Use this flag to specify how many images are passed through the model at once',
+						default=4)
+	args = parser.parse_args()
+	if args.server and args.mask:
+		parser.error('--mask scores the prediction with a locally loaded model and cannot be used with --server')
+	if args.server and args.cache_dir:
+		parser.error('--cache-dir keys the results by the weights of a locally loaded model and cannot be used with --server')
+	return args
 
 def main():
 	"""
@@ -334,7 +1001,20 @@ def main():
 		rate = float(args.r)
 	if args.ngpus:
 		gpus = int(args.ngpus)
-	process_input(model=model, backbone=backbone, img_path=image_path, dir_path=dir_path, vid_path=video_path, frame_rate=rate, mask_path=mask_path, ngpus=gpus)
+	batch_size = int(args.batch_size)
+	cache_size = int(float(args.cache_size) * (1 << 20))
+	segmenter = None
+	if args.server:
+		segmenter = SegmentationClient(args.server, model, backbone, batch_size=batch_size)
+	process_input(model=model, backbone=backbone, img_path=image_path, dir_path=dir_path, vid_path=video_path, frame_rate=rate, mask_path=mask_path, ngpus=gpus,
+				batch_size=batch_size, segmenter=segmenter, cache_dir=args.cache_dir, cache_size=cache_size,
+				run_id=args.resume, workers=int(args.workers),
+				backend=args.backend, upsample=args.upsample,
+				tile_size=int(args.tile_size) if args.tile_size else None, tile_overlap=int(args.tile_overlap),
+				keyframe_interval=int(args.keyframe_interval) if args.keyframe_interval else None,
+				keyframe_mode=args.keyframe_mode, keyframe_threshold=float(args.keyframe_threshold),
+				skip_similar=float(args.skip_similar) if args.skip_similar else None,
+				max_staleness=int(args.max_staleness))
 
 if __name__ == "__main__":
 	main()
@@ -0,0 +1,337 @@
+import queue
+import threading
+import cv2
+
+STOP = object()
+
+def segment_video(segmenter, vid_path, dest_path, frame_rate, batch_size=None, queue_size=16, gate=None):
+	"""
+	Segments a video in a single streaming pass without writing intermediate frame images to
+	disk. The pipeline runs in three stages connected by bounded in-memory queues:
+	- decode: samples frames from the video at the given frame rate
+	- inference: gathers decoded frames into batches and segments them with the Segmenter
+	- encode: color codes the label maps and appends them to the output video
+	Since every queue is bounded, the memory used stays flat regardless of the video length.
+
+	Parameters
+	----------
+	segmenter: Segmenter
+		The loaded Segmenter used to segment the frames
+	vid_path: str
+		The path to the video file to be segmented
+	dest_path: str
+		The path where the resulting video should be saved
+	frame_rate: double
+		The desired frame rate when capturing frames from the video, which is also the frame
+		rate of the resulting video
+	batch_size: int, optional
+		The number of frames segmented in a single forward pass, with the default being the
+		Segmenter's batch size
+	queue_size: int, optional
+		The maximum number of frames waiting between two stages
+	gate: FrameGate, optional
+		Skips the frames nearly identical to the last segmented frame, reusing its label map,
+		with the default being to segment every frame
+
+	Returns
+	-------
+	int
+		The number of frames written to the resulting video
+	"""
+	from semantic_segmentation import dataset_palette
+
+	if batch_size is None:
+		batch_size = segmenter.batch_size
+	if hasattr(segmenter, 'reset_frames'):
+		segmenter.reset_frames()
+	if gate is not None:
+		gate.reset()
+	palette = dataset_palette(segmenter.dataset).bgr()
+	frames = queue.Queue(maxsize=queue_size)
+	results = queue.Queue(maxsize=queue_size)
+	stop = threading.Event()
+	errors = []
+	written = []
+
+	decoder = threading.Thread(target=run_stage, args=(decode_frames, (vid_path, 1 / frame_rate, frames, stop), stop, errors),
+							   daemon=True)
+	encoder = threading.Thread(target=run_stage, args=(encode_frames, (results, dest_path, frame_rate, palette, written, stop),
+							   stop, errors), daemon=True)
+	decoder.start()
+	encoder.start()
+	try:
+		run_stage(infer_frames, (segmenter, frames, results, batch_size, stop, gate), stop, errors)
+		put(results, STOP, stop)
+	except BaseException:
+		stop.set()
+		raise
+	finally:
+		decoder.join()
+		encoder.join()
+	if errors:
+		raise errors[0]
+	return written[0] if written else 0
+
+class FrameGate(object):
+	"""
+	Decides which frames of a video need to be segmented. A frame whose downscaled grayscale
+	version has an SSIM of at least threshold with the last segmented frame is a near
+	duplicate, such as the frames of a stationary camera, and reuses its label map instead.
+	A frame is always segmented after max_staleness consecutive skipped frames, so that slow
+	changes are eventually picked up.
+
+	Parameters
+	----------
+	threshold: float, optional
+		The SSIM above which a frame is a near duplicate of the last segmented frame
+	max_staleness: int, optional
+		The maximum number of consecutive frames reusing the same label map
+	width: int, optional
+		The width the frames are downscaled to before being compared
+	"""
+	def __init__(self, threshold=0.98, max_staleness=30, width=64):
+		from image_diff import downscale_gray, similarity_score
+
+		self.downscale = downscale_gray
+		self.similarity = similarity_score
+		self.threshold = threshold
+		self.max_staleness = max_staleness
+		self.width = width
+		self.frames = 0
+		self.skipped = 0
+		self.reset()
+
+	def reset(self):
+		"""
+		Forgets the last segmented frame before the frames of a new video are gated.
+		"""
+		self.reference = None
+		self.stale = 0
+
+	def skip(self, frame):
+		"""
+		Tells whether a frame can reuse the label map of the last segmented frame. Otherwise
+		the frame becomes the one the next frames are compared with.
+
+		Parameters
+		----------
+		frame: numpy array
+			The H x W x 3 RGB frame
+
+		Returns
+		-------
+		boolean
+			True if the frame is a near duplicate of the last segmented frame
+		"""
+		self.frames += 1
+		small = self.downscale(frame, self.width)
+		if (self.reference is not None and self.stale < self.max_staleness and small.shape == self.reference.shape
+				and self.similarity(small, self.reference) >= self.threshold):
+			self.stale += 1
+			self.skipped += 1
+			return True
+		self.reference = small
+		self.stale = 0
+		return False
+
+	def report(self):
+		return 'Skipped {:d} of {:d} near-duplicate frames (SSIM threshold {}, max staleness {})'.format(
+			self.skipped, self.frames, self.threshold, self.max_staleness)
+
+def run_stage(target, args, stop, errors):
+	"""
+	Runs a single pipeline stage. If the stage fails, the error is recorded and every other
+	stage is told to stop so that the pipeline does not hang on a full or empty queue.
+
+	Parameters
+	----------
+	target: function
+		The stage function to run
+	args: tuple
+		The arguments passed to the stage function
+	stop: threading.Event
+		The event signalling every stage to stop
+	errors: list
+		The list collecting the errors raised by the stages
+	"""
+	try:
+		target(*args)
+	except Exception as e:
+		errors.append(e)
+		stop.set()
+
+def put(q, item, stop):
+	"""
+	Puts an item on a bounded queue, blocking while the queue is full unless the pipeline is
+	being stopped.
+
+	Returns
+	-------
+	boolean
+		True if the item was put on the queue and False if the pipeline was stopped
+	"""
+	while not stop.is_set():
+		try:
+			q.put(item, timeout=0.1)
+			return True
+		except queue.Full:
+			pass
+	return False
+
+def get(q, stop):
+	"""
+	Gets an item from a queue, blocking while the queue is empty unless the pipeline is being
+	stopped.
+
+	Returns
+	-------
+	object
+		The item taken from the queue, or STOP if the pipeline was stopped
+	"""
+	while not stop.is_set():
+		try:
+			return q.get(timeout=0.1)
+		except queue.Empty:
+			pass
+	return STOP
+
+def sample_frames(vid_path, interval):
+	"""
+	Reads a video front to back in a single decoding pass and yields one frame every interval
+	seconds. Frames that are not needed are skipped with grab(), which does not convert them
+	to images, and a frame is only retrieved once its presentation timestamp is the closest one
+	to the next sampling time. Unlike seeking to every sampling time, this never decodes a frame twice.
+
+	Parameters
+	----------
+	vid_path: str
+		The path to the video file to be read
+	interval: double
+		The number of seconds between two captured frames
+
+	Returns
+	-------
+	generator
+		The captured BGR frames, in order
+	"""
+	vidcap = cv2.VideoCapture(vid_path)
+	fps = vidcap.get(cv2.CAP_PROP_FPS)
+	# a frame is taken for a sampling time when it is the closest frame to that time
+	tolerance = 500 / fps if fps > 0 else 0
+	sec = 0
+	num = 0
+	last_msec = None
+	try:
+		while vidcap.grab():
+			msec = vidcap.get(cv2.CAP_PROP_POS_MSEC)
+			if (last_msec is not None and msec <= last_msec) and fps > 0:
+				# the backend does not report timestamps, so derive them from the frame rate
+				msec = num * 1000 / fps
+			last_msec = msec
+			num += 1
+			if msec < sec * 1000 - tolerance:
+				continue
+			hasFrames, img = vidcap.retrieve()
+			if not hasFrames:
+				break
+			while msec >= sec * 1000 - tolerance:
+				yield img
+				sec = round(sec + interval, 2)
+	finally:
+		vidcap.release()
+
+def seek_frames(vid_path, interval):
+	"""
+	Reads a video and yields one frame every interval seconds by seeking to every sampling
+	time. Seeking usually goes back to the previous keyframe and decodes forward again, so
+	this is slower than sample_frames and is only kept for comparison.
+
+	Parameters
+	----------
+	vid_path: str
+		The path to the video file to be read
+	interval: double
+		The number of seconds between two captured frames
+
+	Returns
+	-------
+	generator
+		The captured BGR frames, in order
+	"""
+	vidcap = cv2.VideoCapture(vid_path)
+	sec = 0
+	try:
+		while True:
+			vidcap.set(cv2.CAP_PROP_POS_MSEC, sec * 1000)
+			hasFrames, img = vidcap.read()
+			if not hasFrames:
+				break
+			yield img
+			sec = round(sec + interval, 2)
+	finally:
+		vidcap.release()
+
+def decode_frames(vid_path, interval, frames, stop):
+	"""
+	Decode stage: captures frames from the video and puts them on the frames queue as RGB
+	arrays, followed by STOP once the video is exhausted.
+	"""
+	for img in sample_frames(vid_path, interval):
+		if not put(frames, cv2.cvtColor(img, cv2.COLOR_BGR2RGB), stop):
+			return
+	put(frames, STOP, stop)
+
+def infer_frames(segmenter, frames, results, batch_size, stop, gate=None):
+	"""
+	Inference stage: gathers frames from the frames queue into batches of at most batch_size
+	frames, segments each batch and puts the label maps on the results queue. Frames skipped
+	by the gate get the label map of the last segmented frame before them.
+	"""
+	# consecutive frames, which a Segmenter reusing keyframe features relies on
+	segment = getattr(segmenter, 'segment_frames', segmenter.segment_batch)
+	last = None
+	done = False
+	while not done:
+		batch = []
+		# for every frame, the index of its label map in the batch, -1 being the previous batch
+		sources = []
+		while len(sources) < batch_size:
+			frame = get(frames, stop)
+			if frame is STOP:
+				done = True
+				break
+			if gate is not None and gate.skip(frame):
+				sources.append(len(batch) - 1)
+			else:
+				sources.append(len(batch))
+				batch.append(frame)
+		preds = segment(batch) if batch else []
+		for source in sources:
+			if not put(results, preds[source] if source >= 0 else last, stop):
+				return
+		if batch:
+			last = preds[-1]
+
+def encode_frames(results, dest_path, frame_rate, palette, written, stop):
+	"""
+	Encode stage: color codes the label maps taken from the results queue and appends them to
+	the output video until STOP is received. Every frame is color coded with a single lookup
+	into the BGR table of the dataset's palette.
+	"""
+	video = None
+	count = 0
+	try:
+		while True:
+			pred = get(results, stop)
+			if pred is STOP:
+				break
+			frame = palette.colorize(pred)
+			if video is None:
+				height, width = frame.shape[:2]
+				video = cv2.VideoWriter(dest_path, 0, frame_rate, (width, height))
+			video.write(frame)
+			count += 1
+	finally:
+		if video is not None:
+			video.release()
+		written.append(count)